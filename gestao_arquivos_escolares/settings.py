@@ -78,10 +78,46 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: transações pegam o lock de escrita logo no início,
+            # serializando a alocação de números de passivo entre workers.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+}
+
+
+# Cache
+# Guarda as faixas de localização livres (ver localizador/utils.py). Com vários
+# workers, troque por um backend compartilhado (Redis, Memcached) para que a
+# invalidação feita por um worker valha para todos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
 
+# Capas em PDF
+# Fonte TrueType/OpenType das capas, lida uma vez para gerar o subconjunto
+# usado nos PDFs (ver localizador/utils.py). Sem o arquivo, as capas usam
+# Helvetica. Sem FONTE_CAPA_NEGRITO, o negrito usa a mesma fonte.
+# AQUECER_FONTE_CAPA prepara o subconjunto na inicialização em vez de na
+# primeira capa.
+
+FONTE_CAPA = BASE_DIR / 'fonts' / 'NotoSansCJK-Regular.ttc'
+FONTE_CAPA_NEGRITO = None
+AQUECER_FONTE_CAPA = False
+
+# Rótulos e textos fixos de cada modelo de capa desenhados uma vez por PDF, num
+# Form XObject que as páginas referenciam. Usa partes internas do fpdf2 (ver
+# MODELOS DAS CAPAS em localizador/utils.py); com False cada página desenha
+# tudo, só com a API pública.
+CAPA_PARTE_FIXA_COMPARTILHADA = True
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -122,6 +158,41 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR / "media")
 
+# Os documentos vinculados usam o armazenamento deduplicado: cada conteúdo é
+# gravado uma vez em MEDIA_ROOT/_blobs e ligado (hardlink) ao nome de cada
+# documento. Arquivos anteriores: comando deduplicar_documentos.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "documentos": {"BACKEND": "localizador.utils.ArmazenamentoDeduplicado"},
+}
+# Uploads grandes vão para um arquivo temporário já com o SHA-256 calculado
+FILE_UPLOAD_HANDLERS = [
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "localizador.utils.RecebimentoComSha256",
+]
+
+# Documentos vinculados
+# Tamanho máximo de um documento, pelo formulário ou pelo envio em partes.
+# Documentos grandes (digitalizações) são enviados em partes de até
+# ENVIO_TAMANHO_PARTE, gravadas em PASTA_ENVIOS até o arquivo estar completo;
+# envios parados há mais de ENVIO_EXPIRA_HORAS são removidos pelo comando
+# limpar_envios.
+DOCUMENTO_TAMANHO_MAXIMO = 1024 * 1024 * 1024
+ENVIO_TAMANHO_PARTE = 8 * 1024 * 1024
+PASTA_ENVIOS = os.path.join(BASE_DIR / "envios_parciais")
+ENVIO_EXPIRA_HORAS = 48
+
+# Os documentos são baixados pela view baixar_documento (login obrigatório);
+# MEDIA_ROOT não deve ser publicado pelo servidor web. Para o servidor web
+# enviar os arquivos no lugar do Django, sem ocupar um processo durante o
+# download:
+#   nginx: DOCUMENTO_ENVIO_SERVIDOR = "X-Accel-Redirect" e um location
+#          "internal" em DOCUMENTO_PREFIXO_INTERNO com alias para MEDIA_ROOT;
+#   Apache (mod_xsendfile) ou lighttpd: DOCUMENTO_ENVIO_SERVIDOR = "X-Sendfile".
+DOCUMENTO_ENVIO_SERVIDOR = None
+DOCUMENTO_PREFIXO_INTERNO = "/documentos-protegidos/"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
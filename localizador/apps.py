@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class LocalizadorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'localizador'
+
+    def ready(self):
+        if getattr(settings, 'AQUECER_FONTE_CAPA', False):
+            from .utils import fontes_capa
+            fontes_capa()
@@ -1,7 +1,28 @@
+import os
+
 from django import forms
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
 from .models import DocumentoVinculado, Usuario, Profissional_Arquivo, Contrato, Aluno_Arquivo, Contato, Pendencia
-from .utils import get_numeros_disponiveis, get_next_numero_passivo, release_numero_passivo
+from .utils import get_proximo_numero_sugerido
+
+
+class LocalizacaoPassivoInput(forms.NumberInput):
+    """
+    Campo numérico para a localização do arquivo. As sugestões de números
+    livres vêm do endpoint numeros_disponiveis sob demanda (ver o script em
+    localizador/localizacao_autocomplete.html), em vez de um <select> com
+    todos os números.
+    """
 
+    def __init__(self, tipo, attrs=None):
+        super().__init__(attrs)
+        self.attrs.update({
+            "list": f"localizacoes-livres-{tipo}",
+            "data-localizacao-tipo": tipo,
+            "autocomplete": "off",
+            "min": 1,
+        })
 
 
 class UsuarioForm(forms.ModelForm):
@@ -19,11 +40,9 @@ class ProfissionalArquivoForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        numeros = get_numeros_disponiveis('P')
-
-        self.fields["localizacao_arquivo"].widget = forms.Select(
-            choices=[(n, n) for n in numeros]
-        )
+        self.fields["localizacao_arquivo"].widget = LocalizacaoPassivoInput('P')
+        if not self.instance.pk and not self.is_bound:
+            self.fields["localizacao_arquivo"].initial = get_proximo_numero_sugerido('P')
 
         self.fields["status_arquivo_profissional"].widget = forms.Select(
             choices=[('A', 'Ativo'),('P', 'Permanente')]
@@ -46,15 +65,110 @@ class AlunoArquivoForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        numeros = get_numeros_disponiveis('A')
-
-        self.fields["localizacao_arquivo"].widget = forms.Select(
-            choices=[(n, n) for n in numeros]
-        )
+        self.fields["localizacao_arquivo"].widget = LocalizacaoPassivoInput('A')
+        if not self.instance.pk and not self.is_bound:
+            self.fields["localizacao_arquivo"].initial = get_proximo_numero_sugerido('A')
         self.fields["status_arquivo_aluno"].widget = forms.Select(
             choices=[('A', 'Ativo'),('P', 'Permanente')]
         )
 
+class AlunoLoteForm(forms.Form):
+    """Cadastro de vários alunos de uma vez: uma linha "código;nome;cpf" por aluno."""
+
+    status_arquivo_aluno = forms.ChoiceField(
+        choices=[('A', 'Ativo'), ('P', 'Permanente')],
+        label="Status"
+    )
+    linhas = forms.CharField(
+        widget=forms.Textarea(attrs={"rows": 15, "placeholder": "12345;Nome do Aluno;000.000.000-00"}),
+        label="Alunos (código do sistema;nome;CPF opcional)"
+    )
+
+    def clean_linhas(self):
+        alunos = []
+        erros = []
+
+        for n, linha in enumerate(self.cleaned_data["linhas"].splitlines(), start=1):
+            if not linha.strip():
+                continue
+            partes = [p.strip() for p in linha.split(";")]
+            if len(partes) < 2 or not partes[0].isdigit() or not partes[1]:
+                erros.append(f"Linha {n}: use o formato código;nome;CPF.")
+                continue
+            alunos.append({
+                "cod_sistema": int(partes[0]),
+                "nome_aluno": partes[1][:100],
+                "cpf": (partes[2] if len(partes) > 2 else "")[:14] or None,
+            })
+
+        codigos = [a["cod_sistema"] for a in alunos]
+        repetidos = {c for c in codigos if codigos.count(c) > 1}
+        if repetidos:
+            erros.append(f"Códigos repetidos na lista: {', '.join(map(str, sorted(repetidos)))}.")
+
+        existentes = Aluno_Arquivo.objects.filter(cod_sistema__in=codigos).values_list("cod_sistema", flat=True)
+        if existentes:
+            erros.append(f"Códigos já cadastrados: {', '.join(map(str, sorted(existentes)))}.")
+
+        if erros:
+            raise forms.ValidationError(erros)
+        if not alunos:
+            raise forms.ValidationError("Informe ao menos um aluno.")
+        return alunos
+
+class ImportacaoSigeecForm(forms.Form):
+    """Upload do CSV exportado do SIGEEC (ver utils.importar_sigeec)."""
+
+    tipo = forms.ChoiceField(choices=[('A', 'Alunos'), ('P', 'Servidores')], label="Cadastro")
+    arquivo = forms.FileField(label="Arquivo CSV do SIGEEC")
+    delimitador = forms.ChoiceField(choices=[(';', 'Ponto e vírgula (;)'), (',', 'Vírgula (,)')], label="Delimitador")
+    sincronizar = forms.BooleanField(
+        required=False,
+        label="Sincronizar: gravar só as linhas que mudaram desde a última importação (alunos)"
+    )
+    marcar_ausentes = forms.BooleanField(
+        required=False,
+        label="Passar para Permanente os alunos que não vieram no arquivo"
+    )
+    simular = forms.BooleanField(required=False, label="Apenas simular (não grava nada)")
+
+class CapasLoteForm(forms.Form):
+    """Filtros das capas em lote (ver utils.capas_queryset); ao menos um é obrigatório."""
+
+    tipo = forms.ChoiceField(choices=[('A', 'Alunos'), ('P', 'Servidores')], label="Cadastro")
+    localizacao_de = forms.IntegerField(required=False, min_value=1, label="Localização de")
+    localizacao_ate = forms.IntegerField(required=False, min_value=1, label="Localização até")
+    status = forms.ChoiceField(
+        choices=[('', 'Todos'), ('A', 'Ativo'), ('P', 'Permanente')],
+        required=False,
+        label="Status"
+    )
+    cadastro_de = forms.DateField(
+        required=False,
+        label="Cadastrados a partir de",
+        widget=forms.DateInput(attrs={"type": "date"})
+    )
+    cadastro_ate = forms.DateField(
+        required=False,
+        label="Cadastrados até",
+        widget=forms.DateInput(attrs={"type": "date"})
+    )
+    ids = forms.CharField(required=False, label="Ids (separados por vírgula)")
+
+    def clean_ids(self):
+        ids = self.cleaned_data["ids"]
+        try:
+            return [int(i) for i in ids.split(",") if i.strip()]
+        except ValueError:
+            raise forms.ValidationError("Informe apenas números separados por vírgula.")
+
+    def clean(self):
+        dados = super().clean()
+        filtros = [campo for campo in self.fields if campo != "tipo"]
+        if not self.errors and not any(dados.get(campo) for campo in filtros):
+            raise forms.ValidationError("Informe ao menos um filtro.")
+        return dados
+
 class ContatoForm(forms.ModelForm):
     class Meta:
         model = Contato
@@ -83,3 +197,77 @@ class DocumentoVinculadoForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields["arquivo"].required = True
         self.fields["descricao"].label = "Descrição (Opcional)"
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data["arquivo"]
+        if arquivo and arquivo.size > settings.DOCUMENTO_TAMANHO_MAXIMO:
+            raise forms.ValidationError(_mensagem_tamanho_maximo())
+        return arquivo
+
+
+def _mensagem_tamanho_maximo():
+    return f"O documento passa do tamanho máximo ({filesizeformat(settings.DOCUMENTO_TAMANHO_MAXIMO)})."
+
+
+class EnvioDocumentoForm(forms.Form):
+    """Início de um envio em partes (ver utils.iniciar_envio); enviado pelo script do formulário de documentos."""
+
+    tipo = forms.ChoiceField(choices=[('A', 'Aluno'), ('P', 'Servidor')])
+    object_id = forms.IntegerField(min_value=1)
+    nome_arquivo = forms.CharField(max_length=255)
+    tamanho = forms.IntegerField(min_value=1)
+    sha256 = forms.RegexField(regex=r"^[0-9a-fA-F]{64}$")
+    descricao = forms.CharField(required=False)
+
+    def clean_nome_arquivo(self):
+        # Só o nome: o caminho vem de get_upload_path
+        nome = os.path.basename(self.cleaned_data["nome_arquivo"].replace("\\", "/"))
+        if not nome:
+            raise forms.ValidationError("Nome de arquivo inválido.")
+        return nome
+
+    def clean_tamanho(self):
+        tamanho = self.cleaned_data["tamanho"]
+        if tamanho > settings.DOCUMENTO_TAMANHO_MAXIMO:
+            raise forms.ValidationError(_mensagem_tamanho_maximo())
+        return tamanho
+
+
+class DocumentoFiltroForm(forms.Form):
+    """Filtros do catálogo de documentos (todos opcionais, enviados por GET)."""
+
+    categoria = forms.ChoiceField(
+        choices=[('A', 'Estudantes'), ('P', 'Servidores')],
+        required=False,
+        label="Categoria"
+    )
+    q = forms.CharField(required=False, label="Nome ou CPF")
+    tipo_arquivo = forms.ChoiceField(required=False, label="Tipo de arquivo")
+    data_inicio = forms.DateField(
+        required=False,
+        label="Enviado a partir de",
+        widget=forms.DateInput(attrs={"type": "date"})
+    )
+    data_fim = forms.DateField(
+        required=False,
+        label="Enviado até",
+        widget=forms.DateInput(attrs={"type": "date"})
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        tipos = (
+            DocumentoVinculado.objects
+            .exclude(tipo_arquivo="")
+            .order_by("tipo_arquivo")
+            .values_list("tipo_arquivo", flat=True)
+            .distinct()
+        )
+        self.fields["tipo_arquivo"].choices = [("", "Todos")] + [(t, t) for t in tipos]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio, fim = cleaned_data.get("data_inicio"), cleaned_data.get("data_fim")
+        if inicio and fim and inicio > fim:
+            raise forms.ValidationError("A data inicial deve ser anterior à data final.")
+        return cleaned_data
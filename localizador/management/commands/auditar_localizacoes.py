@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from localizador.utils import auditar_faixas
+
+# Quantas faixas divergentes listar por tipo antes de resumir
+LIMITE_LISTAGEM = 20
+
+
+def _formatar(faixas):
+    partes = [
+        f"{inicio}" if inicio == fim else f"{inicio}-{fim if fim is not None else '...'}"
+        for inicio, fim in faixas[:LIMITE_LISTAGEM]
+    ]
+    if len(faixas) > LIMITE_LISTAGEM:
+        partes.append(f"(+{len(faixas) - LIMITE_LISTAGEM} faixas)")
+    return ", ".join(partes)
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere as faixas de localizações livres com os registros de alunos e "
+        "servidores: aponta números livres que estão em uso e lacunas que não "
+        "constam como livres. Com --corrigir regrava as faixas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tipo", choices=["A", "P"], help="Só alunos (A) ou servidores (P).")
+        parser.add_argument("--corrigir", action="store_true")
+
+    def handle(self, *args, **options):
+        tipos = [options["tipo"]] if options["tipo"] else ['A', 'P']
+        divergencias = 0
+
+        for tipo in tipos:
+            relatorio = auditar_faixas(tipo, corrigir=options["corrigir"])
+            nome = "Alunos" if tipo == 'A' else "Servidores"
+
+            if not (relatorio["em_uso"] or relatorio["perdidos"]):
+                self.stdout.write(self.style.SUCCESS(f"{nome}: {relatorio['faixas']} faixas, sem divergências."))
+                continue
+
+            divergencias += 1
+            self.stdout.write(self.style.WARNING(f"{nome}:"))
+            if relatorio["em_uso"]:
+                self.stdout.write(
+                    f"  {relatorio['total_em_uso']} livres mas em uso: {_formatar(relatorio['em_uso'])}"
+                )
+            if relatorio["perdidos"]:
+                self.stdout.write(
+                    f"  {relatorio['total_perdidos']} sem registro e fora das faixas: {_formatar(relatorio['perdidos'])}"
+                )
+
+        if not divergencias:
+            return
+        if options["corrigir"]:
+            self.stdout.write(self.style.SUCCESS("Faixas regravadas."))
+        else:
+            self.stdout.write("Use --corrigir para regravar as faixas.")
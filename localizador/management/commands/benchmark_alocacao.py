@@ -0,0 +1,97 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# Faixa de cod_sistema reservada para os registros do benchmark
+COD_SISTEMA_BASE = 900000000
+
+
+def _worker(indice, registros, usuario_id, fila):
+    # Processo novo (spawn): precisa configurar o Django antes de usar o ORM
+    import django
+    django.setup()
+
+    from django.db import DatabaseError
+    from localizador.models import Aluno_Arquivo
+
+    criados = []
+    erros = 0
+    inicio = time.perf_counter()
+
+    for i in range(registros):
+        cod_sistema = COD_SISTEMA_BASE + indice * registros + i
+        try:
+            aluno = Aluno_Arquivo.objects.create(
+                usuario_id=usuario_id,
+                status_arquivo_aluno='A',
+                cod_sistema=cod_sistema,
+                nome_aluno=f"Benchmark {indice}-{i}",
+            )
+            criados.append(aluno.localizacao_arquivo)
+        except DatabaseError:
+            erros += 1
+
+    fila.put((criados, erros, time.perf_counter() - inicio))
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a alocação de números de passivo sob concorrência: N processos "
+        "criam alunos ao mesmo tempo. Os registros criados são removidos no final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processos", type=int, default=4)
+        parser.add_argument("--registros", type=int, default=50, help="Alunos criados por processo.")
+
+    def handle(self, *args, **options):
+        from localizador.models import Usuario, Aluno_Arquivo
+
+        processos = options["processos"]
+        registros = options["registros"]
+
+        usuario, usuario_criado = Usuario.objects.get_or_create(
+            username="benchmark_alocacao",
+            defaults={"cpf_usuario": "benchmark"}
+        )
+
+        # Conexões abertas não podem ser herdadas pelos processos filhos
+        connections.close_all()
+
+        ctx = multiprocessing.get_context("spawn")
+        fila = ctx.Queue()
+        workers = [
+            ctx.Process(target=_worker, args=(i, registros, usuario.pk, fila))
+            for i in range(processos)
+        ]
+
+        inicio = time.perf_counter()
+        for w in workers:
+            w.start()
+        resultados = [fila.get() for _ in workers]
+        for w in workers:
+            w.join()
+        total = time.perf_counter() - inicio
+
+        numeros = [n for criados, _, _ in resultados for n in criados]
+        erros = sum(e for _, e, _ in resultados)
+        duplicados = len(numeros) - len(set(numeros))
+
+        self.stdout.write(f"Processos: {processos} x {registros} registros")
+        self.stdout.write(f"Criados: {len(numeros)}  Erros: {erros}  Números duplicados: {duplicados}")
+        self.stdout.write(f"Tempo total: {total:.2f}s  ({len(numeros) / total:.1f} registros/s)")
+        for i, (criados, e, tempo) in enumerate(resultados):
+            self.stdout.write(f"  processo {i}: {len(criados)} criados, {e} erros, {tempo:.2f}s")
+
+        # Limpeza: excluir um a um devolve os números às faixas livres
+        for aluno in Aluno_Arquivo.objects.filter(cod_sistema__gte=COD_SISTEMA_BASE):
+            aluno.delete()
+        if usuario_criado:
+            usuario.delete()
+
+        if erros or duplicados:
+            self.stderr.write(self.style.ERROR("Alocação concorrente falhou."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Nenhuma colisão de números."))
@@ -0,0 +1,75 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from localizador import utils
+from localizador.models import Aluno_Arquivo, Contrato, Pendencia, Profissional_Arquivo
+from localizador.views import PDFCapaBase
+
+
+def _render_aluno(aluno, pendencias):
+    pdf = PDFCapaBase(orientation='P', unit='mm', format='A4')
+    pdf.capa_aluno(aluno, pendencias)
+    return pdf.output(dest='S')
+
+
+def _render_profissional(profissional, contrato):
+    pdf = PDFCapaBase(orientation='P', unit='mm', format='A4')
+    pdf.capa_profissional(profissional, contrato)
+    return pdf.output(dest='S')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o tempo de gerar capas em PDF com a fonte ainda não carregada "
+        "(primeira capa do processo) e já em cache. Não acessa o banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--capas", type=int, default=50, help="Capas geradas com a fonte em cache.")
+        parser.add_argument("--fonte", help="Arquivo .ttf/.otf/.ttc no lugar de settings.FONTE_CAPA.")
+
+    def handle(self, *args, **options):
+        if options["fonte"]:
+            with override_settings(FONTE_CAPA=options["fonte"], FONTE_CAPA_NEGRITO=None):
+                self._medir(options["capas"])
+        else:
+            self._medir(options["capas"])
+
+    def _medir(self, capas):
+        # Registros em memória, com textos acentuados como os reais
+        aluno = Aluno_Arquivo(
+            id_aluno_arquivo=1, localizacao_arquivo=12345, cod_sistema=987654,
+            cpf="123.456.789-09", nome_aluno="João Conceição de Araújo",
+        )
+        pendencias = [
+            Pendencia(tipo_pendencia="Documentação", descricao="Falta certidão de nascimento"),
+            Pendencia(tipo_pendencia="Histórico", descricao="Aguardando histórico da escola anterior"),
+        ]
+        profissional = Profissional_Arquivo(
+            id_profissional_arquivo=1, localizacao_arquivo=678, cpf="987.654.321-00",
+            nome_profissional="Maria Ângela Gonçalves", observacoes="Licença-prêmio em análise.",
+        )
+        contrato = Contrato(funcao="Professora", dt_inicial=date(2000, 2, 1), tipo_contrato="E")
+
+        utils._fontes_capa.clear()
+        inicio = time.perf_counter()
+        tamanho = len(_render_aluno(aluno, pendencias))
+        frio = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for i in range(capas):
+            if i % 2:
+                _render_profissional(profissional, contrato)
+            else:
+                _render_aluno(aluno, pendencias)
+        quente = (time.perf_counter() - inicio) / max(capas, 1)
+
+        fonte = utils.FAMILIA_CAPA if utils.fontes_capa() else "Helvetica (fonte das capas indisponível)"
+        self.stdout.write(f"Fonte: {fonte}")
+        self.stdout.write(f"Primeira capa (carrega a fonte): {frio * 1000:.1f} ms, {tamanho} bytes")
+        self.stdout.write(f"Capas seguintes (fonte em cache): {quente * 1000:.1f} ms em média ({capas} capas)")
+        if quente:
+            self.stdout.write(self.style.SUCCESS(f"Ganho: {frio / quente:.1f}x"))
@@ -0,0 +1,68 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from localizador.models import Usuario, Aluno_Arquivo, Profissional_Arquivo
+from localizador.utils import criar_em_lote_com_localizacao
+
+# Colunas aceitas no CSV para cada tipo (as demais são ignoradas)
+COLUNAS = {
+    'A': ("cod_sistema", "nome_aluno", "cpf", "status_arquivo_aluno", "localizacao_arquivo"),
+    'P': ("nome_profissional", "cpf", "status_arquivo_profissional", "observacoes", "localizacao_arquivo"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Cadastra alunos (--tipo A) ou servidores (--tipo P) a partir de um CSV, "
+        "reservando as localizações em um único bloco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="CSV com cabeçalho (ex.: cod_sistema;nome_aluno;cpf).")
+        parser.add_argument("--tipo", choices=["A", "P"], default="A")
+        parser.add_argument("--usuario", required=True, help="username responsável pelos registros.")
+        parser.add_argument("--delimitador", default=";")
+        parser.add_argument(
+            "--nao-contiguo",
+            action="store_true",
+            help="Preenche as lacunas livres antes de usar o próximo sequencial."
+        )
+
+    def handle(self, *args, **options):
+        tipo = options["tipo"]
+        modelo = Aluno_Arquivo if tipo == 'A' else Profissional_Arquivo
+        status_campo = "status_arquivo_aluno" if tipo == 'A' else "status_arquivo_profissional"
+
+        try:
+            usuario = Usuario.objects.get(username=options["usuario"])
+        except Usuario.DoesNotExist:
+            raise CommandError(f"Usuário '{options['usuario']}' não encontrado.")
+
+        objetos = []
+        with open(options["arquivo"], newline="", encoding="utf-8-sig") as f:
+            for n, linha in enumerate(csv.DictReader(f, delimiter=options["delimitador"]), start=2):
+                try:
+                    dados = {
+                        campo: modelo._meta.get_field(campo).to_python((linha.get(campo) or "").strip() or None)
+                        for campo in COLUNAS[tipo]
+                    }
+                except ValidationError as e:
+                    raise CommandError(f"Linha {n}: {'; '.join(e.messages)}")
+                dados[status_campo] = dados[status_campo] or 'A'
+                objetos.append(modelo(usuario=usuario, **dados))
+
+        if not objetos:
+            raise CommandError("Nenhum registro encontrado no arquivo.")
+
+        criados = criar_em_lote_com_localizacao(
+            modelo,
+            objetos,
+            contiguo=not options["nao_contiguo"]
+        )
+
+        numeros = sorted(obj.localizacao_arquivo for obj in criados)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(criados)} registros cadastrados (localizações {numeros[0]} a {numeros[-1]})."
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from localizador.utils import deduplicar_documentos
+
+
+class Command(BaseCommand):
+    help = (
+        "Passa os documentos vinculados gravados antes do armazenamento deduplicado "
+        "para os blobs por SHA-256 (MEDIA_ROOT/_blobs), trocando cópias iguais por "
+        "hardlinks, e apaga os blobs que nenhum documento usa mais. Pode ser executado "
+        "de novo sem efeito sobre o que já foi convertido."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--simular", action="store_true",
+            help="Só informa quanto espaço seria liberado, sem alterar os arquivos.",
+        )
+
+    def handle(self, *args, **options):
+        verificados, orfaos, liberados = deduplicar_documentos(options["simular"])
+        verbo = "seriam liberados" if options["simular"] else "liberados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verificados} documentos verificados, {orfaos} blobs sem documento; "
+            f"{filesizeformat(liberados)} {verbo}."
+        ))
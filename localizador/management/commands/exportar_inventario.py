@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from localizador.utils import linhas_inventario, gerar_csv, gerar_xlsx
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta o inventário do arquivo físico (localização, nome, CPF, status, "
+        "pendências ou último contrato) de alunos (--tipo A) ou servidores (--tipo P) "
+        "em CSV ou XLSX, lendo o banco em blocos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tipo", choices=["A", "P"], default="A")
+        parser.add_argument("--formato", choices=["csv", "xlsx"], default="csv")
+        parser.add_argument("--saida", help="Arquivo de saída (padrão: saída padrão, só para CSV).")
+        parser.add_argument("--delimitador", default=";")
+        parser.add_argument("--lote", type=int, default=2000, help="Registros lidos do banco por vez.")
+
+    def handle(self, *args, **options):
+        linhas = linhas_inventario(options["tipo"], chunk_size=options["lote"])
+
+        if options["formato"] == "xlsx":
+            if not options["saida"]:
+                raise CommandError("Informe --saida para exportar em XLSX.")
+            with open(options["saida"], "wb") as arquivo:
+                for bloco in gerar_xlsx(linhas):
+                    arquivo.write(bloco)
+
+        elif options["saida"]:
+            with open(options["saida"], "w", encoding="utf-8", newline="") as arquivo:
+                for bloco in gerar_csv(linhas, options["delimitador"]):
+                    arquivo.write(bloco)
+
+        else:
+            for bloco in gerar_csv(linhas, options["delimitador"]):
+                self.stdout.write(bloco, ending="")
+            return
+
+        self.stderr.write(self.style.SUCCESS(f"Inventário gravado em {options['saida']}."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from localizador.models import Aluno_Arquivo, Profissional_Arquivo
+from localizador.utils import expurgar_arquivos
+
+
+class Command(BaseCommand):
+    help = (
+        "Exclui em lotes alunos (--tipo A) ou servidores (--tipo P) que saíram, "
+        "com contatos, pendências, contratos e documentos, devolvendo as "
+        "localizações às faixas livres. Sem --confirmar apenas mostra a contagem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tipo", choices=["A", "P"], default="A")
+        parser.add_argument("--status", choices=["A", "P"], help="Filtra pelo status do arquivo.")
+        parser.add_argument("--ids", help="Lista de ids separados por vírgula.")
+        parser.add_argument("--localizacao-ate", type=int, help="Só localizações até este número.")
+        parser.add_argument("--lote", type=int, default=500, help="Registros excluídos por transação.")
+        parser.add_argument("--confirmar", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["tipo"] == 'A':
+            queryset = Aluno_Arquivo.objects.all()
+            status_campo = "status_arquivo_aluno"
+        else:
+            queryset = Profissional_Arquivo.objects.all()
+            status_campo = "status_arquivo_profissional"
+
+        if not (options["status"] or options["ids"] or options["localizacao_ate"]):
+            raise CommandError("Informe ao menos um filtro: --status, --ids ou --localizacao-ate.")
+
+        if options["status"]:
+            queryset = queryset.filter(**{status_campo: options["status"]})
+        if options["ids"]:
+            try:
+                ids = [int(i) for i in options["ids"].split(",") if i.strip()]
+            except ValueError:
+                raise CommandError("--ids deve conter apenas números.")
+            queryset = queryset.filter(pk__in=ids)
+        if options["localizacao_ate"]:
+            queryset = queryset.filter(localizacao_arquivo__lte=options["localizacao_ate"])
+
+        total = queryset.count()
+        if not options["confirmar"]:
+            self.stdout.write(f"{total} registros seriam excluídos. Use --confirmar para excluir.")
+            return
+
+        excluidos = expurgar_arquivos(queryset, tamanho_lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"{excluidos} registros excluídos."))
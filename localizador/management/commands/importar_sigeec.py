@@ -0,0 +1,84 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from localizador.models import Usuario
+from localizador.utils import abrir_csv_sigeec, importar_sigeec
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa alunos (--tipo A) ou servidores (--tipo P) de um CSV exportado "
+        "do SIGEEC: atualiza os já cadastrados (pelo código do sistema ou CPF) e "
+        "cadastra os novos, reservando as localizações em um único bloco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="CSV do SIGEEC, com cabeçalho.")
+        parser.add_argument("--tipo", choices=["A", "P"], default="A")
+        parser.add_argument("--usuario", required=True, help="username responsável pelos registros novos.")
+        parser.add_argument("--delimitador", default=";")
+        parser.add_argument("--lote", type=int, default=1000, help="Linhas validadas e gravadas por bloco.")
+        parser.add_argument("--relatorio", help="Grava as linhas com erro neste CSV (linha;erro).")
+        parser.add_argument(
+            "--sincronizar",
+            action="store_true",
+            help="Só alunos: não regrava as linhas iguais às da última importação."
+        )
+        parser.add_argument(
+            "--marcar-ausentes",
+            action="store_true",
+            help="Só alunos: passa para Permanente os alunos importados antes que não vieram no arquivo."
+        )
+        parser.add_argument("--simular", action="store_true", help="Mostra as diferenças sem gravar nada.")
+        parser.add_argument("--diferencas", help="Grava as diferenças neste CSV (acao;chave;linha).")
+
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(username=options["usuario"])
+        except Usuario.DoesNotExist:
+            raise CommandError(f"Usuário '{options['usuario']}' não encontrado.")
+
+        try:
+            with open(options["arquivo"], "rb") as f:
+                leitor = abrir_csv_sigeec(f.read(), options["delimitador"])
+            relatorio = importar_sigeec(
+                options["tipo"],
+                leitor,
+                usuario,
+                tamanho_lote=options["lote"],
+                sincronizar=options["sincronizar"],
+                marcar_ausentes=options["marcar_ausentes"],
+                simular=options["simular"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        erros = relatorio["erros"]
+        if options["relatorio"]:
+            with open(options["relatorio"], "w", newline="", encoding="utf-8-sig") as f:
+                escritor = csv.writer(f, delimiter=";")
+                escritor.writerow(["linha", "erro"])
+                escritor.writerows(erros)
+        else:
+            for n, mensagem in erros:
+                self.stderr.write(f"Linha {n}: {mensagem}")
+
+        if options["diferencas"]:
+            with open(options["diferencas"], "w", newline="", encoding="utf-8-sig") as f:
+                escritor = csv.writer(f, delimiter=";")
+                escritor.writerow(["acao", "chave", "linha"])
+                escritor.writerows(relatorio["diferencas"])
+
+        if options["marcar_ausentes"] and erros:
+            self.stderr.write("Ausentes não marcados: corrija as linhas com erro e importe de novo.")
+
+        resumo = (
+            f"{relatorio['linhas']} linhas lidas: {relatorio['criados']} cadastrados, "
+            f"{relatorio['atualizados']} atualizados, {relatorio['inalterados']} inalterados, "
+            f"{relatorio['ausentes']} ausentes, {len(erros)} com erro."
+        )
+        if options["simular"]:
+            self.stdout.write(f"Simulação, nada foi gravado. {resumo}")
+        else:
+            self.stdout.write(self.style.SUCCESS(resumo))
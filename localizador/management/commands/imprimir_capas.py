@@ -0,0 +1,58 @@
+import argparse
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from localizador.utils import capas_queryset
+from localizador.views import gerar_capas_pdf
+
+
+def _data(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida: {valor} (use AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera num único PDF as capas de alunos (--tipo A) ou servidores (--tipo P) "
+        "filtrados por localização, status, data de cadastro ou ids, em ordem de localização."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tipo", choices=["A", "P"], default="A")
+        parser.add_argument("--localizacao-de", type=int)
+        parser.add_argument("--localizacao-ate", type=int)
+        parser.add_argument("--status", choices=["A", "P"], help="Filtra pelo status do arquivo.")
+        parser.add_argument("--cadastro-de", type=_data, help="Cadastrados a partir de (AAAA-MM-DD).")
+        parser.add_argument("--cadastro-ate", type=_data, help="Cadastrados até (AAAA-MM-DD).")
+        parser.add_argument("--ids", help="Lista de ids separados por vírgula.")
+        parser.add_argument("--saida", required=True, help="Arquivo PDF de saída.")
+        parser.add_argument("--lote", type=int, default=500, help="Registros lidos do banco por vez.")
+
+    def handle(self, *args, **options):
+        ids = None
+        if options["ids"]:
+            try:
+                ids = [int(i) for i in options["ids"].split(",") if i.strip()]
+            except ValueError:
+                raise CommandError("--ids deve conter apenas números.")
+
+        queryset = capas_queryset(
+            options["tipo"],
+            localizacao_de=options["localizacao_de"],
+            localizacao_ate=options["localizacao_ate"],
+            status=options["status"],
+            cadastro_de=options["cadastro_de"],
+            cadastro_ate=options["cadastro_ate"],
+            ids=ids,
+        )
+        total = queryset.count()
+        if not total:
+            raise CommandError("Nenhum registro com esses filtros.")
+
+        with open(options["saida"], "wb") as arquivo:
+            arquivo.write(gerar_capas_pdf(options["tipo"], queryset, tamanho_lote=options["lote"]))
+
+        self.stdout.write(self.style.SUCCESS(f"{total} capas gravadas em {options['saida']}."))
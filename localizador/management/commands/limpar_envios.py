@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from localizador.utils import limpar_envios
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove os envios de documentos em partes abandonados (parados há mais de "
+        "settings.ENVIO_EXPIRA_HORAS) e seus arquivos temporários. Agende-o no cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horas", type=int, default=settings.ENVIO_EXPIRA_HORAS)
+
+    def handle(self, *args, **options):
+        total = limpar_envios(options["horas"])
+        self.stdout.write(self.style.SUCCESS(f"{total} envios removidos."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from localizador.utils import recalcular_resumo_painel
+
+
+class Command(BaseCommand):
+    help = (
+        "Refaz os contadores dos painéis (ResumoPainel) contando as tabelas. "
+        "Use após cargas feitas por fora da aplicação ou se os números divergirem."
+    )
+
+    def handle(self, *args, **options):
+        total = recalcular_resumo_painel()
+        self.stdout.write(self.style.SUCCESS(f"{total} contadores recalculados."))
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+def converter_numeros_em_faixas(apps, schema_editor):
+    NumeroPassivoDisponivel = apps.get_model('localizador', 'NumeroPassivoDisponivel')
+    FaixaPassivoLivre = apps.get_model('localizador', 'FaixaPassivoLivre')
+    Aluno_Arquivo = apps.get_model('localizador', 'Aluno_Arquivo')
+    Profissional_Arquivo = apps.get_model('localizador', 'Profissional_Arquivo')
+
+    for tipo, modelo in (('A', Aluno_Arquivo), ('P', Profissional_Arquivo)):
+        usados = set(
+            modelo.objects
+            .exclude(localizacao_arquivo__isnull=True)
+            .values_list('localizacao_arquivo', flat=True)
+        )
+        proximo = max(usados, default=0) + 1
+
+        # Descarta números "livres" que estão em uso ou além do próximo sequencial
+        livres = sorted(
+            n for n in NumeroPassivoDisponivel.objects.filter(tipo=tipo).values_list('numero', flat=True)
+            if n not in usados and 0 < n < proximo
+        )
+
+        faixas = []
+        for numero in livres:
+            if faixas and faixas[-1][1] == numero - 1:
+                faixas[-1][1] = numero
+            else:
+                faixas.append([numero, numero])
+
+        # Lacuna encostada no próximo sequencial passa a fazer parte da faixa aberta
+        if faixas and faixas[-1][1] == proximo - 1:
+            proximo = faixas.pop()[0]
+
+        FaixaPassivoLivre.objects.bulk_create(
+            [FaixaPassivoLivre(tipo=tipo, inicio=inicio, fim=fim) for inicio, fim in faixas]
+            + [FaixaPassivoLivre(tipo=tipo, inicio=proximo, fim=None)]
+        )
+
+
+def converter_faixas_em_numeros(apps, schema_editor):
+    NumeroPassivoDisponivel = apps.get_model('localizador', 'NumeroPassivoDisponivel')
+    FaixaPassivoLivre = apps.get_model('localizador', 'FaixaPassivoLivre')
+
+    NumeroPassivoDisponivel.objects.bulk_create([
+        NumeroPassivoDisponivel(numero=numero, tipo=faixa.tipo)
+        for faixa in FaixaPassivoLivre.objects.filter(fim__isnull=False)
+        for numero in range(faixa.inicio, faixa.fim + 1)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localizador', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaixaPassivoLivre',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('A', 'Aluno'), ('P', 'Profissional')], max_length=1)),
+                ('inicio', models.IntegerField()),
+                ('fim', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['tipo', 'inicio'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='faixapassivolivre',
+            constraint=models.UniqueConstraint(condition=models.Q(('fim__isnull', True)), fields=('tipo',), name='localizador_faixa_aberta_unica_por_tipo'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='faixapassivolivre',
+            unique_together={('tipo', 'inicio')},
+        ),
+        migrations.RunPython(converter_numeros_em_faixas, converter_faixas_em_numeros),
+        migrations.DeleteModel(
+            name='NumeroPassivoDisponivel',
+        ),
+    ]
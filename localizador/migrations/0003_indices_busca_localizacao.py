@@ -0,0 +1,25 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localizador', '0002_faixapassivolivre'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aluno_arquivo',
+            index=models.Index(fields=['nome_aluno', 'id_aluno_arquivo'], name='localizador_aluno_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aluno_arquivo',
+            index=models.Index(fields=['cpf'], name='localizador_aluno_cpf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profissional_arquivo',
+            index=models.Index(fields=['nome_profissional', 'id_profissional_arquivo'], name='localizador_prof_nome_idx'),
+        ),
+    ]
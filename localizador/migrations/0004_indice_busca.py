@@ -0,0 +1,135 @@
+from django.db import migrations
+
+# Fontes do índice de busca: (código, entidade, tabela, pk, pasta, coluna da pasta, texto).
+# O texto usa {r} como prefixo das colunas (NEW nos triggers, a tabela na carga inicial).
+# O código compõe o id da entrada (pk * 8 + código), para apagar pela chave primária.
+FONTES = [
+    (1, "aluno", "localizador_aluno_arquivo", "id_aluno_arquivo", "A", "id_aluno_arquivo",
+     "{r}.\"nome_aluno\" || ' ' || coalesce({r}.\"cpf\", '') || ' ' "
+     "|| coalesce(replace(replace({r}.\"cpf\", '.', ''), '-', ''), '') || ' ' || {r}.\"cod_sistema\""),
+    (2, "profissional", "localizador_profissional_arquivo", "id_profissional_arquivo", "P", "id_profissional_arquivo",
+     "{r}.\"nome_profissional\" || ' ' || {r}.\"cpf\" || ' ' "
+     "|| replace(replace({r}.\"cpf\", '.', ''), '-', '') || ' ' || coalesce({r}.\"observacoes\", '')"),
+    (3, "pendencia", "localizador_pendencia", "id_pendencia", "A", "aluno_arquivo_id",
+     "{r}.\"tipo_pendencia\" || ' ' || {r}.\"descricao\""),
+    (4, "contato", "localizador_contato", "id_contato", "A", "aluno_arquivo_id",
+     "{r}.\"pessoa_contato\""),
+    (5, "contrato", "localizador_contrato", "Id_numero_contrato", "P", "profissional_arquivo_id",
+     "{r}.\"funcao\""),
+]
+
+
+def _valores(fonte, r):
+    codigo, entidade, _, pk, pasta, coluna_pasta, texto = fonte
+    return (
+        f"{r}.\"{pk}\" * 8 + {codigo}, '{entidade}', '{pasta}', {r}.\"{coluna_pasta}\", "
+        f"{texto.format(r=r)}"
+    )
+
+
+def _triggers_sqlite(fonte):
+    codigo, _, tabela, pk = fonte[:4]
+    colunas = "rowid, entidade, pasta, pasta_id, texto"
+    apagar = f"DELETE FROM localizador_busca WHERE rowid = OLD.\"{pk}\" * 8 + {codigo};"
+    inserir = f"INSERT INTO localizador_busca ({colunas}) VALUES ({_valores(fonte, 'NEW')});"
+    return [
+        f"CREATE TRIGGER localizador_busca_{codigo}_ai AFTER INSERT ON \"{tabela}\" BEGIN {inserir} END",
+        f"CREATE TRIGGER localizador_busca_{codigo}_au AFTER UPDATE ON \"{tabela}\" BEGIN {apagar} {inserir} END",
+        f"CREATE TRIGGER localizador_busca_{codigo}_ad AFTER DELETE ON \"{tabela}\" BEGIN {apagar} END",
+    ]
+
+
+def recriar_triggers_sqlite(schema_editor, tabelas):
+    """
+    No SQLite, migrações que reconstroem uma tabela (AddField NOT NULL,
+    AlterField...) apagam os triggers dela. Chame depois dessas operações.
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for fonte in FONTES:
+        if fonte[2] in tabelas:
+            for comando in _triggers_sqlite(fonte):
+                schema_editor.execute(comando.replace("CREATE TRIGGER", "CREATE TRIGGER IF NOT EXISTS", 1))
+
+
+def _sql_sqlite():
+    comandos = [
+        "CREATE VIRTUAL TABLE localizador_busca USING fts5("
+        "entidade UNINDEXED, pasta UNINDEXED, pasta_id UNINDEXED, texto, "
+        "tokenize='unicode61 remove_diacritics 2')"
+    ]
+    colunas = "rowid, entidade, pasta, pasta_id, texto"
+
+    for fonte in FONTES:
+        tabela = fonte[2]
+        comandos += _triggers_sqlite(fonte)
+        comandos.append(
+            f"INSERT INTO localizador_busca ({colunas}) SELECT {_valores(fonte, 't')} FROM \"{tabela}\" t"
+        )
+    return comandos
+
+
+def _sql_postgresql():
+    comandos = [
+        "CREATE TABLE localizador_busca ("
+        "id bigint PRIMARY KEY, entidade varchar(20) NOT NULL, pasta char(1) NOT NULL, "
+        "pasta_id integer NOT NULL, texto text NOT NULL, "
+        "documento tsvector GENERATED ALWAYS AS (to_tsvector('simple', texto)) STORED)",
+        "CREATE INDEX localizador_busca_documento ON localizador_busca USING gin (documento)",
+    ]
+    colunas = "id, entidade, pasta, pasta_id, texto"
+
+    for fonte in FONTES:
+        codigo, _, tabela, pk = fonte[:4]
+        comandos += [
+            f"CREATE FUNCTION localizador_busca_{codigo}() RETURNS trigger AS $$ BEGIN "
+            f"IF TG_OP IN ('UPDATE', 'DELETE') THEN "
+            f"DELETE FROM localizador_busca WHERE id = OLD.\"{pk}\" * 8 + {codigo}; END IF; "
+            f"IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+            f"INSERT INTO localizador_busca ({colunas}) VALUES ({_valores(fonte, 'NEW')}); END IF; "
+            f"RETURN NULL; END $$ LANGUAGE plpgsql",
+            f"CREATE TRIGGER localizador_busca_{codigo} AFTER INSERT OR UPDATE OR DELETE ON \"{tabela}\" "
+            f"FOR EACH ROW EXECUTE FUNCTION localizador_busca_{codigo}()",
+            f"INSERT INTO localizador_busca ({colunas}) SELECT {_valores(fonte, 't')} FROM \"{tabela}\" t",
+        ]
+    return comandos
+
+
+def criar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        comandos = _sql_sqlite()
+    elif vendor == "postgresql":
+        comandos = _sql_postgresql()
+    else:
+        return  # outros bancos usam a busca sem índice (ver utils.buscar_arquivos)
+
+    for comando in comandos:
+        schema_editor.execute(comando)
+
+
+def remover_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in ("sqlite", "postgresql"):
+        return
+
+    for fonte in FONTES:
+        codigo, _, tabela = fonte[:3]
+        if vendor == "sqlite":
+            for sufixo in ("ai", "au", "ad"):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS localizador_busca_{codigo}_{sufixo}")
+        else:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS localizador_busca_{codigo} ON \"{tabela}\"")
+            schema_editor.execute(f"DROP FUNCTION IF EXISTS localizador_busca_{codigo}()")
+    schema_editor.execute("DROP TABLE IF EXISTS localizador_busca")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localizador', '0003_indices_busca_localizacao'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:09
+
+import re
+import unicodedata
+from importlib import import_module
+
+from django.db import migrations, models
+
+indice_busca = import_module("localizador.migrations.0004_indice_busca")
+
+TABELAS = ("localizador_aluno_arquivo", "localizador_profissional_arquivo")
+
+
+def _normalizar_texto(valor):
+    decomposto = unicodedata.normalize("NFKD", valor or "")
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.casefold().split())[:100]
+
+
+def preencher_campos_busca(apps, schema_editor):
+    for modelo, campo_nome in (("Aluno_Arquivo", "nome_aluno"), ("Profissional_Arquivo", "nome_profissional")):
+        Modelo = apps.get_model("localizador", modelo)
+        lote = []
+        for obj in Modelo.objects.only(campo_nome, "cpf").iterator(chunk_size=2000):
+            obj.nome_busca = _normalizar_texto(getattr(obj, campo_nome))
+            obj.cpf_busca = re.sub(r"\D", "", obj.cpf or "")
+            lote.append(obj)
+            if len(lote) == 2000:
+                Modelo.objects.bulk_update(lote, ["nome_busca", "cpf_busca"])
+                lote = []
+        Modelo.objects.bulk_update(lote, ["nome_busca", "cpf_busca"])
+
+
+def recriar_triggers(apps, schema_editor):
+    # AddField/RemoveField reconstroem as tabelas no SQLite e levam os triggers da 0004
+    indice_busca.recriar_triggers_sqlite(schema_editor, TABELAS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localizador', '0004_indice_busca'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recriar_triggers),
+        migrations.RemoveIndex(
+            model_name='aluno_arquivo',
+            name='localizador_aluno_nome_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='aluno_arquivo',
+            name='localizador_aluno_cpf_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='profissional_arquivo',
+            name='localizador_prof_nome_idx',
+        ),
+        migrations.AddField(
+            model_name='aluno_arquivo',
+            name='cpf_busca',
+            field=models.CharField(default='', editable=False, max_length=11),
+        ),
+        migrations.AddField(
+            model_name='aluno_arquivo',
+            name='nome_busca',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='profissional_arquivo',
+            name='cpf_busca',
+            field=models.CharField(default='', editable=False, max_length=11),
+        ),
+        migrations.AddField(
+            model_name='profissional_arquivo',
+            name='nome_busca',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='aluno_arquivo',
+            index=models.Index(fields=['nome_busca', 'id_aluno_arquivo'], name='localizador_aluno_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aluno_arquivo',
+            index=models.Index(fields=['cpf_busca'], name='localizador_aluno_cpf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profissional_arquivo',
+            index=models.Index(fields=['nome_busca', 'id_profissional_arquivo'], name='localizador_prof_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profissional_arquivo',
+            index=models.Index(fields=['cpf_busca'], name='localizador_prof_cpf_idx'),
+        ),
+        migrations.RunPython(preencher_campos_busca, migrations.RunPython.noop),
+        migrations.RunPython(recriar_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-18 16:40
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+indice_busca = import_module("localizador.migrations.0004_indice_busca")
+
+
+def recriar_triggers(apps, schema_editor):
+    # o AddField reconstrói a tabela no SQLite e leva os triggers da 0004
+    indice_busca.recriar_triggers_sqlite(schema_editor, ("localizador_aluno_arquivo",))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localizador', '0005_campos_busca_normalizados'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recriar_triggers),
+        migrations.AddField(
+            model_name='aluno_arquivo',
+            name='hash_sigeec',
+            field=models.CharField(default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(recriar_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('localizador', '0006_aluno_arquivo_hash_sigeec'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aluno_arquivo',
+            index=models.Index(condition=models.Q(('status_arquivo_aluno', 'P')), fields=['id_aluno_arquivo'], name='localizador_aluno_perm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contrato',
+            index=models.Index(fields=['profissional_arquivo', 'dt_inicial'], name='localizador_contr_prof_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentovinculado',
+            index=models.Index(fields=['content_type', 'object_id'], name='localizador_doc_objeto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendencia',
+            index=models.Index(fields=['aluno_arquivo', 'dt_lancamento_pendencia'], name='localizador_pend_aluno_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profissional_arquivo',
+            index=models.Index(condition=models.Q(('status_arquivo_profissional', 'P')), fields=['id_profissional_arquivo'], name='localizador_prof_perm_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def preencher_resumo(apps, schema_editor):
+    # mesma contagem de utils.recalcular_resumo_painel, com os modelos históricos
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    ResumoPainel = apps.get_model("localizador", "ResumoPainel")
+
+    pastas = dict(
+        ContentType.objects.filter(app_label="localizador", model__in=["aluno_arquivo", "profissional_arquivo"])
+        .values_list("pk", "model")
+    )
+    fontes = [
+        ("Aluno_Arquivo", "aluno_status", "status_arquivo_aluno", None),
+        ("Profissional_Arquivo", "profissional_status", "status_arquivo_profissional", None),
+        ("Pendencia", "pendencia_tipo", "tipo_pendencia", None),
+        ("DocumentoVinculado", "documentos", "content_type_id",
+         lambda pk: {"aluno_arquivo": "A", "profissional_arquivo": "P"}.get(pastas.get(pk))),
+    ]
+
+    contadores = {}
+    for modelo, grupo, campo, converter in fontes:
+        Modelo = apps.get_model("localizador", modelo)
+        for valor, total in Modelo.objects.order_by().values_list(campo).annotate(total=Count("pk")):
+            chave = converter(valor) if converter else valor
+            if chave is not None:
+                contadores[(grupo, chave)] = contadores.get((grupo, chave), 0) + total
+
+    ResumoPainel.objects.bulk_create([
+        ResumoPainel(grupo=grupo, chave=chave, valor=valor) for (grupo, chave), valor in contadores.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('localizador', '0007_indices_consultas_frequentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoPainel',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('grupo', models.CharField(max_length=30)),
+                ('chave', models.CharField(max_length=50)),
+                ('valor', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='contrato',
+            index=models.Index(fields=['dt_final'], name='localizador_contr_fim_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resumopainel',
+            unique_together={('grupo', 'chave')},
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:45
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+indice_busca = import_module("localizador.migrations.0004_indice_busca")
+
+
+def recriar_triggers(apps, schema_editor):
+    # desfazer o AddField reconstrói as tabelas no SQLite e leva os triggers da 0004
+    indice_busca.recriar_triggers_sqlite(
+        schema_editor, ("localizador_aluno_arquivo", "localizador_profissional_arquivo")
+    )
+
+
+def _data_cadastro(auto_now_add):
+    return models.DateTimeField(auto_now_add=auto_now_add, null=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localizador', '0008_resumo_painel'),
+    ]
+
+    # No banco a coluna é só um DateTimeField nulo: com auto_now_add o AddField
+    # preencheria os registros existentes com o momento da migração (e no SQLite
+    # reconstruiria as tabelas, levando os triggers da 0004). Os registros
+    # antigos ficam sem data de cadastro.
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recriar_triggers),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AddField(
+                    model_name=modelo,
+                    name='data_cadastro',
+                    field=_data_cadastro(False),
+                )
+                for modelo in ('aluno_arquivo', 'profissional_arquivo')
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name=modelo,
+                    name='data_cadastro',
+                    field=_data_cadastro(True),
+                )
+                for modelo in ('aluno_arquivo', 'profissional_arquivo')
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:51
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('localizador', '0009_data_cadastro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvioDocumento',
+            fields=[
+                ('id_envio', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('object_id', models.PositiveIntegerField()),
+                ('nome_arquivo', models.CharField(max_length=255)),
+                ('descricao', models.TextField(blank=True, null=True)),
+                ('tamanho', models.PositiveBigIntegerField()),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('recebido', models.PositiveBigIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
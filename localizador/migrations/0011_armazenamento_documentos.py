@@ -0,0 +1,25 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:58
+
+import localizador.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localizador', '0010_envio_documento'),
+    ]
+
+    operations = [
+        # O storage não muda o banco; sem isto o SQLite recriaria a tabela inteira.
+        # Os arquivos existentes são deduplicados pelo comando deduplicar_documentos.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='documentovinculado',
+                    name='arquivo',
+                    field=models.FileField(storage=localizador.models.armazenamento_documentos, upload_to=localizador.models.get_upload_path),
+                ),
+            ],
+        ),
+    ]
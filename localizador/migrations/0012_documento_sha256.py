@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localizador', '0011_armazenamento_documentos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentovinculado',
+            name='sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localizador', '0012_documento_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enviodocumento',
+            name='sha256',
+            field=models.CharField(max_length=64),
+        ),
+    ]
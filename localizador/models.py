@@ -1,15 +1,24 @@
-from django.db import models
-from django.db.models.signals import pre_delete
+import uuid
+from functools import partial
+
+from django.db import models, transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
+from django.core.files.storage import storages
 
 from .utils import (
     get_next_numero_passivo,
     release_numero_passivo,
-    get_numeros_disponiveis
+    ocupar_numero_passivo,
+    numero_passivo_disponivel,
+    normalizar_texto,
+    normalizar_cpf,
+    ajustar_resumo
 )
 
 
@@ -32,7 +41,14 @@ class Usuario(AbstractUser):
         return self.username
 
 
-class NumeroPassivoDisponivel(models.Model):
+class FaixaPassivoLivre(models.Model):
+    """
+    Faixa [inicio, fim] de números de passivo livres de um tipo.
+
+    Cada tipo possui exatamente uma faixa aberta (fim nulo), que começa no
+    próximo número sequencial. As demais faixas são lacunas deixadas por
+    exclusões ou trocas de localização e ficam sempre abaixo da faixa aberta.
+    """
 
     TIPO_CHOICES = (
         ('A', 'Aluno'),
@@ -40,22 +56,82 @@ class NumeroPassivoDisponivel(models.Model):
     )
 
     id = models.AutoField(primary_key=True)
-    numero = models.IntegerField()
     tipo = models.CharField(max_length=1, choices=TIPO_CHOICES)
+    inicio = models.IntegerField()
+    fim = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["tipo", "inicio"]
+        unique_together = ('tipo', 'inicio')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tipo'],
+                condition=models.Q(fim__isnull=True),
+                name='localizador_faixa_aberta_unica_por_tipo'
+            ),
+        ]
+
+    def __str__(self):
+        fim = self.fim if self.fim is not None else "..."
+        return f"{self.inicio}-{fim} - {self.get_tipo_display()}"
+
+
+class ResumoPainel(models.Model):
+    """
+    Contadores dos painéis (ex.: alunos por status, pendências por tipo).
+
+    São ajustados a cada gravação e exclusão pelos receivers de RESUMO_PAINEL
+    e pelos caminhos em lote de utils, de modo que os painéis leem poucas
+    linhas em vez de contar as tabelas. O comando recalcular_painel os refaz.
+    """
+
+    id = models.AutoField(primary_key=True)
+    grupo = models.CharField(max_length=30)
+    chave = models.CharField(max_length=50)
+    valor = models.IntegerField(default=0)
 
     class Meta:
-        ordering = ["numero"]
-        unique_together = ('numero', 'tipo')
+        unique_together = ('grupo', 'chave')
 
     def __str__(self):
-        return f"{self.numero} - {self.get_tipo_display()}"
+        return f"{self.grupo}/{self.chave}: {self.valor}"
+
+
+class ResumoPainelMixin:
+    """
+    Para os modelos de RESUMO_PAINEL: guarda em from_db() o valor do campo
+    contado, lido do banco (como _localizacao_original), para que uma edição
+    desconte a chave anterior sem consultá-la (ver _resumo_pre_save).
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._valor_resumo_original = instance.__dict__.get(RESUMO_PAINEL[cls][1], DEFERRED)
+        return instance
+
+
+def _get_localizacao_original(instance):
+    """Localização gravada no banco, capturada em from_db() quando possível."""
+    original = getattr(instance, "_localizacao_original", DEFERRED)
+
+    if original is DEFERRED and instance.pk:
+        # instância montada à mão ou carregada sem o campo (only/defer)
+        original = (
+            type(instance).objects
+            .filter(pk=instance.pk)
+            .values_list("localizacao_arquivo", flat=True)
+            .first()
+        )
+
+    return None if original is DEFERRED else original
 
 
 # =========================
 # PROFISSIONAL
 # =========================
 
-class Profissional_Arquivo(models.Model):
+class Profissional_Arquivo(ResumoPainelMixin, models.Model):
     id_profissional_arquivo = models.AutoField(primary_key=True)
 
     usuario = models.ForeignKey(
@@ -80,44 +156,74 @@ class Profissional_Arquivo(models.Model):
 
     observacoes = models.TextField(blank=True, null=True)
 
+    # Colunas de busca (sem acentos/minúsculas e só dígitos), preenchidas no save()
+    nome_busca = models.CharField(max_length=100, editable=False, default="")
+    cpf_busca = models.CharField(max_length=11, editable=False, default="")
+
+    # Momento do cadastro (capas em lote); nula nos registros anteriores à migração 0009
+    data_cadastro = models.DateTimeField(auto_now_add=True, null=True)
+
+    # Documentos vinculados; também os exclui em cascata junto com o servidor
+    documentos = GenericRelation("DocumentoVinculado", related_query_name="profissional_arquivo")
+
+    class Meta:
+        indexes = [
+            # ordem da listagem paginada (keyset) e busca por prefixo do nome
+            models.Index(fields=["nome_busca", "id_profissional_arquivo"], name="localizador_prof_nome_idx"),
+            models.Index(fields=["cpf_busca"], name="localizador_prof_cpf_idx"),
+            # só os arquivos permanentes, os candidatos ao expurgo
+            models.Index(
+                fields=["id_profissional_arquivo"],
+                condition=models.Q(status_arquivo_profissional='P'),
+                name="localizador_prof_perm_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._localizacao_original = instance.__dict__.get("localizacao_arquivo", DEFERRED)
+        return instance
+
     def clean(self):
-        if self.localizacao_arquivo:
-            numeros_validos = get_numeros_disponiveis('P')
-            if self.localizacao_arquivo not in numeros_validos:
+        if self.localizacao_arquivo and self.localizacao_arquivo != _get_localizacao_original(self):
+            if not numero_passivo_disponivel(self.localizacao_arquivo, 'P'):
                 raise ValidationError({
                     "localizacao_arquivo":
                         "Número inválido. Use apenas número disponível ou o próximo sequencial."
                 })
 
-    def save(self, *args, **kwargs):
-        from .models import NumeroPassivoDisponivel
-
-        if self.pk:
-        # está editando
-            antigo = Profissional_Arquivo.objects.get(pk=self.pk)
+    def atualizar_campos_busca(self):
+        self.nome_busca = normalizar_texto(self.nome_profissional)[:100]
+        self.cpf_busca = normalizar_cpf(self.cpf)
 
-            if antigo.localizacao_arquivo != self.localizacao_arquivo:
-            # devolve número antigo
-                if antigo.localizacao_arquivo:
-                    release_numero_passivo(antigo.localizacao_arquivo, 'P')
-
-                # remove o novo da tabela se estiver lá
-                NumeroPassivoDisponivel.objects.filter(
-                    numero=self.localizacao_arquivo,
-                    tipo='P'
-                ).delete()
+    def save(self, *args, **kwargs):
+        self.atualizar_campos_busca()
+        original = _get_localizacao_original(self)
 
+        if self.pk and original == self.localizacao_arquivo:
+            # edição que não troca a localização: apenas o UPDATE
+            super().save(*args, **kwargs)
         else:
-            # está criando
-            if not self.localizacao_arquivo:
-                self.localizacao_arquivo = get_next_numero_passivo('P')
-            else:
-                NumeroPassivoDisponivel.objects.filter(
-                    numero=self.localizacao_arquivo,
-                    tipo='P'
-                ).delete()
-
-        super().save(*args, **kwargs)
+            # Alocação e gravação na mesma transação: o número só fica ocupado se o
+            # registro for salvo, e o lock das faixas vale até o INSERT/UPDATE.
+            with transaction.atomic():
+                if self.pk:
+                # está editando: devolve o número antigo e retira o novo das faixas livres
+                    if original:
+                        release_numero_passivo(original, 'P')
+                    ocupar_numero_passivo(self.localizacao_arquivo, 'P')
+
+                else:
+                    # está criando
+                    if not self.localizacao_arquivo:
+                        self.localizacao_arquivo = get_next_numero_passivo('P')
+                    else:
+                        ocupar_numero_passivo(self.localizacao_arquivo, 'P')
+
+                super().save(*args, **kwargs)
+
+        self._localizacao_original = self.localizacao_arquivo
 
     def __str__(self):
         return self.nome_aluno
@@ -151,6 +257,14 @@ class Contrato(models.Model):
     dt_final = models.DateField()
     tipo_contrato = models.CharField(max_length=1)
 
+    class Meta:
+        indexes = [
+            # contratos de um servidor do mais recente ao mais antigo (capa, inventário)
+            models.Index(fields=["profissional_arquivo", "dt_inicial"], name="localizador_contr_prof_dt_idx"),
+            # contratos a vencer (painel dos servidores)
+            models.Index(fields=["dt_final"], name="localizador_contr_fim_idx"),
+        ]
+
     def __str__(self):
         return f"Contrato {self.Id_numero_contrato} para {self.profissional_arquivo.nome_profissional}"
 
@@ -159,7 +273,7 @@ class Contrato(models.Model):
 # ALUNO
 # =========================
 
-class Aluno_Arquivo(models.Model):
+class Aluno_Arquivo(ResumoPainelMixin, models.Model):
     id_aluno_arquivo = models.AutoField(primary_key=True)
 
     usuario = models.ForeignKey(
@@ -183,44 +297,77 @@ class Aluno_Arquivo(models.Model):
         blank=True
     )
 
+    # Colunas de busca (sem acentos/minúsculas e só dígitos), preenchidas no save()
+    nome_busca = models.CharField(max_length=100, editable=False, default="")
+    cpf_busca = models.CharField(max_length=11, editable=False, default="")
+
+    # Hash da última linha importada do SIGEEC; vazio se o aluno não veio de lá
+    hash_sigeec = models.CharField(max_length=32, editable=False, default="")
+
+    # Momento do cadastro (capas em lote); nula nos registros anteriores à migração 0009
+    data_cadastro = models.DateTimeField(auto_now_add=True, null=True)
+
+    # Documentos vinculados; também os exclui em cascata junto com o aluno
+    documentos = GenericRelation("DocumentoVinculado", related_query_name="aluno_arquivo")
+
+    class Meta:
+        indexes = [
+            # ordem da listagem paginada (keyset) e busca por prefixo do nome
+            models.Index(fields=["nome_busca", "id_aluno_arquivo"], name="localizador_aluno_nome_idx"),
+            models.Index(fields=["cpf_busca"], name="localizador_aluno_cpf_idx"),
+            # só os arquivos permanentes, os candidatos ao expurgo
+            models.Index(
+                fields=["id_aluno_arquivo"],
+                condition=models.Q(status_arquivo_aluno='P'),
+                name="localizador_aluno_perm_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._localizacao_original = instance.__dict__.get("localizacao_arquivo", DEFERRED)
+        return instance
+
     def clean(self):
-        if self.localizacao_arquivo:
-            numeros_validos = get_numeros_disponiveis('A')
-            if self.localizacao_arquivo not in numeros_validos:
+        if self.localizacao_arquivo and self.localizacao_arquivo != _get_localizacao_original(self):
+            if not numero_passivo_disponivel(self.localizacao_arquivo, 'A'):
                 raise ValidationError({
                     "localizacao_arquivo":
                         "Número inválido. Use apenas número disponível ou o próximo sequencial."
                 })
 
-    def save(self, *args, **kwargs):
-        from .models import NumeroPassivoDisponivel
-
-        if self.pk:
-        # está editando
-            antigo = Aluno_Arquivo.objects.get(pk=self.pk)
+    def atualizar_campos_busca(self):
+        self.nome_busca = normalizar_texto(self.nome_aluno)[:100]
+        self.cpf_busca = normalizar_cpf(self.cpf)
 
-            if antigo.localizacao_arquivo != self.localizacao_arquivo:
-            # devolve número antigo
-                if antigo.localizacao_arquivo:
-                    release_numero_passivo(antigo.localizacao_arquivo, 'A')
-
-                # remove o novo da tabela se estiver lá
-                NumeroPassivoDisponivel.objects.filter(
-                    numero=self.localizacao_arquivo,
-                    tipo='A'
-                ).delete()
+    def save(self, *args, **kwargs):
+        self.atualizar_campos_busca()
+        original = _get_localizacao_original(self)
 
+        if self.pk and original == self.localizacao_arquivo:
+            # edição que não troca a localização: apenas o UPDATE
+            super().save(*args, **kwargs)
         else:
-            # está criando
-            if not self.localizacao_arquivo:
-                self.localizacao_arquivo = get_next_numero_passivo('A')
-            else:
-                NumeroPassivoDisponivel.objects.filter(
-                    numero=self.localizacao_arquivo,
-                    tipo='A'
-                ).delete()
-
-        super().save(*args, **kwargs)
+            # Alocação e gravação na mesma transação: o número só fica ocupado se o
+            # registro for salvo, e o lock das faixas vale até o INSERT/UPDATE.
+            with transaction.atomic():
+                if self.pk:
+                # está editando: devolve o número antigo e retira o novo das faixas livres
+                    if original:
+                        release_numero_passivo(original, 'A')
+                    ocupar_numero_passivo(self.localizacao_arquivo, 'A')
+
+                else:
+                    # está criando
+                    if not self.localizacao_arquivo:
+                        self.localizacao_arquivo = get_next_numero_passivo('A')
+                    else:
+                        ocupar_numero_passivo(self.localizacao_arquivo, 'A')
+
+                super().save(*args, **kwargs)
+
+        self._localizacao_original = self.localizacao_arquivo
 
     def __str__(self):
         return self.nome_aluno
@@ -256,7 +403,7 @@ class Contato(models.Model):
 # PENDÊNCIA
 # =========================
 
-class Pendencia(models.Model):
+class Pendencia(ResumoPainelMixin, models.Model):
     id_pendencia = models.AutoField(primary_key=True)
 
     aluno_arquivo = models.ForeignKey(
@@ -269,6 +416,12 @@ class Pendencia(models.Model):
     tipo_pendencia = models.CharField(max_length=50)
     descricao = models.CharField(max_length=200)
 
+    class Meta:
+        indexes = [
+            # pendências de um aluno por data de lançamento (capa, inventário)
+            models.Index(fields=["aluno_arquivo", "dt_lancamento_pendencia"], name="localizador_pend_aluno_dt_idx"),
+        ]
+
     def __str__(self):
         return f"Pendência para {self.aluno_arquivo.nome_aluno}: {self.tipo_pendencia}"
 
@@ -281,11 +434,15 @@ def get_upload_path(instance, filename):
     return f"{instance.content_type.model}/{instance.object_id}/{filename}"
 
 
-class DocumentoVinculado(models.Model):
+def armazenamento_documentos():
+    return storages["documentos"]
+
+
+class DocumentoVinculado(ResumoPainelMixin, models.Model):
     id_documento = models.AutoField(primary_key=True)
 
     nome_arquivo = models.CharField(max_length=255)
-    arquivo = models.FileField(upload_to=get_upload_path)
+    arquivo = models.FileField(upload_to=get_upload_path, storage=armazenamento_documentos)
     data_upload = models.DateTimeField(auto_now_add=True)
 
     tipo_arquivo = models.CharField(max_length=50, blank=True)
@@ -295,10 +452,27 @@ class DocumentoVinculado(models.Model):
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey("content_type", "object_id")
 
+    # Blob do arquivo no armazenamento deduplicado; nulo nos documentos
+    # anteriores ainda não passados pelo comando deduplicar_documentos
+    sha256 = models.CharField(max_length=64, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # documentos de um aluno/servidor (GenericRelation, catálogo, exclusão em cascata)
+            models.Index(fields=["content_type", "object_id"], name="localizador_doc_objeto_idx"),
+        ]
+
     def __str__(self):
         return self.nome_arquivo
 
     def save(self, *args, **kwargs):
+        if self.arquivo and not self.arquivo._committed:
+            # Grava o arquivo antes do registro para guardar o SHA-256 que o
+            # armazenamento anotou no conteúdo (ver ArmazenamentoDeduplicado)
+            conteudo = self.arquivo.file
+            self.arquivo.save(self.arquivo.name, conteudo, save=False)
+            self.sha256 = getattr(conteudo, "sha256", None)
+
         if not self.nome_arquivo:
             self.nome_arquivo = self.arquivo.name
 
@@ -310,5 +484,106 @@ class DocumentoVinculado(models.Model):
         super().save(*args, **kwargs)
 
 
+@receiver(post_delete, sender=DocumentoVinculado)
+def documento_vinculado_post_delete(sender, instance, **kwargs):
+    # Único ponto que apaga o arquivo, também na exclusão em cascata de um
+    # aluno/servidor e no expurgo; só depois do commit, se a exclusão valer.
+    # No armazenamento deduplicado, o último documento leva o blob junto.
+    if instance.arquivo:
+        transaction.on_commit(partial(instance.arquivo.storage.delete, instance.arquivo.name, instance.sha256))
+
+
+class EnvioDocumento(models.Model):
+    """
+    Envio em partes, retomável, de um documento grande (ver utils.gravar_parte_envio).
+
+    As partes são gravadas direto num arquivo temporário em
+    settings.PASTA_ENVIOS; recebido é quantos bytes já chegaram, ponto de onde
+    o envio continua. Completo e conferido, o arquivo vira um DocumentoVinculado.
+    """
+
+    id_envio = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name="envios"
+    )
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+
+    nome_arquivo = models.CharField(max_length=255)
+    descricao = models.TextField(blank=True, null=True)
+
+    tamanho = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)  # do arquivo inteiro
+    recebido = models.PositiveBigIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.recebido}/{self.tamanho})"
+
+
+# =========================
+# RESUMO DOS PAINÉIS
+# =========================
+
+def _pasta_do_documento(content_type_id):
+    modelo = ContentType.objects.get_for_id(content_type_id).model
+    return {"aluno_arquivo": 'A', "profissional_arquivo": 'P'}.get(modelo)
+
+
+# Cada registro conta 1 no ResumoPainel, no grupo indicado e com a chave
+# tirada do campo (convertida pela função, quando houver).
+RESUMO_PAINEL = {
+    Aluno_Arquivo: ("aluno_status", "status_arquivo_aluno", None),
+    Profissional_Arquivo: ("profissional_status", "status_arquivo_profissional", None),
+    Pendencia: ("pendencia_tipo", "tipo_pendencia", None),
+    DocumentoVinculado: ("documentos", "content_type_id", _pasta_do_documento),
+}
+
+
+def chave_resumo(modelo, valor):
+    grupo, _, converter = RESUMO_PAINEL[modelo]
+    return (grupo, converter(valor) if converter else valor)
+
+
+def _resumo_pre_save(sender, instance, **kwargs):
+    # numa edição, guarda a chave gravada no banco para descontá-la no post_save
+    instance._chave_resumo_anterior = None
+    if instance._state.adding:
+        return
+
+    original = getattr(instance, "_valor_resumo_original", DEFERRED)
+    if original is DEFERRED:
+        # montado à mão ou carregado sem o campo (only/defer): consulta o valor gravado
+        campo = RESUMO_PAINEL[sender][1]
+        valores = sender.objects.filter(pk=instance.pk).values_list(campo, flat=True)[:1]
+        if not valores:
+            return
+        original = valores[0]
+    instance._chave_resumo_anterior = chave_resumo(sender, original)
+
+
+def _resumo_post_save(sender, instance, **kwargs):
+    valor = getattr(instance, RESUMO_PAINEL[sender][1])
+    anterior = getattr(instance, "_chave_resumo_anterior", None)
+    atual = chave_resumo(sender, valor)
+    if anterior != atual:
+        ajustes = {atual: 1}
+        if anterior:
+            ajustes[anterior] = -1
+        ajustar_resumo(ajustes)
+    instance._valor_resumo_original = valor
+
+
+def _resumo_post_delete(sender, instance, **kwargs):
+    ajustar_resumo({chave_resumo(sender, getattr(instance, RESUMO_PAINEL[sender][1])): -1})
+
 
-        
\ No newline at end of file
+for _modelo in RESUMO_PAINEL:
+    pre_save.connect(_resumo_pre_save, sender=_modelo)
+    post_save.connect(_resumo_post_save, sender=_modelo)
+    post_delete.connect(_resumo_post_delete, sender=_modelo)
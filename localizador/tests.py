@@ -1,3 +1,1548 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import re
+import tempfile
+import unittest
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models.signals import post_init
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .forms import AlunoArquivoForm
+from . import utils
+from .views import PDFCapaBase
+from . import urls
+from .models import (
+    Usuario, Aluno_Arquivo, Profissional_Arquivo, Contato, Pendencia, Contrato,
+    DocumentoVinculado, EnvioDocumento, FaixaPassivoLivre, ResumoPainel
+)
+from .utils import (
+    abrir_csv_sigeec,
+    auditar_faixas,
+    buscar_arquivos,
+    buscar_numeros_disponiveis,
+    capas_queryset,
+    criar_em_lote_com_localizacao,
+    expurgar_arquivos,
+    filtrar_arquivos_por_termo,
+    filtro_prefixo,
+    fontes_capa,
+    get_faixas_disponiveis_cache,
+    get_faixas_disponiveis,
+    get_numeros_disponiveis,
+    get_next_numero_passivo,
+    importar_sigeec,
+    inventario_queryset,
+    numero_passivo_disponivel,
+    ocupar_numeros_passivo,
+    paginar_por_chave,
+    recalcular_resumo_painel,
+    resumo_painel,
+    release_numero_passivo,
+    reservar_numeros_passivo,
+)
+
+
+def criar_usuario():
+    return Usuario.objects.create_user(
+        username="secretaria",
+        password="senha",
+        cpf_usuario="000.000.000-00"
+    )
+
+
+class FaixaPassivoLivreTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+
+    def criar_aluno(self, cod_sistema, **kwargs):
+        return Aluno_Arquivo.objects.create(
+            usuario=self.usuario,
+            status_arquivo_aluno='A',
+            cod_sistema=cod_sistema,
+            nome_aluno=f"Aluno {cod_sistema}",
+            **kwargs
+        )
+
+    def test_numeros_sequenciais_sem_lacunas(self):
+        alunos = [self.criar_aluno(cod) for cod in range(1, 4)]
+
+        self.assertEqual([a.localizacao_arquivo for a in alunos], [1, 2, 3])
+        self.assertEqual(get_faixas_disponiveis('A'), [(4, None)])
+        self.assertEqual(get_numeros_disponiveis('A'), [4])
+
+    def test_exclusao_abre_lacuna_e_reaproveita(self):
+        alunos = [self.criar_aluno(cod) for cod in range(1, 6)]
+        alunos[1].delete()
+        alunos[2].delete()
+
+        self.assertEqual(get_faixas_disponiveis('A'), [(2, 3), (6, None)])
+        self.assertTrue(numero_passivo_disponivel(3, 'A'))
+        self.assertTrue(numero_passivo_disponivel(6, 'A'))
+        self.assertFalse(numero_passivo_disponivel(4, 'A'))
+        self.assertFalse(numero_passivo_disponivel(7, 'A'))
+
+        self.assertEqual(self.criar_aluno(10).localizacao_arquivo, 2)
+        self.assertEqual(get_numeros_disponiveis('A'), [3, 6])
+
+    def test_liberacao_junta_faixas_vizinhas(self):
+        alunos = [self.criar_aluno(cod) for cod in range(1, 6)]
+        alunos[1].delete()
+        alunos[3].delete()
+        alunos[2].delete()
+
+        self.assertEqual(get_faixas_disponiveis('A'), [(2, 4), (6, None)])
+
+        alunos[4].delete()
+        self.assertEqual(get_faixas_disponiveis('A'), [(2, None)])
+
+    def test_numero_escolhido_divide_faixa(self):
+        self.criar_aluno(1, localizacao_arquivo=5)
+
+        self.assertEqual(get_faixas_disponiveis('A'), [(1, 4), (6, None)])
+        self.assertEqual(get_next_numero_passivo('A'), 1)
+        self.assertEqual(get_faixas_disponiveis('A'), [(2, 4), (6, None)])
+
+    def test_troca_de_localizacao_devolve_a_antiga(self):
+        aluno = self.criar_aluno(1)
+        self.criar_aluno(2)
+        release_numero_passivo(5, 'A')  # liberar número já livre não deve duplicar
+        aluno.localizacao_arquivo = 3
+        aluno.save()
+
+        self.assertEqual(get_faixas_disponiveis('A'), [(1, 1), (4, None)])
+        self.assertEqual(FaixaPassivoLivre.objects.filter(tipo='P').count(), 1)
+
+    def test_auditoria_corrige_faixas_divergentes(self):
+        for cod in range(1, 6):
+            self.criar_aluno(cod)
+        # Divergências simuladas: 3 marcado como livre estando em uso, 7 fora das faixas
+        Aluno_Arquivo.objects.filter(cod_sistema=5).update(localizacao_arquivo=8)
+        FaixaPassivoLivre.objects.filter(tipo='A').delete()
+        FaixaPassivoLivre.objects.create(tipo='A', inicio=3, fim=3)
+        FaixaPassivoLivre.objects.create(tipo='A', inicio=5, fim=6)
+        FaixaPassivoLivre.objects.create(tipo='A', inicio=9, fim=None)
+
+        relatorio = auditar_faixas('A')
+        self.assertEqual(relatorio["em_uso"], [(3, 3)])
+        self.assertEqual(relatorio["perdidos"], [(7, 7)])
+
+        auditar_faixas('A', corrigir=True)
+        self.assertEqual(get_faixas_disponiveis('A'), [(5, 7), (9, None)])
+        self.assertFalse(auditar_faixas('A')["em_uso"] or auditar_faixas('A')["perdidos"])
+
+
+class ReservaEmLoteTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+
+    def test_reserva_contigua_usa_lacuna_que_comporta_o_bloco(self):
+        ocupar_numeros_passivo(range(1, 11), 'A')
+        for numero in (2, 3, 6, 7, 8):
+            release_numero_passivo(numero, 'A')
+
+        self.assertEqual(get_faixas_disponiveis('A'), [(2, 3), (6, 8), (11, None)])
+        self.assertEqual(reservar_numeros_passivo('A', 3), [6, 7, 8])
+        self.assertEqual(reservar_numeros_passivo('A', 3), [11, 12, 13])
+        self.assertEqual(get_faixas_disponiveis('A'), [(2, 3), (14, None)])
+
+    def test_reserva_nao_contigua_preenche_lacunas(self):
+        ocupar_numeros_passivo([1, 4, 5], 'A')
+
+        self.assertEqual(get_faixas_disponiveis('A'), [(2, 3), (6, None)])
+        self.assertEqual(reservar_numeros_passivo('A', 4, contiguo=False), [2, 3, 6, 7])
+        self.assertEqual(get_faixas_disponiveis('A'), [(8, None)])
+
+    def test_regravar_faixas_sem_colisao_no_inicio(self):
+        # A faixa aberta desce para o início de uma faixa removida, e uma faixa
+        # nova começa onde outra foi removida: nada pode violar o unique (tipo, inicio)
+        ocupar_numeros_passivo(range(1, 20), 'A')
+        for numero in (5, 6, 7, 9):
+            release_numero_passivo(numero, 'A')
+        self.assertEqual(get_faixas_disponiveis('A'), [(5, 7), (9, 9), (20, None)])
+
+        utils._regravar_faixas('A', utils._get_faixas_com_id('A'), [(5, 5), (9, None)])
+
+        self.assertEqual(get_faixas_disponiveis('A'), [(5, 5), (9, None)])
+
+    def test_criar_em_lote_com_numero_constante_de_queries(self):
+        alunos = [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=cod, nome_aluno=f"Aluno {cod}")
+            for cod in range(1, 201)
+        ]
+        alunos[10].localizacao_arquivo = 500
+
+        # reserva, inserts em lotes (3 no SQLite: 999 parâmetros / 10 colunas) e um upsert no resumo
+        with self.assertNumQueries(12):
+            criar_em_lote_com_localizacao(Aluno_Arquivo, alunos)
+
+        numeros = sorted(Aluno_Arquivo.objects.values_list("localizacao_arquivo", flat=True))
+        self.assertEqual(numeros, list(range(1, 200)) + [500])
+        self.assertEqual(get_faixas_disponiveis('A'), [(200, 499), (501, None)])
+
+
+class CacheFaixasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = criar_usuario()
+
+    def test_busca_por_prefixo_sem_expandir_faixas(self):
+        ocupar_numeros_passivo(range(1, 200), 'A')
+        for numero in (5, 12, 120, 121, 150):
+            release_numero_passivo(numero, 'A')
+
+        self.assertEqual(buscar_numeros_disponiveis('A', ""), [5, 12, 120, 121, 150, 200])
+        self.assertEqual(buscar_numeros_disponiveis('A', "12"), [12, 120, 121])
+        self.assertEqual(buscar_numeros_disponiveis('A', "2"), [200])
+        self.assertEqual(buscar_numeros_disponiveis('A', "1", limite=2), [12, 120])
+        self.assertEqual(buscar_numeros_disponiveis('A', "x"), [])
+
+    def test_alteracao_nas_faixas_invalida_o_cache(self):
+        self.assertEqual(get_faixas_disponiveis_cache('A'), [(1, None)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Aluno_Arquivo.objects.create(
+                usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=1, nome_aluno="Aluno"
+            )
+
+        self.assertEqual(get_faixas_disponiveis_cache('A'), [(2, None)])
+        with self.assertNumQueries(0):
+            get_faixas_disponiveis_cache('A')
+
+    def test_formulario_nao_lista_todos_os_numeros(self):
+        ocupar_numeros_passivo(range(1, 2000, 2), 'A')
+
+        html = str(AlunoArquivoForm()["localizacao_arquivo"])
+
+        self.assertNotIn("<option", html)
+        self.assertIn('value="2"', html)
+
+
+class SaveLocalizacaoTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+        self.aluno = Aluno_Arquivo.objects.create(
+            usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=1, nome_aluno="Aluno"
+        )
+
+    def test_edicao_sem_trocar_localizacao_faz_apenas_o_update(self):
+        aluno = Aluno_Arquivo.objects.get(pk=self.aluno.pk)
+        aluno.nome_aluno = "Aluno Renomeado"
+
+        with self.assertNumQueries(1):
+            aluno.save()
+
+    def test_edicao_pelo_formulario_aceita_a_propria_localizacao(self):
+        aluno = Aluno_Arquivo.objects.get(pk=self.aluno.pk)
+        form = AlunoArquivoForm({
+            "status_arquivo_aluno": 'P',
+            "cod_sistema": 1,
+            "nome_aluno": "Aluno",
+            "localizacao_arquivo": aluno.localizacao_arquivo,
+        }, instance=aluno)
+
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_troca_de_localizacao_sem_recarregar(self):
+        self.aluno.localizacao_arquivo = 5
+        self.aluno.save()
+        self.aluno.localizacao_arquivo = 1
+        self.aluno.save()
+
+        self.assertEqual(get_faixas_disponiveis('A'), [(2, None)])
+
+
+class ExpurgoTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+        alunos = [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='P' if cod % 2 else 'A',
+                          cod_sistema=cod, nome_aluno=f"Aluno {cod}")
+            for cod in range(1, 101)
+        ]
+        criar_em_lote_com_localizacao(Aluno_Arquivo, alunos)
+        for aluno in Aluno_Arquivo.objects.filter(cod_sistema__lte=10):
+            Contato.objects.create(aluno_arquivo=aluno, telefone="0", pessoa_contato="Mãe")
+
+    def test_expurgo_em_lotes_devolve_os_numeros(self):
+        total = expurgar_arquivos(Aluno_Arquivo.objects.filter(status_arquivo_aluno='P'), tamanho_lote=20)
+
+        self.assertEqual(total, 50)
+        self.assertEqual(Aluno_Arquivo.objects.count(), 50)
+        self.assertEqual(Contato.objects.count(), 5)
+        # números pares livres; o último (100) continua em uso
+        faixas = get_faixas_disponiveis('A')
+        self.assertEqual(len(faixas), 51)
+        self.assertEqual(faixas[:2], [(1, 1), (3, 3)])
+        self.assertEqual(faixas[-1], (101, None))
+
+    def test_receivers_nao_liberam_numero_a_numero(self):
+        queryset = Aluno_Arquivo.objects.filter(cod_sistema__gt=50)
+
+        # por lote, as liberações e os ajustes do resumo dos painéis saem juntos no final
+        with self.assertNumQueries(17):
+            expurgar_arquivos(queryset, tamanho_lote=100)
+
+        self.assertEqual(get_faixas_disponiveis('A'), [(51, None)])
+
+
+class BuscaLocalizacaoTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+        alunos = [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=cod,
+                          nome_aluno="Maria" if cod <= 3 else f"Aluno {cod:03d}", cpf=f"{cod:03d}.000.000-00")
+            for cod in range(1, 121)
+        ]
+        criar_em_lote_com_localizacao(Aluno_Arquivo, alunos)
+
+    def test_paginacao_por_chave_percorre_tudo_sem_repetir(self):
+        queryset = Aluno_Arquivo.objects.all()
+        ordem = ("nome_aluno", "id_aluno_arquivo")
+        vistos = []
+        cursor = None
+
+        while True:
+            itens, cursor = paginar_por_chave(queryset, ordem, cursor, tamanho=50)
+            vistos.extend(a.pk for a in itens)
+            if not cursor:
+                break
+
+        esperado = list(queryset.order_by(*ordem).values_list("pk", flat=True))
+        self.assertEqual(vistos, esperado)
+
+    def test_busca_incremental_devolve_uma_pagina(self):
+        self.client.force_login(self.usuario)
+        url = reverse('student_file_location_search')
+
+        dados = self.client.get(url, {'q': 'mar'}).json()
+        self.assertEqual([r['nome'] for r in dados['resultados']], ["Maria"] * 3)
+        self.assertIsNone(dados['proximo'])
+
+        self.assertEqual(self.client.get(url, {'q': '117'}).json()['resultados'][0]['cod_sistema'], 117)
+
+    def test_busca_ignora_acentos_e_pontuacao_do_cpf(self):
+        criar_em_lote_com_localizacao(Aluno_Arquivo, [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=500,
+                          nome_aluno="José da Conceição", cpf="321.654.987-00")
+        ])
+        self.client.force_login(self.usuario)
+        url = reverse('student_file_location_search')
+
+        # nome pelo começo (sobrenomes soltos ficam com a busca unificada)
+        for termo in ("jose", "JOSE DA CONCEICAO", "José da Concei", "32165", "321.654"):
+            nomes = [r['nome'] for r in self.client.get(url, {'q': termo}).json()['resultados']]
+            self.assertEqual(nomes, ["José da Conceição"], termo)
+
+        dados = self.client.get(url).json()
+        self.assertEqual(len(dados['resultados']), 50)
+        segunda = self.client.get(url, {'cursor': dados['proximo']}).json()
+        self.assertEqual(segunda['resultados'][0]['nome'], "Aluno 054")
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "planos de consulta no formato do SQLite")
+    def test_busca_incremental_so_le_pelo_indice(self):
+        # Cada tecla é uma requisição: nenhuma página (nem a seguinte, pelo
+        # cursor) pode percorrer a tabela ou um índice inteiro
+        self.client.force_login(self.usuario)
+        for rota in ('student_file_location_search', 'professional_file_location_search'):
+            for termo in ("al", "aluno 0", "zzz", "1", "117", "001.0"):
+                with self.subTest(rota=rota, termo=termo), CaptureQueriesContext(connection) as consultas:
+                    dados = self.client.get(reverse(rota), {'q': termo}).json()
+                    if dados['proximo']:
+                        self.client.get(reverse(rota), {'q': termo, 'cursor': dados['proximo']})
+                    for consulta in consultas:
+                        if "_arquivo" not in consulta['sql'] or not consulta['sql'].startswith("SELECT"):
+                            continue
+                        with connection.cursor() as cursor:
+                            cursor.execute("EXPLAIN QUERY PLAN " + consulta['sql'])
+                            plano = "\n".join(linha[-1] for linha in cursor.fetchall())
+                        self.assertNotRegex(plano, r"SCAN localizador_\w+_arquivo\b", consulta['sql'])
+
+    def test_cpf_curto_nao_busca_por_prefixo(self):
+        self.client.force_login(self.usuario)
+        dados = self.client.get(reverse('student_file_location_search'), {'q': '1'}).json()
+        # só o código e a localização 1, não os CPFs que começam com 1
+        self.assertEqual({r['cod_sistema'] for r in dados['resultados']}, {1})
+
+    def test_termo_so_com_acentos_soltos(self):
+        self.client.force_login(self.usuario)
+        for rota in ('student_file_location_search', 'student_file_location'):
+            with self.subTest(rota=rota):
+                self.assertEqual(self.client.get(reverse(rota), {'q': "\u0301"}).status_code, 200)
+        self.assertEqual(
+            self.client.get(reverse('api_listar', args=['alunos']), {'nome': "\u0301"}).status_code, 400
+        )
+
+    def test_cursor_adulterado_recomeca_da_primeira_pagina(self):
+        self.client.force_login(self.usuario)
+        url = reverse('student_file_location_search')
+        primeira = self.client.get(url).json()['resultados']
+
+        for valores in (["a", "zz"], ["a", {"x": 1}], ["a", None], {"a": 1}, ["a"], "a"):
+            cursor = utils._codificar_cursor(valores)
+            with self.subTest(cursor=valores):
+                resposta = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(resposta.status_code, 200)
+                self.assertEqual(resposta.json()['resultados'], primeira)
+        self.assertEqual(self.client.get(url, {'cursor': "%%%"}).status_code, 200)
+
+
+class IndiceBuscaTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+        self.aluno = Aluno_Arquivo.objects.create(
+            usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=4321,
+            nome_aluno="João da Conceição", cpf="123.456.789-00"
+        )
+        self.profissional = Profissional_Arquivo.objects.create(
+            usuario=self.usuario, status_arquivo_profissional='A',
+            nome_profissional="Ana Souza", cpf="987.654.321-00"
+        )
+
+    def test_busca_sem_acento_por_nome_cpf_e_codigo(self):
+        for termo in ("joao conceicao", "Concei", "12345678900", "4321"):
+            resultados = buscar_arquivos(termo)
+            self.assertEqual([(r["tipo"], r["id"]) for r in resultados], [('A', self.aluno.pk)], termo)
+
+    def test_entidades_relacionadas_apontam_para_a_pasta(self):
+        Contato.objects.create(aluno_arquivo=self.aluno, telefone="0", pessoa_contato="Beatriz Avó")
+        Contrato.objects.create(
+            profissional_arquivo=self.profissional, matricula=1, funcao="Merendeira",
+            dt_inicial="2024-01-01", dt_final="2024-12-31", tipo_contrato='T'
+        )
+
+        resultado = buscar_arquivos("beatriz")[0]
+        self.assertEqual((resultado["id"], resultado["encontrado_em"]), (self.aluno.pk, ["contato"]))
+        self.assertEqual(buscar_arquivos("merend")[0]["id"], self.profissional.pk)
+
+        Aluno_Arquivo.objects.filter(pk=self.aluno.pk).update(nome_aluno="Pedro")
+        self.assertEqual(buscar_arquivos("joao"), [])
+
+        self.aluno.delete()
+        self.assertEqual(buscar_arquivos("beatriz"), [])
+
+
+# Máximo de queries por página (GET), com a massa de OrcamentoQueriesTests.
+# Toda rota nomeada de localizador/urls.py precisa estar aqui.
+ORCAMENTO_QUERIES = {
+    'login': 0,
+    'logout': 0,
+    'select_category': 2,
+    'numeros_disponiveis': 3,
+    'busca': 4,
+
+    'student_dashboard': 4,
+    'student_file_location': 3,
+    'student_file_location_search': 3,
+    'student_contacts': 3,
+    'student_pendencies': 3,
+    'student_personal_data_maintenance_list': 3,
+    'student_personal_data_create': 3,
+    'student_personal_data_bulk_create': 2,
+    'student_personal_data_edit': 5,
+    'student_personal_data_delete': 3,
+    'student_personal_data_purge': 2,
+    'generate_student_cover': 5,
+    'student_contacts_maintenance_list': 4,
+    'student_contacts_create': 3,
+    'student_contacts_edit': 4,
+    'student_contact_delete': 4,
+    'student_pendencies_maintenance_list': 4,
+    'student_pendencies_create': 3,
+    'student_pendencies_edit': 4,
+    'student_pendency_delete': 4,
+
+    'professional_dashboard': 5,
+    'professional_file_location': 3,
+    'professional_file_location_search': 3,
+    'professional_contracts': 3,
+    'generate_professional_cover': 5,
+    'professional_personal_data_maintenance_list': 3,
+    'professional_personal_data_create': 3,
+    'professional_personal_data_edit': 5,
+    'professional_personal_data_delete': 3,
+    'professional_personal_data_purge': 2,
+    'professional_contracts_maintenance_list': 4,
+    'professional_contracts_create': 3,
+    'professional_contracts_edit': 4,
+    'professional_contract_delete': 4,
+
+    'consultar_documentos': 7,
+    'api_listar': 3,
+    'exportar_inventario': 3,
+    'importar_sigeec': 2,
+    'capas_em_lote': 5,
+    'baixar_documento': 3,
+    'delete_documento_vinculado': 5,
+    'iniciar_envio_documento': 2,
+    'envio_documento': 3,
+}
+
+# Parâmetros GET das rotas que precisam deles para responder com dados
+PARAMETROS_GET = {
+    'numeros_disponiveis': {'tipo': 'A'},
+    'busca': {'q': 'aluno'},
+    'student_file_location': {'q': 'aluno'},
+    'professional_file_location': {'q': 'servidor'},
+    'consultar_documentos': {'categoria': 'A', 'tipo_arquivo': 'PDF'},
+    'api_listar': {'limite': 500},
+    'exportar_inventario': {'tipo': 'P', 'formato': 'xlsx'},
+    'capas_em_lote': {'tipo': 'P', 'localizacao_de': 1, 'gerar': 1},
+}
+
+
+class OrcamentoQueriesTests(TestCase):
+    """Cada listagem deve custar um número fixo de queries, qualquer que seja o volume."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = criar_usuario()
+        alunos = criar_em_lote_com_localizacao(Aluno_Arquivo, [
+            Aluno_Arquivo(usuario=cls.usuario, status_arquivo_aluno='A', cod_sistema=cod,
+                          nome_aluno=f"Aluno {cod}", cpf=f"{cod:03d}.000.000-00")
+            for cod in range(1, 31)
+        ])
+        profissionais = criar_em_lote_com_localizacao(Profissional_Arquivo, [
+            Profissional_Arquivo(usuario=cls.usuario, status_arquivo_profissional='A',
+                                 nome_profissional=f"Servidor {n}", cpf=f"{n:03d}.111.111-11")
+            for n in range(1, 31)
+        ])
+        for aluno in alunos:
+            for n in range(2):
+                Contato.objects.create(aluno_arquivo=aluno, telefone=str(n), pessoa_contato=f"Contato {n}")
+                Pendencia.objects.create(aluno_arquivo=aluno, dt_lancamento_pendencia="2024-01-01",
+                                         tipo_pendencia="Documento", descricao=f"Pendência {n}")
+        for profissional in profissionais:
+            for n in range(2):
+                Contrato.objects.create(profissional_arquivo=profissional, matricula=n, funcao="Professor",
+                                        dt_inicial="2024-01-01", dt_final="2024-12-31", tipo_contrato='T')
+
+        for aluno in alunos:
+            for n in range(2):
+                DocumentoVinculado.objects.create(content_object=aluno, arquivo=f"aluno_arquivo/{aluno.pk}/doc{n}.pdf")
+
+        cls.aluno = alunos[0]
+        cls.profissional = profissionais[0]
+        cls.parametros = {
+            'aluno_id': cls.aluno.pk,
+            'contato_id': cls.aluno.contatos.first().pk,
+            'pendencia_id': cls.aluno.pendencias.first().pk,
+            'profissional_id': cls.profissional.pk,
+            'contrato_id': cls.profissional.contratos.first().pk,
+            'recurso': 'contatos',
+            'documento_id': DocumentoVinculado.objects.create(
+                content_object=cls.aluno, arquivo="aluno_arquivo/1/historico.pdf"
+            ).pk,
+            'envio_id': EnvioDocumento.objects.create(
+                usuario=cls.usuario, content_object=cls.aluno, nome_arquivo="ficha.pdf", tamanho=10
+            ).pk,
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_todas_as_rotas_tem_orcamento(self):
+        nomes = {p.name for p in urls.urlpatterns if getattr(p, "name", None)}
+        self.assertEqual(nomes, set(ORCAMENTO_QUERIES))
+
+    def test_rotas_dentro_do_orcamento(self):
+        for padrao in urls.urlpatterns:
+            if not getattr(padrao, "name", None):
+                continue
+            kwargs = {nome: self.parametros[nome] for nome in padrao.pattern.converters}
+            url = reverse(padrao.name, kwargs=kwargs)
+
+            ContentType.objects.clear_cache()  # a contagem não depende da ordem das rotas
+
+            with self.subTest(rota=padrao.name):
+                with CaptureQueriesContext(connection) as queries:
+                    resposta = self.client.get(url, PARAMETROS_GET.get(padrao.name, {}))
+                    if resposta.streaming:
+                        b"".join(resposta.streaming_content)
+
+                self.assertLess(resposta.status_code, 500)
+                self.assertLessEqual(
+                    len(queries), ORCAMENTO_QUERIES[padrao.name],
+                    "\n".join(q["sql"] for q in queries.captured_queries)
+                )
+
+
+class CatalogoDocumentosTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+        self.client.force_login(self.usuario)
+        alunos = criar_em_lote_com_localizacao(Aluno_Arquivo, [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=cod, nome_aluno=f"Aluno {cod:02d}")
+            for cod in range(1, 31)
+        ])
+        for aluno in alunos:
+            DocumentoVinculado.objects.create(content_object=aluno, arquivo=f"aluno_arquivo/{aluno.pk}/historico.pdf")
+            DocumentoVinculado.objects.create(content_object=aluno, arquivo=f"aluno_arquivo/{aluno.pk}/foto.jpg")
+        self.profissional = Profissional_Arquivo.objects.create(
+            usuario=self.usuario, status_arquivo_profissional='A', nome_profissional="Servidor", cpf="1"
+        )
+        DocumentoVinculado.objects.create(content_object=self.profissional, arquivo="profissional_arquivo/1/contrato.pdf")
+
+    def test_paginas_com_documentos_filtrados(self):
+        resposta = self.client.get(reverse('consultar_documentos'), {'tipo_arquivo': 'JPG'})
+        pagina = resposta.context['pagina']
+
+        self.assertEqual(pagina.paginator.count, 30)
+        self.assertEqual(len(pagina), 25)
+        for aluno in pagina:
+            self.assertEqual([d.tipo_arquivo for d in aluno.documentos.all()], ['JPG'])
+
+        resposta = self.client.get(reverse('consultar_documentos'), {'categoria': 'P', 'q': 'serv'})
+        self.assertEqual([p.pk for p in resposta.context['pagina']], [self.profissional.pk])
+
+    def test_filtro_por_data(self):
+        DocumentoVinculado.objects.filter(tipo_arquivo='JPG').update(data_upload="2020-05-10 10:00Z")
+
+        resposta = self.client.get(reverse('consultar_documentos'), {'data_fim': '2020-12-31'})
+        self.assertEqual(resposta.context['pagina'].paginator.count, 30)
+        self.assertEqual(len(resposta.context['pagina'][0].documentos.all()), 1)
+
+        resposta = self.client.get(reverse('consultar_documentos'), {'data_inicio': '2021-01-01', 'data_fim': '2020-01-01'})
+        self.assertTrue(resposta.context['form'].errors)
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+        self.client.force_login(self.usuario)
+        self.alunos = criar_em_lote_com_localizacao(Aluno_Arquivo, [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=cod,
+                          nome_aluno=f"Aluno {cod}", cpf=f"{cod:03d}.000.000-00")
+            for cod in range(1, 26)
+        ])
+
+    def test_cursor_percorre_todos_os_registros(self):
+        url = reverse('api_listar', args=['alunos'])
+        ids = []
+        parametros = {'limite': 10, 'campos': 'nome_aluno'}
+
+        while True:
+            with self.assertNumQueries(3):
+                dados = self.client.get(url, parametros).json()
+            ids.extend(r['id_aluno_arquivo'] for r in dados['resultados'])
+            self.assertEqual(set(dados['resultados'][0]), {'id_aluno_arquivo', 'nome_aluno'})
+            if not dados['proximo']:
+                break
+            parametros['cursor'] = dados['proximo']
+
+        self.assertEqual(ids, sorted(a.pk for a in self.alunos))
+
+    def test_filtros_e_erros(self):
+        url = reverse('api_listar', args=['alunos'])
+
+        self.assertEqual(len(self.client.get(url, {'cpf': '0120'}).json()['resultados']), 1)
+        self.assertEqual(self.client.get(url, {'cod_sistema': 7}).json()['resultados'][0]['cod_sistema'], 7)
+        self.assertEqual(self.client.get(url, {'cod_sistema': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'campos': 'nome_busca'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_listar', args=['usuarios'])).status_code, 404)
+
+    def test_cursor_adulterado(self):
+        url = reverse('api_listar', args=['alunos'])
+        for cursor in ("WyJhYmMiXQ", utils._codificar_cursor([{"id": 1}]), utils._codificar_cursor([1, 2]), "%%%"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 400)
+        # cursor de verdade continua valendo
+        self.assertEqual(self.client.get(url, {'cursor': utils._codificar_cursor([self.alunos[4].pk])}).json()['resultados'][0]['cod_sistema'], 6)
+
+
+class InventarioTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+        self.client.force_login(self.usuario)
+        alunos = criar_em_lote_com_localizacao(Aluno_Arquivo, [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=cod, nome_aluno=f"Aluno {cod}")
+            for cod in range(1, 1201)
+        ])
+        for dia in (1, 15):
+            Pendencia.objects.create(aluno_arquivo=alunos[0], dt_lancamento_pendencia=f"2024-03-{dia:02d}",
+                                     tipo_pendencia="Documento", descricao="RG")
+
+    def test_csv_em_blocos_com_agregados(self):
+        resposta = self.client.get(reverse('exportar_inventario'), {'tipo': 'A', 'formato': 'csv'})
+        blocos = list(resposta.streaming_content)
+        linhas = b"".join(blocos).decode("utf-8-sig").splitlines()
+
+        self.assertGreater(len(blocos), 1)
+        self.assertEqual(len(linhas), 1201)
+        self.assertEqual(linhas[0].split(";")[0], "Localização")
+        self.assertEqual(linhas[1], "1;1;Aluno 1;;A;2;2024-03-15")
+        self.assertEqual(linhas[2], "2;2;Aluno 2;;A;0;")
+
+    def test_xlsx_valido(self):
+        import io
+        import zipfile
+
+        resposta = self.client.get(reverse('exportar_inventario'), {'tipo': 'A', 'formato': 'xlsx'})
+        arquivo = zipfile.ZipFile(io.BytesIO(b"".join(resposta.streaming_content)))
+
+        self.assertIsNone(arquivo.testzip())
+        planilha = arquivo.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(planilha.count("<row>"), 1201)
+        self.assertIn("<v>2</v>", planilha)
+        self.assertIn("15/03/2024", planilha)
+
+
+class ImportacaoSigeecTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+        criar_em_lote_com_localizacao(Aluno_Arquivo, [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=cod, nome_aluno=f"Aluno {cod}")
+            for cod in (1, 2)
+        ])
+
+    def importar(self, tipo, texto, **kwargs):
+        return importar_sigeec(tipo, abrir_csv_sigeec(texto.encode("cp1252")), self.usuario, **kwargs)
+
+    def test_atualiza_existentes_e_cria_novos_em_uma_reserva(self):
+        relatorio = self.importar('A', (
+            "Código Pessoa;Nome;CPF;Situação\n"
+            "1;João Conceição;123.456.789-00;Permanente\n"
+            "3;Aluno Novo;;Ativo\n"
+            "abc;Sem Código;;Ativo\n"
+            "4;Outro Novo;;Transferido\n"
+            "3;Repetido;;Ativo\n"
+            "5;Mais Um;;\n"
+        ), tamanho_lote=2)
+
+        self.assertEqual(relatorio['linhas'], 6)
+        self.assertEqual(relatorio['atualizados'], 1)
+        self.assertEqual(relatorio['criados'], 2)
+        self.assertEqual([n for n, _ in relatorio['erros']], [4, 5, 6])
+        self.assertIn("linha 3", relatorio['erros'][2][1])
+
+        joao = Aluno_Arquivo.objects.get(cod_sistema=1)
+        self.assertEqual((joao.nome_aluno, joao.status_arquivo_aluno, joao.localizacao_arquivo), ("João Conceição", 'P', 1))
+        self.assertEqual((joao.nome_busca, joao.cpf_busca), ("joao conceicao", "12345678900"))
+        self.assertEqual(
+            list(Aluno_Arquivo.objects.filter(cod_sistema__in=[3, 5]).order_by("cod_sistema")
+                 .values_list("localizacao_arquivo", flat=True)),
+            [3, 4]
+        )
+        self.assertEqual(get_faixas_disponiveis('A'), [(5, None)])
+        # o upsert passa pelos triggers do índice de busca
+        self.assertEqual([r['id'] for r in buscar_arquivos("conceicao")], [joao.pk])
+
+    def test_servidores_pelo_cpf_sem_pontuacao(self):
+        Profissional_Arquivo.objects.create(usuario=self.usuario, nome_profissional="Maria",
+                                            cpf="111.222.333-44", status_arquivo_profissional='A')
+
+        relatorio = self.importar('P', "cpf;nome\n11122233344;Maria da Silva\n55566677788;José\n123;Curto\n")
+
+        self.assertEqual((relatorio['atualizados'], relatorio['criados']), (1, 1))
+        self.assertEqual(relatorio['erros'], [(4, "CPF inválido.")])
+        maria = Profissional_Arquivo.objects.get(cpf_busca="11122233344")
+        self.assertEqual((maria.nome_profissional, maria.cpf), ("Maria da Silva", "111.222.333-44"))
+
+    def test_sincronizacao_grava_so_o_que_mudou(self):
+        csv_inicial = "cod_sistema;nome_aluno;status\n1;Aluno 1;Ativo\n2;Aluno 2;Ativo\n3;Aluno 3;Ativo\n"
+        self.importar('A', csv_inicial)
+
+        csv_semana = "nome_aluno;status;cod_sistema\nAluno 1;Ativo;1\nAluno Dois;Ativo;2\nAluno 4;Ativo;4\n"
+        simulado = self.importar('A', csv_semana, sincronizar=True, marcar_ausentes=True, simular=True)
+        self.assertEqual(Aluno_Arquivo.objects.get(cod_sistema=2).nome_aluno, "Aluno 2")
+
+        with CaptureQueriesContext(connection) as queries:
+            relatorio = self.importar('A', csv_semana, sincronizar=True, marcar_ausentes=True)
+
+        self.assertEqual(relatorio['diferencas'], simulado['diferencas'])
+        self.assertEqual(
+            sorted(relatorio['diferencas'], key=str),
+            [("alterado", 2, 3), ("ausente", 3, None), ("inserido", 4, 4)]
+        )
+        self.assertEqual(relatorio['inalterados'], 1)
+        # o aluno 1, inalterado, não aparece em nenhum UPDATE/INSERT
+        gravacoes = [q["sql"] for q in queries.captured_queries if q["sql"].startswith(("INSERT", "UPDATE"))]
+        self.assertTrue(any("'Aluno Dois'" in sql for sql in gravacoes))
+        self.assertFalse(any("'Aluno 1'" in sql for sql in gravacoes))
+        self.assertEqual(Aluno_Arquivo.objects.get(cod_sistema=3).status_arquivo_aluno, 'P')
+
+        # o ausente volta a ser ativo quando reaparece no arquivo
+        relatorio = self.importar('A', csv_inicial, sincronizar=True)
+        self.assertIn(("status", 3, 4), relatorio['diferencas'])
+        self.assertEqual(Aluno_Arquivo.objects.get(cod_sistema=3).status_arquivo_aluno, 'A')
+
+    def test_colunas_obrigatorias(self):
+        with self.assertRaises(ValueError):
+            self.importar('A', "nome;cpf\nAluno;\n")
+
+    def test_upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        self.client.force_login(self.usuario)
+        arquivo = SimpleUploadedFile("sigeec.csv", "cod_sistema,nome_aluno\n7,Aluno Sete\n,Sem Código\n".encode())
+        resposta = self.client.post(reverse('importar_sigeec'), {'tipo': 'A', 'delimitador': ',', 'arquivo': arquivo})
+
+        self.assertContains(resposta, "1 cadastrados")
+        self.assertEqual(resposta.context['erros'][0][0], 3)
+        self.assertTrue(Aluno_Arquivo.objects.filter(cod_sistema=7, localizacao_arquivo=3).exists())
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "planos de consulta no formato do SQLite")
+class PlanoConsultasTests(TestCase):
+    """EXPLAIN QUERY PLAN das consultas frequentes: nenhuma pode voltar a varrer a tabela."""
+
+    def assertUsaIndice(self, queryset, indice):
+        plano = queryset.explain()
+        self.assertIsNone(re.search(r"\bSCAN \w+$", plano, re.MULTILINE), plano)
+        self.assertNotIn("TEMP B-TREE", plano)
+        self.assertIn(indice, plano)
+
+    def test_pendencias_do_aluno_por_data(self):
+        self.assertUsaIndice(
+            Pendencia.objects.filter(aluno_arquivo=1).order_by("-dt_lancamento_pendencia"),
+            "localizador_pend_aluno_dt_idx"
+        )
+
+    def test_contrato_mais_recente(self):
+        self.assertUsaIndice(
+            Contrato.objects.filter(profissional_arquivo=1).order_by("-dt_inicial", "-pk"),
+            "localizador_contr_prof_dt_idx"
+        )
+
+    def test_documentos_vinculados(self):
+        content_type = ContentType.objects.get_for_model(Aluno_Arquivo)
+        self.assertUsaIndice(
+            DocumentoVinculado.objects.filter(content_type=content_type, object_id__in=[1, 2]),
+            "localizador_doc_objeto_idx"
+        )
+
+    def test_permanentes_para_expurgo(self):
+        self.assertUsaIndice(
+            Aluno_Arquivo.objects.filter(status_arquivo_aluno='P').order_by("pk").values_list("pk")[:500],
+            "localizador_aluno_perm_idx"
+        )
+        self.assertUsaIndice(
+            Profissional_Arquivo.objects.filter(status_arquivo_profissional='P').order_by("pk").values_list("pk")[:500],
+            "localizador_prof_perm_idx"
+        )
+
+    def test_busca_por_nome_cpf_e_localizacao(self):
+        # O filtro que as listagens usam, na ordem e no tamanho de uma página:
+        # busca por intervalo no índice (um SCAN ... USING INDEX leria o índice inteiro)
+        self.assertUsaIndice(
+            filtrar_arquivos_por_termo(Aluno_Arquivo.objects.all(), 'A', 'joao').order_by('nome_busca', 'pk')[:51],
+            "localizador_aluno_nome_idx (nome_busca>? AND nome_busca<?)"
+        )
+        self.assertUsaIndice(
+            filtrar_arquivos_por_termo(Profissional_Arquivo.objects.all(), 'P', 'Ana').order_by('nome_busca', 'pk')[:51],
+            "localizador_prof_nome_idx (nome_busca>? AND nome_busca<?)"
+        )
+        self.assertUsaIndice(
+            Profissional_Arquivo.objects.filter(filtro_prefixo("cpf_busca", "123")),
+            "localizador_prof_cpf_idx"
+        )
+        self.assertUsaIndice(Aluno_Arquivo.objects.filter(localizacao_arquivo=10), "localizacao_arquivo=?")
+
+    def test_subconsultas_do_inventario(self):
+        self.assertUsaIndice(inventario_queryset('A'), "localizador_pend_aluno_dt_idx")
+        self.assertUsaIndice(inventario_queryset('P'), "localizador_contr_prof_dt_idx")
+
+
+class ResumoPainelTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+
+    def resumo(self):
+        return resumo_painel("aluno_status", "profissional_status", "pendencia_tipo", "documentos")
+
+    def test_contadores_acompanham_gravacoes_e_exclusoes(self):
+        criar_em_lote_com_localizacao(Aluno_Arquivo, [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=cod, nome_aluno=f"Aluno {cod}")
+            for cod in range(1, 6)
+        ])
+        aluno = Aluno_Arquivo.objects.get(cod_sistema=1)
+        aluno.status_arquivo_aluno = 'P'
+        aluno.save()
+        with self.assertNumQueries(1):  # edição sem trocar o status: só o UPDATE
+            aluno.nome_aluno = "Aluno Um"
+            aluno.save()
+
+        pendencia = Pendencia.objects.create(aluno_arquivo=aluno, dt_lancamento_pendencia="2024-01-10",
+                                             tipo_pendencia="Histórico", descricao="Falta")
+        Pendencia.objects.create(aluno_arquivo=aluno, dt_lancamento_pendencia="2024-01-11",
+                                 tipo_pendencia="Histórico", descricao="Falta")
+        pendencia.tipo_pendencia = "RG"
+        pendencia.save()
+        DocumentoVinculado.objects.create(content_object=aluno, arquivo="aluno_arquivo/1/rg.pdf")
+
+        self.assertEqual(self.resumo(), {
+            "aluno_status": {'A': 4, 'P': 1},
+            "profissional_status": {},
+            "pendencia_tipo": {"Histórico": 1, "RG": 1},
+            "documentos": {'A': 1},
+        })
+
+        # exclusão em cascata: aluno, pendências e documento
+        expurgar_arquivos(Aluno_Arquivo.objects.filter(pk=aluno.pk))
+        self.assertEqual(self.resumo(), {
+            "aluno_status": {'A': 4},
+            "profissional_status": {},
+            "pendencia_tipo": {},
+            "documentos": {},
+        })
+
+    def test_valor_original_guardado_ao_ler_do_banco(self):
+        # O valor contado é guardado em from_db(), sem receiver de post_init
+        for modelo in (Aluno_Arquivo, Profissional_Arquivo, Pendencia, DocumentoVinculado):
+            self.assertFalse(post_init.has_listeners(modelo))
+        Aluno_Arquivo.objects.create(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=1, nome_aluno="Bia")
+
+        aluno = Aluno_Arquivo.objects.get(cod_sistema=1)
+        self.assertEqual(aluno._valor_resumo_original, 'A')
+        aluno.status_arquivo_aluno = 'P'
+        with self.assertNumQueries(2):  # UPDATE e resumo, sem consultar o status anterior
+            aluno.save()
+
+        # carregado sem o campo: o status gravado é consultado antes da edição
+        aluno = Aluno_Arquivo.objects.defer("status_arquivo_aluno").get(cod_sistema=1)
+        aluno.status_arquivo_aluno = 'A'
+        aluno.save()
+        self.assertEqual(self.resumo()["aluno_status"], {'A': 1})
+
+    def test_recalculo_confere_com_o_incremental(self):
+        Profissional_Arquivo.objects.create(usuario=self.usuario, nome_profissional="Ana", cpf="1",
+                                            status_arquivo_profissional='A')
+        Aluno_Arquivo.objects.create(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=1, nome_aluno="Bia")
+        incremental = self.resumo()
+
+        ResumoPainel.objects.all().delete()
+        recalcular_resumo_painel()
+
+        self.assertEqual(self.resumo(), incremental)
+        self.assertEqual(incremental["profissional_status"], {'A': 1})
+
+    def test_painel_le_o_resumo(self):
+        criar_em_lote_com_localizacao(Aluno_Arquivo, [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=cod, nome_aluno=f"Aluno {cod}")
+            for cod in range(1, 4)
+        ])
+        Aluno_Arquivo.objects.get(cod_sistema=2).delete()
+        self.client.force_login(self.usuario)
+
+        resposta = self.client.get(reverse('student_dashboard'))
+
+        self.assertEqual((resposta.context['ativos'], resposta.context['permanentes']), (2, 0))
+        self.assertEqual(resposta.context['localizacoes'], {'usadas': 2, 'livres': 1, 'proximo': 4})
+
+
+def criar_fonte_teste(caminho, caracteres=None):
+    """TTF mínima (um retângulo por glifo), por padrão com ASCII e Latin-1."""
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+    caracteres = caracteres or [*range(0x20, 0x7F), *range(0xA0, 0x100)]
+    nomes = [".notdef"] + [f"uni{c:04X}" for c in caracteres]
+    glifos = {}
+    for nome in nomes:
+        pen = TTGlyphPen(None)
+        pen.moveTo((50, 0))
+        pen.lineTo((50, 500))
+        pen.lineTo((450, 500))
+        pen.closePath()
+        glifos[nome] = pen.glyph()
+
+    fb = FontBuilder(1000, isTTF=True)
+    fb.setupGlyphOrder(nomes)
+    fb.setupCharacterMap(dict(zip(caracteres, nomes[1:])))
+    fb.setupGlyf(glifos)
+    fb.setupHorizontalMetrics({nome: (500, 50) for nome in nomes})
+    fb.setupHorizontalHeader(ascent=800, descent=-200)
+    fb.setupNameTable({"familyName": "Teste", "styleName": "Regular"})
+    fb.setupOS2()
+    fb.setupPost()
+    fb.save(caminho)
+
+
+class FonteCapaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pasta = tempfile.TemporaryDirectory()
+        cls.fonte = os.path.join(cls.pasta.name, "teste.ttf")
+        criar_fonte_teste(cls.fonte)
+        # Os subconjuntos gerados ficam na pasta do teste
+        cls.pasta_fontes = mock.patch.object(
+            utils, "PASTA_FONTES_CAPA", os.path.join(cls.pasta.name, "subconjuntos")
+        )
+        cls.pasta_fontes.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pasta_fontes.stop()
+        cls.pasta.cleanup()
+        super().tearDownClass()
+
+    def gerar_capa(self):
+        aluno = Aluno_Arquivo(localizacao_arquivo=7, cod_sistema=123, nome_aluno="João Conceição")
+        pdf = PDFCapaBase(orientation='P', unit='mm', format='A4')
+        pdf.capa_aluno(aluno, [Pendencia(tipo_pendencia="Histórico", descricao="Não entregue")])
+        return pdf, bytes(pdf.output())
+
+    def test_fonte_lida_uma_vez_por_processo(self):
+        # Caminho próprio do teste: o cache é por caminho de fonte
+        caminho = os.path.join(self.pasta.name, "uma_vez.ttf")
+        criar_fonte_teste(caminho)
+
+        with override_settings(FONTE_CAPA=caminho), \
+                mock.patch("localizador.utils._subconjunto_latin1", wraps=utils._subconjunto_latin1) as subconjunto:
+            primeiro, pdf_1 = self.gerar_capa()
+            segundo, pdf_2 = self.gerar_capa()
+            self.assertEqual(subconjunto.call_count, 1)  # regular e negrito usam o mesmo arquivo
+
+            # Outro processo reaproveita o subconjunto gravado
+            utils._fontes_capa.clear()
+            self.gerar_capa()
+            self.assertEqual(subconjunto.call_count, 1)
+
+        self.assertEqual(primeiro.main_font, "FonteCapa")
+        self.assertEqual(
+            os.path.dirname(segundo.fonts["fontecapa"]["ttffile"]), utils.PASTA_FONTES_CAPA
+        )
+        self.assertTrue(pdf_1.startswith(b"%PDF") and b"/FontFile2" in pdf_1)
+        self.assertEqual(len(pdf_1), len(pdf_2))
+
+    def test_subconjunto_latin1(self):
+        from fontTools import ttLib
+
+        with override_settings(FONTE_CAPA=self.fonte):
+            arquivo = fontes_capa()['']
+        caracteres = set(ttLib.TTFont(arquivo).getBestCmap())
+        self.assertIn(ord("ç"), caracteres)
+        self.assertLessEqual(caracteres, utils.CARACTERES_CAPA)
+
+    def test_subconjunto_apagado_e_gerado_de_novo(self):
+        caminho = os.path.join(self.pasta.name, "apagado.ttf")
+        criar_fonte_teste(caminho)
+        with override_settings(FONTE_CAPA=caminho):
+            os.remove(fontes_capa()[''])
+            pdf, conteudo = self.gerar_capa()
+        self.assertEqual(pdf.main_font, "FonteCapa")
+        self.assertTrue(os.path.exists(pdf.fonts["fontecapa"]["ttffile"]))
+
+    def test_sem_fonte_usa_helvetica(self):
+        with override_settings(FONTE_CAPA=os.path.join(self.pasta.name, "inexistente.ttc")), \
+                self.assertLogs("localizador.utils", "WARNING"):
+            self.assertIsNone(fontes_capa())
+            pdf, conteudo = self.gerar_capa()
+        self.assertEqual(pdf.main_font, "Helvetica")
+        self.assertTrue(conteudo.startswith(b"%PDF"))
+
+    def capas_em_lote(self, quantidade=3):
+        pdf = PDFCapaBase(orientation='P', unit='mm', format='A4')
+        pdf.compress = False
+        for cod in range(1, quantidade + 1):
+            pdf.capa_aluno(Aluno_Arquivo(localizacao_arquivo=cod, cod_sistema=cod, nome_aluno=f"Aluno {cod}"), [])
+        return bytes(pdf.output())
+
+    def test_parte_fixa_compilada_uma_vez_por_pdf(self):
+        caminho = os.path.join(self.pasta.name, "modelos.ttf")
+        criar_fonte_teste(caminho)
+        with override_settings(FONTE_CAPA=caminho), \
+                mock.patch.object(PDFCapaBase, "_compilar_modelo", autospec=True,
+                                  side_effect=PDFCapaBase._compilar_modelo) as compilar:
+            lote = self.capas_em_lote()
+            self.assertEqual(compilar.call_count, 1)
+            _, capa = self.gerar_capa()
+            self.assertEqual(compilar.call_count, 2)
+
+        self.assertEqual(lote.count(b"/Subtype /Form"), 1)
+        self.assertEqual(capa.count(b"/Subtype /Form"), 1)
+
+    def test_lote_referencia_a_parte_fixa(self):
+        conteudo = self.capas_em_lote()
+
+        # Um único Form XObject com os rótulos; as páginas só têm os campos
+        self.assertEqual(conteudo.count(b"/Subtype /Form"), 1)
+        self.assertEqual(conteudo.count(b"/Capa_aluno Do"), 3)
+        self.assertIn(b"(Aluno 3)", conteudo)
+        self.assertNotIn(b"SIGEEC", conteudo)
+
+    def test_modelo_e_paginas_escolhem_a_propria_fonte(self):
+        caminho = os.path.join(self.pasta.name, "estado.ttf")
+        criar_fonte_teste(caminho)
+        with override_settings(FONTE_CAPA=caminho):
+            conteudo = self.capas_em_lote()
+
+        # O Form XObject não herda a fonte de quem o usa, e depois do "q ... Q" a
+        # página volta à fonte de antes: cada um seleciona a sua antes do texto
+        fluxos = re.findall(rb"stream\n(.*?)endstream", conteudo, re.S)
+        modelo = zlib.decompress(re.search(rb"/Subtype /Form.*?stream\n(.*?)endstream", conteudo, re.S)[1])
+        paginas = [f for f in fluxos if b"/Capa_aluno Do" in f]
+        self.assertEqual(len(paginas), 3)
+        for fluxo in [modelo, *paginas]:
+            texto = min(fluxo.find(b"Tj"), fluxo.find(b"TJ"), key=lambda i: i if i >= 0 else len(fluxo))
+            self.assertTrue(0 <= fluxo.find(b" Tf") < texto, fluxo[:200])
+
+    @override_settings(CAPA_PARTE_FIXA_COMPARTILHADA=False)
+    def test_sem_parte_fixa_compartilhada_desenha_em_cada_pagina(self):
+        conteudo = self.capas_em_lote()
+
+        self.assertNotIn(b"/Subtype /Form", conteudo)
+        self.assertNotIn(b"/Capa_aluno Do", conteudo)
+        self.assertEqual(conteudo.count(b"(SIGEEC - C"), 3)
+
+
+class CapasEmLoteTests(TestCase):
+
+    def setUp(self):
+        self.usuario = criar_usuario()
+        self.client.force_login(self.usuario)
+        self.alunos = criar_em_lote_com_localizacao(Aluno_Arquivo, [
+            Aluno_Arquivo(usuario=self.usuario, status_arquivo_aluno='A' if cod < 5 else 'P',
+                          cod_sistema=cod, nome_aluno=f"Aluno {cod}")
+            for cod in range(1, 7)
+        ])
+        for aluno in self.alunos[:2]:
+            Pendencia.objects.create(aluno_arquivo=aluno, dt_lancamento_pendencia="2024-01-01",
+                                     tipo_pendencia="RG", descricao="Cópia do RG")
+
+    def test_filtros_e_prefetch(self):
+        self.assertTrue(all(aluno.data_cadastro for aluno in Aluno_Arquivo.objects.all()))
+
+        with self.assertNumQueries(2):  # alunos e pendências
+            alunos = list(capas_queryset('A', localizacao_de=2, status='A'))
+        self.assertEqual([a.localizacao_arquivo for a in alunos], [2, 3, 4])
+        self.assertEqual([len(a.pendencias.all()) for a in alunos], [1, 0, 0])
+
+        hoje = timezone.localdate()
+        self.assertEqual(capas_queryset('A', cadastro_de=hoje, ids=[self.alunos[0].pk]).count(), 1)
+        self.assertEqual(capas_queryset('A', cadastro_ate=hoje - timedelta(days=1)).count(), 0)
+
+    def test_contrato_mais_recente(self):
+        profissional = Profissional_Arquivo.objects.create(
+            usuario=self.usuario, status_arquivo_profissional='A', nome_profissional="Ana", cpf="1"
+        )
+        for inicio, funcao in (("2020-01-01", "Auxiliar"), ("2023-01-01", "Professora"), ("2021-01-01", "Monitora")):
+            Contrato.objects.create(profissional_arquivo=profissional, matricula=1, funcao=funcao,
+                                    dt_inicial=inicio, dt_final="2030-01-01", tipo_contrato='E')
+
+        with self.assertNumQueries(2):
+            [servidor] = capas_queryset('P', ids=[profissional.pk])
+            self.assertEqual([c.funcao for c in servidor.contrato_recente], ["Professora"])
+
+    def test_pdf_com_uma_pagina_por_registro(self):
+        resposta = self.client.get(reverse('capas_em_lote'), {'tipo': 'A', 'status': 'A', 'gerar': 1})
+
+        self.assertEqual(resposta['Content-Type'], 'application/pdf')
+        conteudo = resposta.content
+        self.assertTrue(conteudo.startswith(b"%PDF"))
+        self.assertEqual(len(re.findall(rb"/Type /Page\b", conteudo)), 4)
+
+    def test_exige_um_filtro(self):
+        resposta = self.client.get(reverse('capas_em_lote'), {'tipo': 'A', 'gerar': 1})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn("Informe ao menos um filtro.", resposta.context['form'].non_field_errors())
+
+
+class CacheCapasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = criar_usuario()
+        self.client.force_login(self.usuario)
+        self.aluno = Aluno_Arquivo.objects.create(
+            usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=1, nome_aluno="Ana"
+        )
+        self.url = reverse('generate_student_cover', args=[self.aluno.pk])
+
+    def test_segunda_abertura_vem_do_cache_ou_304(self):
+        with mock.patch.object(PDFCapaBase, "capa_aluno", autospec=True,
+                               side_effect=PDFCapaBase.capa_aluno) as desenhar:
+            primeira = self.client.get(self.url)
+            segunda = self.client.get(self.url)
+            revalidada = self.client.get(self.url, HTTP_IF_NONE_MATCH=primeira['ETag'])
+
+        self.assertEqual(desenhar.call_count, 1)
+        self.assertEqual(primeira.content, segunda.content)
+        self.assertEqual(segunda['ETag'], primeira['ETag'])
+        self.assertEqual(revalidada.status_code, 304)
+
+    def test_alteracoes_mudam_o_etag(self):
+        etags = [self.client.get(self.url)['ETag']]
+
+        Pendencia.objects.create(aluno_arquivo=self.aluno, dt_lancamento_pendencia="2024-01-01",
+                                 tipo_pendencia="RG", descricao="Cópia do RG")
+        etags.append(self.client.get(self.url)['ETag'])
+
+        # update() não dispara sinais, mas muda os campos impressos
+        Aluno_Arquivo.objects.filter(pk=self.aluno.pk).update(nome_aluno="Ana Maria")
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[-1])
+        etags.append(resposta['ETag'])
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(set(etags)), 3)
+
+
+class EnvioDocumentoTests(TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta_envios = os.path.join(pasta.name, "envios")
+        configuracao = override_settings(
+            MEDIA_ROOT=os.path.join(pasta.name, "media"), PASTA_ENVIOS=self.pasta_envios,
+            ENVIO_TAMANHO_PARTE=10, DOCUMENTO_TAMANHO_MAXIMO=100,
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.usuario = criar_usuario()
+        self.client.force_login(self.usuario)
+        self.aluno = Aluno_Arquivo.objects.create(
+            usuario=self.usuario, status_arquivo_aluno='A', cod_sistema=1, nome_aluno="Ana"
+        )
+        self.conteudo = b"digitalizacao-de-teste"  # 22 bytes: 3 partes
+
+    def iniciar(self, **dados):
+        dados = {'tipo': 'A', 'object_id': self.aluno.pk, 'nome_arquivo': "C:\\docs\\ficha.pdf",
+                 'tamanho': len(self.conteudo), 'sha256': hashlib.sha256(self.conteudo).hexdigest(), **dados}
+        return self.client.post(reverse('iniciar_envio_documento'), dados)
+
+    def enviar_parte(self, url, inicio, fim, sha256=None):
+        cabecalhos = {'HTTP_CONTENT_RANGE': f"bytes {inicio}-{fim - 1}/{len(self.conteudo)}"}
+        if sha256:
+            cabecalhos['HTTP_X_CHECKSUM_SHA256'] = sha256
+        return self.client.put(url, self.conteudo[inicio:fim], content_type="application/octet-stream", **cabecalhos)
+
+    def test_envio_em_partes_com_retomada(self):
+        resposta = self.iniciar()
+        self.assertEqual(resposta.status_code, 201)
+        url = resposta.json()['url']
+
+        self.assertEqual(self.enviar_parte(url, 0, 10).json()['recebido'], 10)
+        # Conexão caiu: o cliente pergunta onde parou e continua dali
+        self.assertEqual(self.client.get(url).json()['recebido'], 10)
+        parte = self.conteudo[10:20]
+        self.assertEqual(self.enviar_parte(url, 10, 20, hashlib.sha256(parte).hexdigest()).status_code, 200)
+        resposta = self.enviar_parte(url, 20, 22)
+
+        self.assertEqual(resposta.status_code, 201)
+        documento = DocumentoVinculado.objects.get(pk=resposta.json()['documento'])
+        self.assertEqual(documento.content_object, self.aluno)
+        self.assertEqual(documento.nome_arquivo, f"aluno_arquivo/{self.aluno.pk}/ficha.pdf")
+        with documento.arquivo.open("rb") as arquivo:
+            self.assertEqual(arquivo.read(), self.conteudo)
+        self.assertFalse(EnvioDocumento.objects.exists())
+        self.assertEqual(os.listdir(self.pasta_envios), [])
+        # Nenhuma mensagem pendente para a próxima página HTML
+        self.assertEqual(list(resposta.wsgi_request._messages), [])
+
+    def test_parte_fora_de_ordem_ou_corrompida(self):
+        url = self.iniciar().json()['url']
+        self.enviar_parte(url, 0, 10)
+
+        repetida = self.enviar_parte(url, 0, 10)
+        self.assertEqual(repetida.status_code, 409)
+        self.assertEqual(repetida.json()['recebido'], 10)
+
+        corrompida = self.enviar_parte(url, 10, 20, sha256="0" * 64)
+        self.assertEqual(corrompida.status_code, 400)
+        self.assertEqual(corrompida.json()['codigo'], 'checksum')
+        self.assertEqual(EnvioDocumento.objects.get().recebido, 10)
+        self.assertEqual(self.enviar_parte(url, 10, 20).status_code, 200)
+
+    def test_arquivo_inteiro_que_nao_confere_e_descartado(self):
+        url = self.iniciar(sha256="0" * 64).json()['url']
+        for inicio in range(0, len(self.conteudo), 10):
+            resposta = self.enviar_parte(url, inicio, min(inicio + 10, len(self.conteudo)))
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(DocumentoVinculado.objects.exists())
+        self.assertFalse(EnvioDocumento.objects.exists())
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_parte_reenviada_atrasada_nao_estraga_o_arquivo(self):
+        url = self.iniciar().json()['url']
+        atrasada = EnvioDocumento.objects.get()  # a tentativa lenta viu recebido = 0
+        self.enviar_parte(url, 0, 10)
+        self.enviar_parte(url, 10, 20)
+
+        with self.assertRaises(ValidationError) as erro:
+            utils.gravar_parte_envio(atrasada, io.BytesIO(b"x" * 10), 0, 10)
+        self.assertEqual(erro.exception.code, "fora_de_ordem")
+        self.assertEqual(atrasada.recebido, 20)
+        with open(utils.caminho_envio(atrasada), "rb") as arquivo:
+            self.assertEqual(arquivo.read(), self.conteudo[:20])
+        self.assertEqual(self.enviar_parte(url, 20, 22).status_code, 201)
+
+    def test_limites(self):
+        # Sem o SHA-256 do arquivo inteiro o envio não começa
+        self.assertEqual(self.iniciar(sha256="").status_code, 400)
+        self.assertEqual(self.iniciar(tamanho=101).status_code, 400)
+        url = self.iniciar().json()['url']
+        # Parte maior que ENVIO_TAMANHO_PARTE
+        self.assertEqual(self.enviar_parte(url, 0, 11).status_code, 400)
+        # Envio de outro usuário
+        self.client.force_login(Usuario.objects.create_user(username="outro", cpf_usuario="222.222.222-22"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_limpar_envios_parados(self):
+        self.iniciar()
+        EnvioDocumento.objects.update(atualizado_em=timezone.now() - timedelta(hours=49))
+        self.assertEqual(utils.limpar_envios(48), 1)
+        self.assertFalse(EnvioDocumento.objects.exists())
+        self.assertEqual(os.listdir(self.pasta_envios), [])
+
+
+class ArmazenamentoDeduplicadoTests(TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.media = os.path.join(pasta.name, "media")
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        usuario = criar_usuario()
+        self.alunos = [
+            Aluno_Arquivo.objects.create(usuario=usuario, status_arquivo_aluno='A', cod_sistema=cod, nome_aluno=f"Aluno {cod}")
+            for cod in (1, 2)
+        ]
+
+    def anexar(self, aluno, conteudo, nome="ficha.pdf"):
+        from django.core.files.base import ContentFile
+
+        documento = DocumentoVinculado(content_object=aluno, arquivo=ContentFile(conteudo, name=nome))
+        documento.save()
+        return documento
+
+    def blobs(self):
+        pasta = os.path.join(self.media, utils.PASTA_BLOBS)
+        return sorted(nome for _, _, nomes in os.walk(pasta) for nome in nomes)
+
+    def test_conteudo_igual_gravado_uma_vez(self):
+        primeiro = self.anexar(self.alunos[0], b"formulario em branco")
+        segundo = self.anexar(self.alunos[1], b"formulario em branco")
+        self.anexar(self.alunos[1], b"outro formulario", nome="outro.pdf")
+
+        self.assertEqual(segundo.arquivo.name, f"aluno_arquivo/{self.alunos[1].pk}/ficha.pdf")
+        self.assertEqual(segundo.sha256, hashlib.sha256(b"formulario em branco").hexdigest())
+        self.assertTrue(os.path.samefile(primeiro.arquivo.path, segundo.arquivo.path))
+        self.assertEqual(self.blobs(), sorted(
+            hashlib.sha256(conteudo).hexdigest() for conteudo in (b"formulario em branco", b"outro formulario")
+        ))
+        # Mesmo nome no mesmo aluno: outro arquivo, mesmo blob
+        terceiro = self.anexar(self.alunos[0], b"formulario em branco")
+        self.assertNotEqual(terceiro.arquivo.name, primeiro.arquivo.name)
+        self.assertTrue(os.path.samefile(primeiro.arquivo.path, terceiro.arquivo.path))
+
+    def test_blob_apagado_com_a_ultima_referencia(self):
+        documentos = [self.anexar(aluno, b"certidao") for aluno in self.alunos]
+        self.assertEqual(len(self.blobs()), 1)
+
+        # O blob é achado pelo sha256 do registro, sem ler o arquivo
+        with mock.patch.object(utils, "sha256_arquivo", side_effect=AssertionError), \
+                self.captureOnCommitCallbacks(execute=True):
+            documentos[0].delete()
+        self.assertFalse(os.path.exists(documentos[0].arquivo.path))
+        self.assertEqual(len(self.blobs()), 1)
+        with documentos[1].arquivo.open("rb") as arquivo:
+            self.assertEqual(arquivo.read(), b"certidao")
+
+        # Exclusão do aluno: o documento sai em cascata e leva o arquivo e o blob
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alunos[1].delete()
+        self.assertFalse(os.path.exists(documentos[1].arquivo.path))
+        self.assertEqual(self.blobs(), [])
+
+    def test_exclusoes_simultaneas_das_ultimas_referencias(self):
+        from django.core.files.storage import FileSystemStorage
+
+        documentos = [self.anexar(aluno, b"certidao") for aluno in self.alunos]
+        armazenamento = documentos[0].arquivo.storage
+        apagar_arquivo = FileSystemStorage.delete
+
+        def apagar(storage, name):
+            # A outra exclusão começa e termina antes de esta apagar o seu arquivo
+            if name == documentos[0].arquivo.name:
+                armazenamento.delete(documentos[1].arquivo.name, documentos[1].sha256)
+            apagar_arquivo(storage, name)
+
+        with mock.patch.object(FileSystemStorage, "delete", autospec=True, side_effect=apagar):
+            armazenamento.delete(documentos[0].arquivo.name, documentos[0].sha256)
+
+        self.assertEqual(self.blobs(), [])
+
+    def test_sem_hardlink_nao_deixa_blob(self):
+        link = os.link
+
+        def sem_link_para_o_documento(origem, destino):
+            if utils.PASTA_BLOBS not in destino:
+                raise PermissionError("hardlink não permitido")
+            link(origem, destino)
+
+        with mock.patch.object(utils.os, "link", side_effect=sem_link_para_o_documento), \
+                self.assertLogs("localizador.utils", "WARNING"):
+            documento = self.anexar(self.alunos[0], b"certidao")
+
+        with documento.arquivo.open("rb") as arquivo:
+            self.assertEqual(arquivo.read(), b"certidao")
+        self.assertEqual(self.blobs(), [])
+
+    def test_blobs_orfaos_apagados_pelo_comando(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        documento = self.anexar(self.alunos[0], b"certidao")
+        self.anexar(self.alunos[1], b"formulario")
+        # Arquivo apagado sem passar pelo armazenamento: o blob ficou sem documento
+        os.remove(documento.arquivo.path)
+
+        self.assertEqual(utils.deduplicar_documentos(simular=True), (1, 1, len(b"certidao")))
+        self.assertEqual(len(self.blobs()), 2)
+        call_command("deduplicar_documentos", stdout=StringIO())
+        self.assertEqual(self.blobs(), [hashlib.sha256(b"formulario").hexdigest()])
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+    def test_upload_calcula_o_hash_ao_receber(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        self.client.force_login(Usuario.objects.get())
+        arquivo = SimpleUploadedFile("ficha.pdf", b"digitalizacao")
+        # Upload em arquivo temporário: o armazenamento não o lê de novo
+        with mock.patch.object(utils, "sha256_arquivo", side_effect=AssertionError):
+            resposta = self.client.post(
+                reverse('student_personal_data_edit', args=[self.alunos[0].pk]),
+                {'upload_documento': '1', 'arquivo': arquivo},
+            )
+
+        self.assertEqual(resposta.status_code, 302)
+        documento = DocumentoVinculado.objects.get()
+        self.assertEqual(documento.sha256, hashlib.sha256(b"digitalizacao").hexdigest())
+        self.assertEqual(self.blobs(), [documento.sha256])
+
+    def test_arquivos_apagados_so_depois_do_commit(self):
+        documento = self.anexar(self.alunos[0], b"certidao")
+        with self.captureOnCommitCallbacks(execute=False):
+            expurgar_arquivos(Aluno_Arquivo.objects.filter(pk=self.alunos[0].pk))
+            self.assertTrue(os.path.exists(documento.arquivo.path))
+
+    def test_deduplicar_documentos_anteriores(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        tipo = ContentType.objects.get_for_model(Aluno_Arquivo)
+        for aluno in self.alunos:
+            # Gravados como no FileSystemStorage, antes da deduplicação
+            nome = f"aluno_arquivo/{aluno.pk}/ficha.pdf"
+            os.makedirs(os.path.join(self.media, os.path.dirname(nome)))
+            with open(os.path.join(self.media, nome), "wb") as arquivo:
+                arquivo.write(b"copia antiga")
+            DocumentoVinculado.objects.create(content_type=tipo, object_id=aluno.pk, arquivo=nome)
+
+        self.assertEqual(utils.deduplicar_documentos(simular=True), (2, 0, 12))
+        self.assertEqual(self.blobs(), [])
+        call_command("deduplicar_documentos", stdout=StringIO())
+        caminhos = [documento.arquivo.path for documento in DocumentoVinculado.objects.all()]
+        self.assertTrue(os.path.samefile(*caminhos))
+        self.assertEqual(os.stat(caminhos[0]).st_nlink, 3)
+        self.assertEqual(
+            set(DocumentoVinculado.objects.values_list("sha256", flat=True)),
+            {hashlib.sha256(b"copia antiga").hexdigest()},
+        )
+        # De novo: nada a fazer
+        self.assertEqual(utils.deduplicar_documentos(), (2, 0, 0))
+
+
+class DownloadDocumentoTests(TestCase):
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        usuario = criar_usuario()
+        self.client.force_login(usuario)
+        aluno = Aluno_Arquivo.objects.create(usuario=usuario, status_arquivo_aluno='A', cod_sistema=1, nome_aluno="Ana")
+        self.conteudo = b"%PDF-1.4 conteudo do documento"
+        self.documento = DocumentoVinculado(content_object=aluno)
+        self.documento.arquivo.save("histórico escolar.pdf", ContentFile(self.conteudo), save=True)
+        self.url = reverse('baixar_documento', args=[self.documento.pk])
+
+    def baixar(self, **cabecalhos):
+        resposta = self.client.get(self.url, **cabecalhos)
+        corpo = b"".join(resposta.streaming_content) if resposta.streaming else resposta.content
+        return resposta, corpo
+
+    def test_download_com_login_e_revalidacao(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.client.force_login(Usuario.objects.get())
+
+        resposta, corpo = self.baixar()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(corpo, self.conteudo)
+        self.assertEqual(resposta['Content-Type'], 'application/pdf')
+        self.assertEqual(resposta['Content-Length'], str(len(self.conteudo)))
+        self.assertEqual(resposta['Accept-Ranges'], 'bytes')
+        self.assertIn("inline", resposta['Content-Disposition'])
+
+        self.assertEqual(self.baixar(HTTP_IF_NONE_MATCH=resposta['ETag'])[0].status_code, 304)
+        self.assertEqual(self.baixar(HTTP_IF_MODIFIED_SINCE=resposta['Last-Modified'])[0].status_code, 304)
+
+    def test_intervalos(self):
+        resposta, corpo = self.baixar(HTTP_RANGE="bytes=0-7")
+        self.assertEqual(resposta.status_code, 206)
+        self.assertEqual(corpo, b"%PDF-1.4")
+        self.assertEqual(resposta['Content-Range'], f"bytes 0-7/{len(self.conteudo)}")
+        self.assertEqual(resposta['Content-Length'], "8")
+
+        self.assertEqual(self.baixar(HTTP_RANGE="bytes=-9")[1], b"documento")
+        self.assertEqual(self.baixar(HTTP_RANGE="bytes=9-")[1], self.conteudo[9:])
+        self.assertEqual(self.baixar(HTTP_RANGE="bytes=9-999")[1], self.conteudo[9:])
+
+        # Versão diferente no If-Range ou vários intervalos: arquivo inteiro
+        self.assertEqual(self.baixar(HTTP_RANGE="bytes=0-7", HTTP_IF_RANGE='"antigo"')[0].status_code, 200)
+        self.assertEqual(self.baixar(HTTP_RANGE="bytes=0-1,4-5")[0].status_code, 200)
+
+        resposta = self.baixar(HTTP_RANGE="bytes=999-")[0]
+        self.assertEqual(resposta.status_code, 416)
+        self.assertEqual(resposta['Content-Range'], f"bytes */{len(self.conteudo)}")
+
+    def test_envio_pelo_servidor_web(self):
+        with override_settings(DOCUMENTO_ENVIO_SERVIDOR="X-Accel-Redirect"):
+            resposta, corpo = self.baixar()
+        self.assertEqual(corpo, b"")
+        self.assertEqual(
+            resposta['X-Accel-Redirect'],
+            f"/documentos-protegidos/aluno_arquivo/{self.documento.object_id}/hist%C3%B3rico_escolar.pdf",
+        )
+        self.assertIn("ETag", resposta)
+
+        with override_settings(DOCUMENTO_ENVIO_SERVIDOR="X-Sendfile"):
+            resposta = self.baixar()[0]
+        self.assertEqual(resposta['X-Sendfile'], self.documento.arquivo.path)
@@ -11,18 +11,23 @@ urlpatterns = [
     path('login/', auth_views.LoginView.as_view(template_name='localizador/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='login'), name='logout'),
     path('selecionar_categoria/', views.select_category, name='select_category'),
+    path('localizacoes/disponiveis/', views.numeros_disponiveis_view, name='numeros_disponiveis'),
+    path('busca/', views.busca_view, name='busca'),
 
     # Student URLs
     path('estudante/painel/', views.student_dashboard, name='student_dashboard'),
     path('estudante/localizacao/', views.student_file_location_view, name='student_file_location'),
+    path('estudante/localizacao/busca/', views.student_file_location_search_view, name='student_file_location_search'),
     path('estudante/contatos/ver/', views.student_contacts_view, name='student_contacts'), # Query view
     path('estudante/pendencias/ver/', views.student_pendencies_view, name='student_pendencies'), # Query view
 
     # Student Personal Data Maintenance
     path('estudante/manutencao/dados_pessoais/listar/', views.student_personal_data_maintenance_list_view, name='student_personal_data_maintenance_list'),
     path('estudante/manutencao/dados_pessoais/novo/', views.student_personal_data_maintenance_view, name='student_personal_data_create'),
+    path('estudante/manutencao/dados_pessoais/lote/', views.student_personal_data_bulk_create_view, name='student_personal_data_bulk_create'),
     path('estudante/manutencao/dados_pessoais/editar/<int:aluno_id>/', views.student_personal_data_maintenance_view, name='student_personal_data_edit'),
     path('estudante/manutencao/dados_pessoais/apagar/<int:aluno_id>/', views.student_personal_data_delete_view, name='student_personal_data_delete'),
+    path('estudante/manutencao/dados_pessoais/expurgar/', views.student_personal_data_purge_view, name='student_personal_data_purge'),
     path('estudante/gerar_capa/<int:aluno_id>/', views.generate_student_cover_pdf, name='generate_student_cover'), # Nova URL para gerar capa
 
     # Student Contacts Maintenance
@@ -40,6 +45,7 @@ urlpatterns = [
     # Professional URLs
     path('profissional/painel/', views.professional_dashboard, name='professional_dashboard'),
     path('profissional/localizacao/', views.professional_file_location_view, name='professional_file_location'),
+    path('profissional/localizacao/busca/', views.professional_file_location_search_view, name='professional_file_location_search'),
     path('profissional/contratos/ver/', views.professional_contracts_view, name='professional_contracts'), # Query view
     path('profissional/gerar_capa/<int:profissional_id>/', views.generate_professional_cover_pdf, name='generate_professional_cover'),
 
@@ -48,6 +54,7 @@ urlpatterns = [
     path('profissional/manutencao/dados_pessoais/novo/', views.professional_personal_data_maintenance_view, name='professional_personal_data_create'),
     path('profissional/manutencao/dados_pessoais/editar/<int:profissional_id>/', views.professional_personal_data_maintenance_view, name='professional_personal_data_edit'),
     path('profissional/manutencao/dados_pessoais/apagar/<int:profissional_id>/', views.professional_personal_data_delete_view, name='professional_personal_data_delete'),
+    path('profissional/manutencao/dados_pessoais/expurgar/', views.professional_personal_data_purge_view, name='professional_personal_data_purge'),
 
     # Professional Contracts Maintenance
     path('profissional/<int:profissional_id>/contratos/listar/', views.professional_contracts_maintenance_list_view, name='professional_contracts_maintenance_list'),
@@ -55,6 +62,28 @@ urlpatterns = [
     path('profissional/<int:profissional_id>/contratos/editar/<int:contrato_id>/', views.professional_contracts_maintenance_view, name='professional_contracts_edit'),
     path('profissional/<int:profissional_id>/contratos/apagar/<int:contrato_id>/', views.professional_contract_delete_view, name='professional_contract_delete'),
 
+    # Catálogo de documentos vinculados (estudantes e profissionais)
+    path('documentos/', views.consultar_documentos_view, name='consultar_documentos'),
+
+    # Inventário do arquivo físico (CSV/XLSX)
+    path('inventario/exportar/', views.exportar_inventario_view, name='exportar_inventario'),
+
+    # Importação dos CSVs exportados do SIGEEC (alunos e servidores)
+    path('importacao/sigeec/', views.importar_sigeec_view, name='importar_sigeec'),
+
+    # Capas de vários registros num único PDF
+    path('capas/lote/', views.capas_em_lote_view, name='capas_em_lote'),
+
+    # API JSON somente leitura (paginação por cursor)
+    path('api/<str:recurso>/', views.api_listar_view, name='api_listar'),
+
+    # Envio de documentos grandes em partes, retomável
+    path('documentos/envios/', views.iniciar_envio_documento_view, name='iniciar_envio_documento'),
+    path('documentos/envios/<uuid:envio_id>/', views.envio_documento_view, name='envio_documento'),
+
+    # Download de documentos vinculados (só com login)
+    path('documento/<int:documento_id>/', views.baixar_documento_view, name='baixar_documento'),
+
     # Exclusão de documentos vinculados (para estudantes e/ou profissionais)
     path('documento/deletar/<int:documento_id>/', views.delete_documento_vinculado_view, name='delete_documento_vinculado'),
 
@@ -1,81 +1,2066 @@
-from django.db import transaction
-from django.db.models import Max
+import contextvars
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unicodedata
+import zipfile
+import zlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+from itertools import islice
+from xml.sax.saxutils import escape, quoteattr
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from fpdf.output import OutputProducer, PDFContentStream
+from fpdf.syntax import Name
+from fpdf.syntax import create_dictionary_string as pdf_dict
+from fpdf.syntax import iobj_ref as pdf_ref
 
-def get_numeros_disponiveis(tipo):
-    from .models import NumeroPassivoDisponivel, Aluno_Arquivo, Profissional_Arquivo
-    from django.db.models import Max
+# Tempo de vida das faixas em cache; a invalidação normal é pela versão
+CACHE_FAIXAS_TIMEOUT = 60 * 60 * 24
+
+# Dentro de liberacao_em_lote(), release_numero_passivo só acumula os números
+_liberacoes_adiadas = contextvars.ContextVar("liberacoes_adiadas", default=None)
+
+# Dentro de resumo_em_lote(), ajustar_resumo só acumula as variações
+_ajustes_resumo_adiados = contextvars.ContextVar("ajustes_resumo_adiados", default=None)
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# FAIXAS DE NÚMEROS LIVRES
+# =========================
+#
+# Os números de passivo livres de cada tipo ficam guardados como faixas
+# [inicio, fim] em FaixaPassivoLivre. Há sempre uma faixa aberta (fim nulo)
+# que começa no próximo número sequencial; as demais são lacunas abaixo dela.
+# Todas as consultas abaixo usam o índice único (tipo, inicio), então custam
+# O(log n) no número de faixas, e não no número de arquivos.
+#
+# Toda alteração nas faixas de um tipo começa travando a sua faixa aberta
+# (_travar_faixa_aberta). No PostgreSQL o SELECT ... FOR UPDATE serializa os
+# workers por tipo; no SQLite, que ignora FOR UPDATE, a serialização vem do
+# transaction_mode IMMEDIATE configurado em settings.DATABASES. Assim dois
+# cadastros simultâneos esperam um pelo outro em vez de receberem o mesmo
+# número e falharem na constraint unique.
+
+
+def _get_faixa_aberta(tipo):
+    from .models import FaixaPassivoLivre, Aluno_Arquivo, Profissional_Arquivo
+
+    faixa = FaixaPassivoLivre.objects.filter(tipo=tipo, fim__isnull=True).first()
+    if faixa:
+        return faixa
+
+    # Banco sem faixa aberta (ex.: tabela limpa manualmente): recomeça do maior usado
+    modelo = Aluno_Arquivo if tipo == 'A' else Profissional_Arquivo
+    max_loc = modelo.objects.aggregate(
+        max_loc=Max("localizacao_arquivo")
+    )["max_loc"]
+
+    faixa, _ = FaixaPassivoLivre.objects.get_or_create(
+        tipo=tipo,
+        fim=None,
+        defaults={"inicio": (max_loc or 0) + 1}
+    )
+    return faixa
+
+
+def _travar_faixa_aberta(tipo):
+    from .models import FaixaPassivoLivre
+
+    travadas = FaixaPassivoLivre.objects.select_for_update().filter(tipo=tipo, fim__isnull=True)
+
+    faixa = travadas.first()
+    if faixa is None:
+        _get_faixa_aberta(tipo)
+        faixa = travadas.get()
+    return faixa
+
+
+def _get_faixa_contendo(numero, tipo):
+    from .models import FaixaPassivoLivre
+
+    faixa = (
+        FaixaPassivoLivre.objects
+        .filter(tipo=tipo, inicio__lte=numero)
+        .order_by("-inicio")
+        .first()
+    )
+
+    if faixa and (faixa.fim is None or faixa.fim >= numero):
+        return faixa
+    return None
+
+
+def _retirar_da_faixa(faixa, numero):
+    from .models import FaixaPassivoLivre
+
+    if faixa.inicio == numero:
+        if faixa.fim == numero:
+            faixa.delete()
+        else:
+            faixa.inicio = numero + 1
+            faixa.save(update_fields=["inicio"])
+    elif faixa.fim == numero:
+        faixa.fim = numero - 1
+        faixa.save(update_fields=["fim"])
+    else:
+        # número no meio da faixa: divide em duas
+        fim_original = faixa.fim
+        faixa.fim = numero - 1
+        faixa.save(update_fields=["fim"])
+        FaixaPassivoLivre.objects.create(
+            tipo=faixa.tipo,
+            inicio=numero + 1,
+            fim=fim_original
+        )
+
+
+def _subtrair_numeros(faixas, numeros):
+    """Remove os números (ordenados, sem repetição) das faixas (ordenadas)."""
+    resultado = []
+    i = 0
+
+    for inicio, fim in faixas:
+        while i < len(numeros) and numeros[i] < inicio:
+            i += 1
+
+        atual = inicio
+        while i < len(numeros) and (fim is None or numeros[i] <= fim):
+            if numeros[i] > atual:
+                resultado.append((atual, numeros[i] - 1))
+            atual = numeros[i] + 1
+            i += 1
+
+        if fim is None or atual <= fim:
+            resultado.append((atual, fim))
+
+    return resultado
+
+
+def _regravar_faixas(tipo, antigas, novas):
+    """
+    Substitui as faixas do tipo (antigas: tuplas id, inicio, fim) pelas novas
+    com no máximo três queries. A faixa aberta é atualizada no lugar, para
+    não perder o lock obtido em _travar_faixa_aberta. A ordem (remover,
+    mover a aberta, criar) evita colisões no unique (tipo, inicio).
+    """
+    from .models import FaixaPassivoLivre
+
+    novas_finitas = {(inicio, fim) for inicio, fim in novas if fim is not None}
+    inicio_aberta = next(inicio for inicio, fim in novas if fim is None)
+
+    remover = []
+    mantidas = set()
+    aberta = None
+    for pk, inicio, fim in antigas:
+        if fim is None:
+            aberta = (pk, inicio)
+        elif (inicio, fim) in novas_finitas:
+            mantidas.add((inicio, fim))
+        else:
+            remover.append(pk)
+
+    if remover:
+        FaixaPassivoLivre.objects.filter(pk__in=remover).delete()
+
+    if aberta[1] != inicio_aberta:
+        FaixaPassivoLivre.objects.filter(pk=aberta[0]).update(inicio=inicio_aberta)
+
+    criar = [
+        FaixaPassivoLivre(tipo=tipo, inicio=inicio, fim=fim)
+        for inicio, fim in sorted(novas_finitas - mantidas)
+    ]
+    if criar:
+        FaixaPassivoLivre.objects.bulk_create(criar)
+
+
+def _unir_numeros(faixas, numeros):
+    """Acrescenta os números às faixas, juntando as que se tocam ou sobrepõem."""
+    resultado = []
+
+    for inicio, fim in sorted(list(faixas) + [(n, n) for n in numeros], key=lambda f: f[0]):
+        if resultado:
+            ultimo_inicio, ultimo_fim = resultado[-1]
+            if ultimo_fim is None or inicio <= ultimo_fim + 1:
+                if ultimo_fim is not None and (fim is None or fim > ultimo_fim):
+                    resultado[-1] = (ultimo_inicio, fim)
+                continue
+        resultado.append((inicio, fim))
+
+    return resultado
+
+
+def _diferenca_faixas(a, b):
+    """Faixas com os números de `a` que não estão em `b` (ambas ordenadas e disjuntas)."""
+    infinito = float("inf")
+    resultado = []
+    j = 0
+
+    for inicio, fim in a:
+        fim = infinito if fim is None else fim
+        atual = inicio
+
+        while j < len(b) and (infinito if b[j][1] is None else b[j][1]) < atual:
+            j += 1
+
+        k = j
+        while k < len(b) and b[k][0] <= fim and atual <= fim:
+            b_fim = infinito if b[k][1] is None else b[k][1]
+            if b[k][0] > atual:
+                resultado.append((atual, b[k][0] - 1))
+            atual = max(atual, b_fim + 1)
+            k += 1
+
+        if atual <= fim and atual != infinito:
+            resultado.append((atual, None if fim == infinito else fim))
+
+    return resultado
 
-    numeros_livres = list(
-        NumeroPassivoDisponivel.objects
+
+def _contar_numeros(faixas):
+    return sum(fim - inicio + 1 for inicio, fim in faixas if fim is not None)
+
+
+def _escolher_numeros(faixas, quantidade, contiguo):
+    if contiguo:
+        # primeira lacuna que comporte o bloco inteiro; a faixa aberta sempre comporta
+        for inicio, fim in faixas:
+            if fim is None or fim - inicio + 1 >= quantidade:
+                return list(range(inicio, inicio + quantidade))
+
+    numeros = []
+    for inicio, fim in faixas:
+        ultimo = inicio + quantidade - len(numeros) - 1
+        if fim is not None:
+            ultimo = min(ultimo, fim)
+        numeros.extend(range(inicio, ultimo + 1))
+        if len(numeros) == quantidade:
+            break
+    return numeros
+
+
+def _get_faixas_com_id(tipo):
+    from .models import FaixaPassivoLivre
+
+    return list(
+        FaixaPassivoLivre.objects
         .filter(tipo=tipo)
-        .values_list("numero", flat=True)
+        .order_by("inicio")
+        .values_list("id", "inicio", "fim")
+    )
+
+
+def _tipo_passivo(modelo):
+    from .models import Aluno_Arquivo
+
+    return 'A' if issubclass(modelo, Aluno_Arquivo) else 'P'
+
+
+def get_faixas_disponiveis(tipo):
+    """Retorna as faixas livres como tuplas (inicio, fim); fim None = aberta."""
+    from .models import FaixaPassivoLivre
+
+    faixas = FaixaPassivoLivre.objects.filter(tipo=tipo).order_by("inicio").values_list("inicio", "fim")
+
+    resultado = list(faixas)
+    if not resultado or resultado[-1][1] is not None:
+        _get_faixa_aberta(tipo)
+        resultado = list(faixas)
+    return resultado
+
+
+# =========================
+# CACHE DAS FAIXAS LIVRES
+# =========================
+#
+# Formulários e a busca de localizações leem as faixas do cache, numa chave
+# versionada por tipo. Toda alteração nas faixas incrementa a versão após o
+# commit, de modo que nenhuma leitura concorrente grave em cache um estado
+# anterior sob a versão nova. Com mais de um worker, configure CACHES com um
+# backend compartilhado; a validação do número sempre consulta o banco.
+
+
+def _chave_versao_faixas(tipo):
+    return f"localizador:faixas:{tipo}:versao"
+
+
+def invalidar_cache_faixas(tipo):
+    def _incrementar():
+        try:
+            cache.incr(_chave_versao_faixas(tipo))
+        except ValueError:
+            # versão expulsa do cache: recomeça de um valor que não colide
+            cache.set(_chave_versao_faixas(tipo), time.time_ns(), None)
+
+    transaction.on_commit(_incrementar)
+
+
+def get_faixas_disponiveis_cache(tipo):
+    versao = cache.get_or_set(_chave_versao_faixas(tipo), time.time_ns, None)
+    chave = f"localizador:faixas:{tipo}:v{versao}"
+
+    faixas = cache.get(chave)
+    if faixas is None:
+        faixas = get_faixas_disponiveis(tipo)
+        cache.set(chave, faixas, CACHE_FAIXAS_TIMEOUT)
+    return faixas
+
+
+def _faixas_oferecidas(faixas):
+    # Da faixa aberta só se oferece o primeiro número (o próximo sequencial)
+    return [(inicio, inicio if fim is None else fim) for inicio, fim in faixas]
+
+
+def get_proximo_numero_sugerido(tipo):
+    return _faixas_oferecidas(get_faixas_disponiveis_cache(tipo))[0][0]
+
+
+def buscar_numeros_disponiveis(tipo, prefixo="", limite=20):
+    """
+    Números oferecidos cujo texto começa com `prefixo`, em ordem crescente.
+    Percorre as faixas em cache sem expandi-las: para cada quantidade extra de
+    dígitos k, os candidatos formam o intervalo [p * 10^k, (p + 1) * 10^k - 1].
+    """
+    faixas = _faixas_oferecidas(get_faixas_disponiveis_cache(tipo))
+    numeros = []
+
+    if not prefixo:
+        candidatos = [(1, faixas[-1][1])]
+    elif prefixo.isdigit() and not prefixo.startswith("0"):
+        p = int(prefixo)
+        candidatos = []
+        k = 0
+        while p * 10 ** k <= faixas[-1][1]:
+            candidatos.append((p * 10 ** k, (p + 1) * 10 ** k - 1))
+            k += 1
+    else:
+        return numeros
+
+    for baixo, alto in candidatos:
+        for inicio, fim in faixas:
+            if fim < baixo or inicio > alto:
+                continue
+            for numero in range(max(inicio, baixo), min(fim, alto) + 1):
+                numeros.append(numero)
+                if len(numeros) >= limite:
+                    return numeros
+    return numeros
+
+
+def get_numeros_disponiveis(tipo):
+    numeros_livres = []
+    proximo = None
+
+    for inicio, fim in get_faixas_disponiveis(tipo):
+        if fim is None:
+            proximo = inicio
+        else:
+            numeros_livres.extend(range(inicio, fim + 1))
+
+    # Lacunas primeiro e, por último, o próximo número sequencial
+    numeros_livres.append(proximo)
+    return numeros_livres
+
+
+def numero_passivo_disponivel(numero, tipo):
+    """Indica se o número está numa lacuna livre ou é o próximo sequencial."""
+    if not numero:
+        return False
+
+    faixa = _get_faixa_contendo(numero, tipo)
+    if faixa is None:
+        return False
+
+    if faixa.fim is None:
+        return numero == faixa.inicio
+    return True
+
+
+def get_next_numero_passivo(tipo):
+    from .models import FaixaPassivoLivre
+
+    with transaction.atomic():
+        faixa_aberta = _travar_faixa_aberta(tipo)
+
+        faixa = (
+            FaixaPassivoLivre.objects
+            .filter(tipo=tipo, fim__isnull=False)
+            .order_by("inicio")
+            .first()
+        ) or faixa_aberta
+
+        numero = faixa.inicio
+        _retirar_da_faixa(faixa, numero)
+        invalidar_cache_faixas(tipo)
+        return numero
+
+
+def ocupar_numero_passivo(numero, tipo):
+    if not numero:
+        return
+
+    with transaction.atomic():
+        _travar_faixa_aberta(tipo)
+
+        faixa = _get_faixa_contendo(numero, tipo)
+        if faixa:
+            _retirar_da_faixa(faixa, numero)
+            invalidar_cache_faixas(tipo)
+
+
+def release_numero_passivo(numero, tipo):
+    from .models import FaixaPassivoLivre
+
+    if not numero:
+        return
+
+    adiadas = _liberacoes_adiadas.get()
+    if adiadas is not None:
+        adiadas[tipo].append(numero)
+        return
+
+    with transaction.atomic():
+        _travar_faixa_aberta(tipo)
+
+        if _get_faixa_contendo(numero, tipo):
+            return
+
+        anterior = _get_faixa_contendo(numero - 1, tipo)
+        seguinte = FaixaPassivoLivre.objects.filter(tipo=tipo, inicio=numero + 1).first()
+
+        if anterior and seguinte:
+            # o número fecha a lacuna entre duas faixas
+            fim_seguinte = seguinte.fim
+            seguinte.delete()
+            anterior.fim = fim_seguinte
+            anterior.save(update_fields=["fim"])
+        elif anterior:
+            anterior.fim = numero
+            anterior.save(update_fields=["fim"])
+        elif seguinte:
+            seguinte.inicio = numero
+            seguinte.save(update_fields=["inicio"])
+        else:
+            FaixaPassivoLivre.objects.create(tipo=tipo, inicio=numero, fim=numero)
+
+        invalidar_cache_faixas(tipo)
+
+
+def _reservar(tipo, quantidade, contiguo=True, ocupar=()):
+    """Retira `ocupar` das faixas e reserva mais `quantidade` números, numa única passada."""
+    ocupar = sorted({n for n in ocupar if n})
+    if quantidade <= 0 and not ocupar:
+        return []
+
+    with transaction.atomic():
+        _travar_faixa_aberta(tipo)
+
+        antigas = _get_faixas_com_id(tipo)
+        faixas = _subtrair_numeros([(inicio, fim) for _, inicio, fim in antigas], ocupar)
+
+        numeros = _escolher_numeros(faixas, quantidade, contiguo) if quantidade > 0 else []
+        _regravar_faixas(tipo, antigas, _subtrair_numeros(faixas, numeros))
+        invalidar_cache_faixas(tipo)
+
+    return numeros
+
+
+def ocupar_numeros_passivo(numeros, tipo):
+    """Versão em lote de ocupar_numero_passivo, com número constante de queries."""
+    _reservar(tipo, 0, ocupar=numeros)
+
+
+def reservar_numeros_passivo(tipo, quantidade, contiguo=True):
+    """
+    Reserva `quantidade` números de uma só vez e os retorna em ordem.
+
+    Com contiguo=True o bloco é sempre sequencial: usa a primeira lacuna que
+    caiba inteiro ou, se nenhuma couber, o início da faixa aberta. Com
+    contiguo=False as lacunas são preenchidas primeiro.
+
+    Chame dentro da mesma transação que grava os registros (ex.: bulk_create),
+    para que a reserva seja desfeita se a gravação falhar.
+    """
+    return _reservar(tipo, quantidade, contiguo)
+
+
+def criar_em_lote_com_localizacao(modelo, objetos, contiguo=True, batch_size=500):
+    """
+    bulk_create de Aluno_Arquivo/Profissional_Arquivo alocando localizações.
+
+    Objetos sem localizacao_arquivo recebem números de uma única reserva; os
+    que já trazem número o retiram das faixas livres. Tudo numa transação.
+    """
+    tipo = _tipo_passivo(modelo)
+
+    with transaction.atomic():
+        sem_numero = [obj for obj in objetos if not obj.localizacao_arquivo]
+        com_numero = [obj.localizacao_arquivo for obj in objetos if obj.localizacao_arquivo]
+
+        numeros = _reservar(tipo, len(sem_numero), contiguo, ocupar=com_numero)
+        for obj, numero in zip(sem_numero, numeros):
+            obj.localizacao_arquivo = numero
+
+        # bulk_create não chama save(): preenche as colunas de busca aqui
+        for obj in objetos:
+            obj.atualizar_campos_busca()
+
+        criados = modelo.objects.bulk_create(objetos, batch_size=batch_size)
+        ajustar_resumo(contar_para_resumo(modelo, criados))
+        return criados
+
+
+def liberar_numeros_passivo(numeros, tipo):
+    """Versão em lote de release_numero_passivo, com número constante de queries."""
+    numeros = sorted({n for n in numeros if n})
+    if not numeros:
+        return
+
+    with transaction.atomic():
+        _travar_faixa_aberta(tipo)
+
+        antigas = _get_faixas_com_id(tipo)
+        faixas = [(inicio, fim) for _, inicio, fim in antigas]
+        _regravar_faixas(tipo, antigas, _unir_numeros(faixas, numeros))
+        invalidar_cache_faixas(tipo)
+
+
+@contextmanager
+def liberacao_em_lote():
+    """
+    Acumula os números devolvidos por release_numero_passivo (ex.: pelos
+    receivers de pre_delete) e os devolve de uma vez ao sair do bloco.
+    Use dentro de uma transação: se o bloco falhar, nada é devolvido.
+    """
+    adiadas = {'A': [], 'P': []}
+    token = _liberacoes_adiadas.set(adiadas)
+    try:
+        yield adiadas
+    finally:
+        _liberacoes_adiadas.reset(token)
+
+    for tipo, numeros in adiadas.items():
+        liberar_numeros_passivo(numeros, tipo)
+
+
+def expurgar_arquivos(queryset, tamanho_lote=500):
+    """
+    Exclui os Aluno_Arquivo/Profissional_Arquivo do queryset em lotes, cada
+    lote na sua transação, para não segurar o lock do banco durante todo o
+    expurgo. Contatos, pendências e contratos saem em cascata por lote; os
+    documentos vinculados também (os arquivos, pelo post_delete de
+    DocumentoVinculado, depois do commit de cada lote), e os números
+    de passivo voltam às faixas livres numa única operação por lote.
+    Retorna a quantidade de registros excluídos.
+    """
+    modelo = queryset.model
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.order_by("pk").values_list("pk", flat=True)[:tamanho_lote])
+            if not pks:
+                break
+
+            # os documentos saem em cascata (GenericRelation "documentos")
+            with liberacao_em_lote(), resumo_em_lote():
+                modelo.objects.filter(pk__in=pks).delete()
+
+        total += len(pks)
+
+    return total
+
+
+def calcular_faixas_esperadas(tipo, chunk_size=2000):
+    """
+    Faixas livres deduzidas só das localizações em uso, numa passada em ordem
+    pelo índice unique de localizacao_arquivo: toda lacuna entre dois números
+    usados fica livre e a faixa aberta começa logo após o maior.
+    """
+    from .models import Aluno_Arquivo, Profissional_Arquivo
+
+    modelo = Aluno_Arquivo if tipo == 'A' else Profissional_Arquivo
+    usados = (
+        modelo.objects
+        .exclude(localizacao_arquivo__isnull=True)
+        .order_by("localizacao_arquivo")
+        .values_list("localizacao_arquivo", flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+
+    faixas = []
+    proximo = 1
+    for numero in usados:
+        if numero > proximo:
+            faixas.append((proximo, numero - 1))
+        proximo = max(proximo, numero + 1)
+
+    faixas.append((proximo, None))
+    return faixas
+
+
+def auditar_faixas(tipo, corrigir=False):
+    """
+    Compara as faixas gravadas com as esperadas e, se corrigir=True, regrava
+    as faixas do tipo. Retorna as divergências encontradas:
+    em_uso: números marcados como livres mas ocupados por algum registro;
+    perdidos: números sem registro que não constam como livres.
+    """
+    with transaction.atomic():
+        if corrigir:
+            _travar_faixa_aberta(tipo)
+
+        antigas = _get_faixas_com_id(tipo)
+        atuais = [(inicio, fim) for _, inicio, fim in antigas]
+        esperadas = calcular_faixas_esperadas(tipo)
+
+        em_uso = _diferenca_faixas(atuais, esperadas)
+        perdidos = _diferenca_faixas(esperadas, atuais)
+
+        if corrigir and (em_uso or perdidos):
+            _regravar_faixas(tipo, antigas, esperadas)
+            invalidar_cache_faixas(tipo)
+
+    return {
+        "tipo": tipo,
+        "faixas": len(esperadas),
+        "em_uso": em_uso,
+        "perdidos": perdidos,
+        "total_em_uso": _contar_numeros(em_uso),
+        "total_perdidos": _contar_numeros(perdidos),
+    }
+
+
+# =========================
+# BUSCA E PAGINAÇÃO
+# =========================
+#
+# As listagens são paginadas por chave (keyset): a página seguinte começa
+# depois da última linha exibida, em vez de usar OFFSET. Com um índice na
+# mesma ordem da listagem, o custo de cada página não cresce com a posição.
+
+def _codificar_cursor(valores):
+    return urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor, modelo, ordem):
+    """Valores do cursor convertidos pelos campos de ordem, ou None se o cursor não for válido."""
+    try:
+        valores = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != len(ordem) or None in valores:
+        return None
+    # O cursor vem do cliente: cada valor tem de servir para o seu campo
+    try:
+        return [modelo._meta.get_field(campo).to_python(valor) for campo, valor in zip(ordem, valores)]
+    except ValidationError:
+        return None
+
+
+def cursor_valido(cursor, modelo, ordem):
+    return _decodificar_cursor(cursor, modelo, ordem) is not None
+
+
+def paginar_por_chave(queryset, ordem, cursor=None, tamanho=50):
+    """
+    Uma página do queryset na ordem dos campos `ordem` (crescente; o último
+    deve ser único, normalmente a pk). Retorna (itens, cursor da próxima
+    página ou None). Aceita querysets de instâncias ou de values(). Cursor
+    inválido recomeça da primeira página.
+    """
+    valores = _decodificar_cursor(cursor, queryset.model, ordem) if cursor else None
+
+    if valores:
+        # (a, b) > (va, vb)  ==  a > va OR (a = va AND b > vb)
+        depois = Q()
+        for i, campo in enumerate(ordem):
+            iguais = {anterior: valores[j] for j, anterior in enumerate(ordem[:i])}
+            depois |= Q(**iguais, **{f"{campo}__gt": valores[i]})
+        queryset = queryset.filter(depois)
+
+    itens = list(queryset.order_by(*ordem)[:tamanho + 1])
+
+    proximo = None
+    if len(itens) > tamanho:
+        itens = itens[:tamanho]
+        ultimo = itens[-1]
+        if isinstance(ultimo, dict):
+            proximo = _codificar_cursor([ultimo[campo] for campo in ordem])
+        else:
+            proximo = _codificar_cursor([getattr(ultimo, campo) for campo in ordem])
+
+    return itens, proximo
+
+
+def normalizar_texto(valor):
+    """Texto para busca: sem acentos, em minúsculas e com espaços simples ("Conceição" -> "conceicao")."""
+    if not valor:
+        return ""
+    decomposto = unicodedata.normalize("NFKD", valor)
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.casefold().split())
+
+
+def normalizar_cpf(valor):
+    """Só os dígitos do CPF ("123.456.789-00" -> "12345678900")."""
+    return re.sub(r"\D", "", valor or "")
+
+
+# O CPF só entra como prefixo a partir destes dígitos: um ou dois dígitos pegam
+# boa parte dos registros, que teriam de ser ordenados por nome a cada tecla
+DIGITOS_MINIMOS_CPF = 3
+
+
+def filtro_prefixo(campo, prefixo):
+    """
+    campo começa com prefixo, escrito como intervalo [prefixo, prefixo+1) para
+    que o banco use o índice comum da coluna (o LIKE do SQLite não usa).
+    Prefixo vazio levanta ValueError.
+    """
+    if not prefixo:
+        raise ValueError("Prefixo vazio.")
+    fim = prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+    return Q(**{f"{campo}__gte": prefixo, f"{campo}__lt": fim})
+
+
+def filtrar_arquivos_por_termo(queryset, tipo, termo):
+    """
+    Filtra alunos (A) ou servidores (P) por nome, CPF, código do sistema ou
+    localização, sem diferenciar acentos e maiúsculas. Tudo sai de índices:
+    prefixo de nome_busca ou de cpf_busca (com DIGITOS_MINIMOS_CPF) e os
+    únicos de cod_sistema e localizacao_arquivo. Palavras no meio do nome (sobrenomes) ficam com a busca
+    unificada (buscar_arquivos), que usa o índice de texto.
+    """
+    termo = termo.strip()
+    if not termo:
+        return queryset
+
+    cpf = normalizar_cpf(termo)
+    if cpf and re.fullmatch(r"[\d.\-\s]+", termo):
+        filtro = filtro_prefixo("cpf_busca", cpf) if len(cpf) >= DIGITOS_MINIMOS_CPF else Q()
+        if termo.isdigit():
+            numero = int(termo)
+            filtro |= Q(localizacao_arquivo=numero)
+            if tipo == 'A':
+                filtro |= Q(cod_sistema=numero)
+        return queryset.filter(filtro) if filtro else queryset.none()
+
+    # nome: só o começo, para andar no índice na ordem da listagem (um LIKE
+    # '% termo%' obrigaria a percorrer o índice inteiro a cada tecla)
+    nome = normalizar_texto(termo)
+    if not nome:
+        # só acentos soltos (marcas combinantes): como a busca vazia
+        return queryset
+    return queryset.filter(filtro_prefixo("nome_busca", nome))
+
+
+# =========================
+# ÍNDICE DE BUSCA
+# =========================
+#
+# A tabela localizador_busca (FTS5 no SQLite, tsvector no PostgreSQL) tem uma
+# entrada por aluno, servidor, pendência, contato e contrato, apontando para a
+# pasta (aluno ou servidor) onde o documento fica. Ela é mantida por triggers
+# criados na migração 0004, então cobre também bulk_create, update() e exclusões
+# em cascata sem custo extra no Python.
+
+def _termos_busca(termo):
+    return re.findall(r"\w+", termo.lower())
+
+
+def _buscar_no_indice(termos, limite):
+    """Entradas do índice em ordem de relevância: (pasta, pasta_id, entidade)."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # cada termo vira um prefixo entre aspas: nada do usuário vira operador FTS
+            consulta = " ".join(f'"{t}"*' for t in termos)
+            cursor.execute(
+                "SELECT pasta, pasta_id, entidade FROM localizador_busca "
+                "WHERE localizador_busca MATCH %s ORDER BY rank LIMIT %s",
+                [consulta, limite]
+            )
+        else:
+            consulta = " & ".join(f"{t}:*" for t in termos)
+            cursor.execute(
+                "SELECT pasta, pasta_id, entidade FROM localizador_busca "
+                "WHERE documento @@ to_tsquery('simple', %s) "
+                "ORDER BY ts_rank(documento, to_tsquery('simple', %s)) DESC LIMIT %s",
+                [consulta, consulta, limite]
+            )
+        return cursor.fetchall()
+
+
+def _buscar_sem_indice(termos, limite):
+    """Busca simples para bancos sem o índice (nem SQLite, nem PostgreSQL)."""
+    from .models import Aluno_Arquivo, Profissional_Arquivo
+
+    alunos = Aluno_Arquivo.objects.all()
+    profissionais = Profissional_Arquivo.objects.all()
+    for t in termos:
+        filtro = Q(nome_busca__contains=normalizar_texto(t)) | Q(cpf_busca__contains=t)
+        alunos = alunos.filter(filtro)
+        profissionais = profissionais.filter(filtro)
+
+    return (
+        [('A', pk, "aluno") for pk in alunos.values_list("pk", flat=True)[:limite]]
+        + [('P', pk, "profissional") for pk in profissionais.values_list("pk", flat=True)[:limite]]
     )
 
+
+def buscar_arquivos(termo, limite=20):
+    """
+    Busca unificada: pastas de alunos e servidores que batem com o termo em
+    qualquer entidade indexada, da mais para a menos relevante. Cada resultado
+    traz as entidades onde o termo foi encontrado.
+    """
+    from .models import Aluno_Arquivo, Profissional_Arquivo
+
+    termos = _termos_busca(termo)
+    if not termos:
+        return []
+
+    if connection.vendor in ("sqlite", "postgresql"):
+        entradas = _buscar_no_indice(termos, limite * 5)
+    else:
+        entradas = _buscar_sem_indice(termos, limite)
+
+    # várias entradas podem apontar para a mesma pasta: fica a mais relevante
+    pastas = {}
+    for pasta, pasta_id, entidade in entradas:
+        chave = (pasta, pasta_id)
+        if chave not in pastas:
+            if len(pastas) == limite:
+                continue
+            pastas[chave] = []
+        if entidade not in pastas[chave]:
+            pastas[chave].append(entidade)
+
+    dados = {}
+    ids_alunos = [pk for pasta, pk in pastas if pasta == 'A']
+    ids_profissionais = [pk for pasta, pk in pastas if pasta == 'P']
+    if ids_alunos:
+        for pk, nome, localizacao in Aluno_Arquivo.objects.filter(pk__in=ids_alunos).values_list(
+            "pk", "nome_aluno", "localizacao_arquivo"
+        ):
+            dados[('A', pk)] = (nome, localizacao)
+    if ids_profissionais:
+        for pk, nome, localizacao in Profissional_Arquivo.objects.filter(pk__in=ids_profissionais).values_list(
+            "pk", "nome_profissional", "localizacao_arquivo"
+        ):
+            dados[('P', pk)] = (nome, localizacao)
+
+    return [
+        {
+            "tipo": pasta,
+            "id": pk,
+            "nome": dados[(pasta, pk)][0],
+            "localizacao": dados[(pasta, pk)][1],
+            "encontrado_em": entidades,
+        }
+        for (pasta, pk), entidades in pastas.items()
+        if (pasta, pk) in dados
+    ]
+
+
+# =========================
+# EXPORTAÇÃO DO INVENTÁRIO
+# =========================
+#
+# O inventário é lido com QuerySet.iterator() e escrito linha a linha em CSV ou
+# XLSX, em pedaços, para que a memória não cresça com o número de registros.
+# As contagens e o último contrato vêm anotados na própria consulta.
+
+# (coluna do values(), título) de cada tipo
+COLUNAS_INVENTARIO = {
+    'A': [
+        ("localizacao_arquivo", "Localização"),
+        ("cod_sistema", "Código SIGEEC"),
+        ("nome_aluno", "Nome"),
+        ("cpf", "CPF"),
+        ("status_arquivo_aluno", "Status"),
+        ("total_pendencias", "Pendências"),
+        ("ultima_pendencia", "Última pendência"),
+    ],
+    'P': [
+        ("localizacao_arquivo", "Localização"),
+        ("nome_profissional", "Nome"),
+        ("cpf", "CPF"),
+        ("status_arquivo_profissional", "Status"),
+        ("total_contratos", "Contratos"),
+        ("ultimo_contrato_funcao", "Função (último contrato)"),
+        ("ultimo_contrato_inicio", "Início (último contrato)"),
+        ("ultimo_contrato_fim", "Fim (último contrato)"),
+    ],
+}
+
+
+def inventario_queryset(tipo):
+    """values() do inventário de alunos (A) ou servidores (P), em ordem de localização."""
+    from django.db.models import Count, OuterRef, Subquery
+    from .models import Aluno_Arquivo, Profissional_Arquivo, Pendencia, Contrato
+
     if tipo == 'A':
-        usados = set(
-            Aluno_Arquivo.objects
-            .exclude(localizacao_arquivo__isnull=True)
-            .values_list("localizacao_arquivo", flat=True)
+        pendencias = Pendencia.objects.filter(aluno_arquivo=OuterRef("pk")).order_by()
+        queryset = Aluno_Arquivo.objects.annotate(
+            total_pendencias=Subquery(
+                pendencias.values("aluno_arquivo").annotate(total=Count("pk")).values("total")
+            ),
+            ultima_pendencia=Subquery(
+                pendencias.order_by("-dt_lancamento_pendencia").values("dt_lancamento_pendencia")[:1]
+            ),
         )
-        max_loc = Aluno_Arquivo.objects.aggregate(
-            max_loc=Max("localizacao_arquivo")
-        )["max_loc"]
     else:
-        usados = set(
-            Profissional_Arquivo.objects
-            .exclude(localizacao_arquivo__isnull=True)
-            .values_list("localizacao_arquivo", flat=True)
+        contratos = Contrato.objects.filter(profissional_arquivo=OuterRef("pk"))
+        ultimo = contratos.order_by("-dt_inicial", "-pk")  # o mesmo "mais recente" da capa
+        queryset = Profissional_Arquivo.objects.annotate(
+            total_contratos=Subquery(
+                contratos.order_by().values("profissional_arquivo").annotate(total=Count("pk")).values("total")
+            ),
+            ultimo_contrato_funcao=Subquery(ultimo.values("funcao")[:1]),
+            ultimo_contrato_inicio=Subquery(ultimo.values("dt_inicial")[:1]),
+            ultimo_contrato_fim=Subquery(ultimo.values("dt_final")[:1]),
         )
-        max_loc = Profissional_Arquivo.objects.aggregate(
-            max_loc=Max("localizacao_arquivo")
-        )["max_loc"]
 
-    # Remove números que por segurança ainda estejam em uso
-    numeros_livres = [n for n in numeros_livres if n not in usados]
+    campos = [campo for campo, _ in COLUNAS_INVENTARIO[tipo]]
+    return queryset.order_by("localizacao_arquivo").values_list(*campos)
 
-    if numeros_livres:
-        return sorted(numeros_livres)
 
-    # Se não houver livres, oferece apenas o próximo número
-    current_max = max_loc or 0
-    return [current_max + 1]
+def linhas_inventario(tipo, chunk_size=2000):
+    """Cabeçalho e linhas do inventário, lidos do banco em blocos de chunk_size."""
+    yield [titulo for _, titulo in COLUNAS_INVENTARIO[tipo]]
 
+    for linha in inventario_queryset(tipo).iterator(chunk_size=chunk_size):
+        yield [0 if valor is None and campo.startswith("total_") else valor
+               for (campo, _), valor in zip(COLUNAS_INVENTARIO[tipo], linha)]
 
-def get_next_numero_passivo(tipo):
-    from .models import NumeroPassivoDisponivel, Aluno_Arquivo, Profissional_Arquivo
+
+class _Buffer:
+    """Arquivo só de escrita que guarda o que recebeu até ser esvaziado (sem seek/tell)."""
+
+    def __init__(self, vazio=b""):
+        self.vazio = vazio
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(dados)
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = self.vazio.join(self.partes)
+        self.partes = []
+        return dados
+
+
+def gerar_csv(linhas, delimitador=";", linhas_por_bloco=500):
+    """CSV em UTF-8 com BOM (abre direto no Excel), em blocos de texto."""
+    buffer = _Buffer(vazio="")
+    escritor = csv.writer(buffer, delimiter=delimitador)
+    buffer.write("\ufeff")
+
+    for n, linha in enumerate(linhas, start=1):
+        escritor.writerow(["" if valor is None else valor for valor in linha])
+        if n % linhas_por_bloco == 0:
+            yield buffer.esvaziar()
+    yield buffer.esvaziar()
+
+
+# Partes fixas de um XLSX com uma única planilha
+_XLSX_FIXOS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+# Caracteres de controle que o XML não aceita
+_XML_INVALIDOS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _celula_xlsx(valor):
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f"<c><v>{valor}</v></c>"
+    if hasattr(valor, "strftime"):
+        valor = valor.strftime("%d/%m/%Y")
+    texto = escape(_XML_INVALIDOS.sub("", str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def gerar_xlsx(linhas, nome_planilha="Inventário", linhas_por_bloco=500):
+    """
+    Planilha XLSX escrita em fluxo: o zip vai para um buffer sem seek, que é
+    esvaziado a cada bloco de linhas. Usa só a biblioteca padrão.
+    """
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for nome, conteudo in _XLSX_FIXOS.items():
+            arquivo_zip.writestr(nome, conteudo)
+        arquivo_zip.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name={quoteattr(nome_planilha[:31])} sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        )
+        yield buffer.esvaziar()
+
+        with arquivo_zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as planilha:
+            planilha.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for n, linha in enumerate(linhas, start=1):
+                planilha.write(f"<row>{''.join(_celula_xlsx(v) for v in linha)}</row>".encode())
+                if n % linhas_por_bloco == 0:
+                    yield buffer.esvaziar()
+            planilha.write(b"</sheetData></worksheet>")
+
+    yield buffer.esvaziar()
+
+
+# =========================
+# IMPORTAÇÃO DO SIGEEC
+# =========================
+#
+# O CSV exportado do SIGEEC é lido em blocos. Em cada bloco as linhas são
+# validadas, os registros já cadastrados são achados numa única consulta pela
+# chave (código do sistema para alunos, CPF para servidores) e atualizados
+# com um upsert. Os novos ficam para o final e recebem as localizações numa
+# única reserva. Linhas inválidas não interrompem a importação: vão para o
+# relatório, com o número da linha no arquivo.
+
+# Cabeçalhos aceitos para cada campo (comparados sem acentos, caixa ou "_")
+COLUNAS_SIGEEC = {
+    'A': {
+        "cod_sistema": ("cod_sistema", "codigo pessoa", "cod pessoa", "codigo sigeec", "codigo"),
+        "nome_aluno": ("nome_aluno", "nome", "nome pessoa", "nome do aluno"),
+        "cpf": ("cpf",),
+        "status_arquivo_aluno": ("status_arquivo_aluno", "status", "situacao"),
+    },
+    'P': {
+        "cpf": ("cpf",),
+        "nome_profissional": ("nome_profissional", "nome", "nome pessoa", "nome do servidor"),
+        "status_arquivo_profissional": ("status_arquivo_profissional", "status", "situacao"),
+        "observacoes": ("observacoes", "observacao"),
+    },
+}
+
+# Por tipo: (campo da chave no CSV, coluna usada para achar o registro, coluna única do upsert)
+CHAVES_SIGEEC = {
+    'A': ("cod_sistema", "cod_sistema", "cod_sistema"),
+    'P': ("cpf", "cpf_busca", "cpf"),
+}
+
+# Primeira letra do status no SIGEEC ("Ativo", "Permanente", "A", "P")
+_STATUS_SIGEEC = {"a": 'A', "p": 'P'}
+
+
+def _nome_coluna(nome):
+    return normalizar_texto((nome or "").replace("_", " "))
+
+
+def abrir_csv_sigeec(dados, delimitador=";"):
+    """csv.DictReader sobre os bytes do arquivo, em UTF-8 (com ou sem BOM) ou Windows-1252."""
+    try:
+        texto = dados.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        texto = dados.decode("cp1252", errors="replace")
+    return csv.DictReader(io.StringIO(texto, newline=""), delimiter=delimitador)
+
+
+def mapear_colunas_sigeec(tipo, cabecalho):
+    """{coluna do CSV: campo do modelo}. Levanta ValueError se faltar a chave ou o nome."""
+    aceitos = {
+        _nome_coluna(nome): campo
+        for campo, nomes in COLUNAS_SIGEEC[tipo].items()
+        for nome in nomes
+    }
+
+    mapa = {}
+    for coluna in cabecalho or []:
+        campo = aceitos.get(_nome_coluna(coluna))
+        if campo and campo not in mapa.values():
+            mapa[coluna] = campo
+
+    nome_campo = "nome_aluno" if tipo == 'A' else "nome_profissional"
+    faltando = [campo for campo in (CHAVES_SIGEEC[tipo][0], nome_campo) if campo not in mapa.values()]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no CSV: {', '.join(faltando)}.")
+    return mapa
+
+
+def _validar_linha_sigeec(modelo, tipo, mapa, linha):
+    """(chave, dados) de uma linha do CSV; levanta ValidationError se ela for inválida."""
+
+    dados = {}
+    for coluna, campo in mapa.items():
+        valor = (linha.get(coluna) or "").strip()
+        if campo.startswith("status_arquivo"):
+            valor = _STATUS_SIGEEC.get(normalizar_texto(valor)[:1] or "a")
+            if valor is None:
+                raise ValidationError("Status inválido (use Ativo ou Permanente).")
+        dados[campo] = modelo._meta.get_field(campo).clean(valor or None, None)
+
+    if tipo == 'A':
+        return dados["cod_sistema"], dados
+
+    chave = normalizar_cpf(dados["cpf"])
+    if len(chave) != 11:
+        raise ValidationError("CPF inválido.")
+    return chave, dados
+
+
+def _hash_linha_sigeec(dados):
+    """Hash dos valores validados da linha, independente da ordem das colunas no CSV."""
+    conteudo = "\x1f".join(f"{campo}={'' if dados[campo] is None else dados[campo]}" for campo in sorted(dados))
+    return hashlib.md5(conteudo.encode(), usedforsecurity=False).hexdigest()
+
+
+def importar_sigeec(tipo, leitor, usuario, tamanho_lote=1000, sincronizar=False,
+                    marcar_ausentes=False, simular=False):
+    """
+    Importa alunos (A) ou servidores (P) de um csv.DictReader do SIGEEC.
+
+    Registros existentes têm atualizados só os campos presentes no CSV; os
+    novos são criados por criar_em_lote_com_localizacao, com uma reserva só.
+    Tudo numa transação; com simular=True ela é desfeita no final.
+
+    Para alunos, o hash da linha importada fica em hash_sigeec. Com
+    sincronizar=True, linhas com o mesmo hash da última importação não são
+    gravadas, e com marcar_ausentes=True os alunos importados antes que não
+    vieram no arquivo passam para Permanente (só se não houver linhas com erro).
+
+    Retorna {'linhas', 'criados', 'atualizados', 'inalterados', 'ausentes',
+    'diferencas', 'erros'}: diferencas é [(ação, chave, linha)], com ação
+    "inserido", "alterado", "status" ou "ausente", e erros é [(linha, mensagem)].
+    """
+    from .models import Aluno_Arquivo, Profissional_Arquivo, chave_resumo
+
+    if tipo != 'A' and (sincronizar or marcar_ausentes):
+        raise ValueError("A sincronização incremental só está disponível para alunos.")
+
+    modelo = Aluno_Arquivo if tipo == 'A' else Profissional_Arquivo
+    status_campo = "status_arquivo_aluno" if tipo == 'A' else "status_arquivo_profissional"
+    _, campo_busca, campo_unico = CHAVES_SIGEEC[tipo]
+
+    mapa = mapear_colunas_sigeec(tipo, leitor.fieldnames)
+    campos = [campo for campo in mapa.values() if campo != campo_unico]
+    campos += ["nome_busca"] + (["cpf_busca"] if "cpf" in campos else [])
+    if tipo == 'A':
+        campos.append("hash_sigeec")
+    lidos = [campo_busca, campo_unico, status_campo] + (["hash_sigeec"] if tipo == 'A' else [])
+
+    relatorio = {'linhas': 0, 'criados': 0, 'atualizados': 0, 'inalterados': 0, 'ausentes': 0,
+                 'diferencas': [], 'erros': []}
+    vistas = {}  # chave -> linha onde apareceu, para recusar repetições no arquivo
+    novos = []
+    resumo = Counter()
+    numeradas = enumerate(leitor, start=2)  # a linha 1 é o cabeçalho
 
     with transaction.atomic():
-        disponivel = (
-            NumeroPassivoDisponivel.objects
-            .select_for_update()
-            .filter(tipo=tipo)
-            .first()
+        while bloco := list(islice(numeradas, tamanho_lote)):
+            validos = {}
+            for n, linha in bloco:
+                relatorio['linhas'] += 1
+                try:
+                    chave, dados = _validar_linha_sigeec(modelo, tipo, mapa, linha)
+                except ValidationError as e:
+                    relatorio['erros'].append((n, "; ".join(e.messages)))
+                    continue
+                if chave in vistas:
+                    relatorio['erros'].append((n, f"Registro repetido (já lido na linha {vistas[chave]})."))
+                    continue
+                vistas[chave] = n
+                obj = modelo(usuario=usuario, **{status_campo: 'A', **dados})
+                if tipo == 'A':
+                    obj.hash_sigeec = _hash_linha_sigeec(dados)
+                validos[chave] = obj
+
+            existentes = {
+                registro[0]: registro[1:]
+                for registro in modelo.objects.filter(**{f"{campo_busca}__in": list(validos)}).values_list(*lidos)
+            }
+
+            atualizar = []
+            for chave, obj in validos.items():
+                if chave not in existentes:
+                    novos.append(obj)
+                    relatorio['diferencas'].append(("inserido", chave, vistas[chave]))
+                    continue
+
+                unico, status_atual, *hash_atual = existentes[chave]
+                if sincronizar and hash_atual == [obj.hash_sigeec]:
+                    relatorio['inalterados'] += 1
+                    continue
+
+                mudou_status = status_campo in mapa.values() and getattr(obj, status_campo) != status_atual
+                if mudou_status:
+                    # o upsert não dispara sinais: o resumo dos painéis é ajustado aqui
+                    resumo[chave_resumo(modelo, status_atual)] -= 1
+                    resumo[chave_resumo(modelo, getattr(obj, status_campo))] += 1
+                relatorio['diferencas'].append(("status" if mudou_status else "alterado", chave, vistas[chave]))
+                setattr(obj, campo_unico, unico)
+                obj.atualizar_campos_busca()
+                atualizar.append(obj)
+
+            if atualizar:
+                # INSERT ... ON CONFLICT DO UPDATE: um comando por lote, sem ler os registros
+                modelo.objects.bulk_create(
+                    atualizar,
+                    update_conflicts=True,
+                    unique_fields=[campo_unico],
+                    update_fields=campos,
+                    batch_size=tamanho_lote,
+                )
+                relatorio['atualizados'] += len(atualizar)
+
+        if novos:
+            criar_em_lote_com_localizacao(modelo, novos, batch_size=tamanho_lote)
+            relatorio['criados'] = len(novos)
+
+        if marcar_ausentes and not relatorio['erros']:
+            # Só os que vieram do SIGEEC (com hash) e ainda estão ativos. O hash é
+            # apagado para que o aluno seja reativado se voltar a aparecer no arquivo.
+            ausentes = [
+                (pk, cod_sistema)
+                for pk, cod_sistema in Aluno_Arquivo.objects.filter(status_arquivo_aluno='A')
+                .exclude(hash_sigeec="").values_list("pk", "cod_sistema").iterator(chunk_size=2000)
+                if cod_sistema not in vistas
+            ]
+            for inicio in range(0, len(ausentes), tamanho_lote):
+                lote = ausentes[inicio:inicio + tamanho_lote]
+                Aluno_Arquivo.objects.filter(pk__in=[pk for pk, _ in lote]).update(
+                    status_arquivo_aluno='P', hash_sigeec=""
+                )
+            relatorio['diferencas'] += [("ausente", cod_sistema, None) for _, cod_sistema in ausentes]
+            relatorio['ausentes'] = len(ausentes)
+            resumo[chave_resumo(Aluno_Arquivo, 'A')] -= len(ausentes)
+            resumo[chave_resumo(Aluno_Arquivo, 'P')] += len(ausentes)
+
+        ajustar_resumo(resumo)
+
+        if simular:
+            transaction.set_rollback(True)
+
+    return relatorio
+
+
+# =========================
+# RESUMO DOS PAINÉIS
+# =========================
+#
+# Os painéis leem os contadores de ResumoPainel (uma consulta) e as faixas
+# livres do cache. Os contadores são ajustados pelos receivers de save/delete
+# registrados em models.RESUMO_PAINEL; os caminhos que não disparam sinais
+# (bulk_create, update()) chamam ajustar_resumo diretamente. Se algum ficar
+# fora de sincronia, o comando recalcular_painel os refaz a partir das tabelas.
+
+# Contratos que terminam até este número de dias à frente aparecem no painel
+DIAS_CONTRATOS_A_VENCER = 30
+
+
+def ajustar_resumo(ajustes):
+    """Soma as variações {(grupo, chave): delta} aos contadores do ResumoPainel."""
+    from django.db.models import F
+    from .models import ResumoPainel
+
+    adiados = _ajustes_resumo_adiados.get()
+    if adiados is not None:
+        for chave, delta in ajustes.items():
+            adiados[chave] = adiados.get(chave, 0) + delta
+        return
+
+    ajustes = [(grupo, chave, delta) for (grupo, chave), delta in ajustes.items() if chave is not None and delta]
+    if not ajustes:
+        return
+
+    if connection.vendor in ("sqlite", "postgresql"):
+        # um único upsert que soma ao valor gravado (ou cria o contador)
+        tabela = connection.ops.quote_name(ResumoPainel._meta.db_table)
+        valores = ", ".join(["(%s, %s, %s)"] * len(ajustes))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {tabela} (grupo, chave, valor) VALUES {valores} "
+                f"ON CONFLICT (grupo, chave) DO UPDATE SET valor = {tabela}.valor + excluded.valor",
+                [parametro for ajuste in ajustes for parametro in ajuste]
+            )
+        return
+
+    for grupo, chave, delta in ajustes:
+        contador = ResumoPainel.objects.filter(grupo=grupo, chave=chave)
+        if not contador.update(valor=F("valor") + delta):
+            ResumoPainel.objects.bulk_create([ResumoPainel(grupo=grupo, chave=chave)], ignore_conflicts=True)
+            contador.update(valor=F("valor") + delta)
+
+
+@contextmanager
+def resumo_em_lote():
+    """
+    Acumula as variações dos contadores (ex.: dos receivers de post_delete numa
+    exclusão em cascata) e as grava de uma vez, uma query por chave, ao sair do bloco.
+    """
+    adiados = {}
+    token = _ajustes_resumo_adiados.set(adiados)
+    try:
+        yield adiados
+    finally:
+        _ajustes_resumo_adiados.reset(token)
+
+    ajustar_resumo(adiados)
+
+
+def contar_para_resumo(modelo, objetos):
+    """Variações do resumo para a criação de `objetos` por um caminho sem sinais."""
+    from .models import RESUMO_PAINEL, chave_resumo
+
+    campo = RESUMO_PAINEL[modelo][1]
+    return Counter(chave_resumo(modelo, getattr(obj, campo)) for obj in objetos)
+
+
+def recalcular_resumo_painel():
+    """Refaz todos os contadores do ResumoPainel contando as tabelas. Retorna quantos gravou."""
+    from django.db.models import Count
+    from .models import ResumoPainel, RESUMO_PAINEL, chave_resumo
+
+    contadores = {}
+    for modelo, (_, campo, _) in RESUMO_PAINEL.items():
+        for valor, total in modelo.objects.order_by().values_list(campo).annotate(total=Count("pk")):
+            grupo, chave = chave_resumo(modelo, valor)
+            if chave is not None:
+                contadores[(grupo, chave)] = contadores.get((grupo, chave), 0) + total
+
+    with transaction.atomic():
+        ResumoPainel.objects.all().delete()
+        ResumoPainel.objects.bulk_create([
+            ResumoPainel(grupo=grupo, chave=chave, valor=valor)
+            for (grupo, chave), valor in contadores.items()
+        ])
+    return len(contadores)
+
+
+def resumo_painel(*grupos):
+    """{grupo: {chave: valor}} dos grupos pedidos, numa consulta."""
+    from .models import ResumoPainel
+
+    resumo = {grupo: {} for grupo in grupos}
+    for grupo, chave, valor in ResumoPainel.objects.filter(grupo__in=grupos).values_list("grupo", "chave", "valor"):
+        if valor:
+            resumo[grupo][chave] = valor
+    return resumo
+
+
+def resumo_localizacoes(tipo):
+    """Localizações usadas e livres (lacunas), deduzidas das faixas livres em cache."""
+    faixas = get_faixas_disponiveis_cache(tipo)
+    proximo = next((inicio for inicio, fim in faixas if fim is None), 1)
+    livres = sum(fim - inicio + 1 for inicio, fim in faixas if fim is not None)
+    return {'usadas': proximo - 1 - livres, 'livres': livres, 'proximo': proximo}
+
+
+
+# =========================
+# FONTES DAS CAPAS
+# =========================
+#
+# Ler uma fonte TrueType/OpenType (ainda mais uma coleção CJK .ttc) custa
+# centenas de milissegundos e vários MB. Da fonte das capas geramos uma vez um
+# subconjunto só com os glifos Latin-1, gravado em PASTA_FONTES_CAPA, e cada PDF
+# o registra com FPDF.add_font: o FPDF lê um arquivo de poucas dezenas de KB em
+# vez da fonte inteira. O arquivo vale enquanto a fonte original não mudar, então
+# os demais processos o reaproveitam. Com settings.AQUECER_FONTE_CAPA ele é
+# preparado na inicialização (ver apps.py) em vez de na primeira capa.
+#
+# Só a API pública do FPDF é usada para as fontes.
+
+FAMILIA_CAPA = "FonteCapa"
+
+PASTA_FONTES_CAPA = os.path.join(tempfile.gettempdir(), "localizador-fontes-capa")
+
+# Caracteres usados nas capas: Latin-1 (cobre o português) e a pontuação do cp1252
+CARACTERES_CAPA = frozenset(
+    [*range(0x20, 0x7F), *range(0xA0, 0x100), *map(ord, "–—‘’‚“”„•…€")]
+)
+
+_fontes_capa = {}
+_trava_fontes_capa = threading.Lock()
+
+
+def _subconjunto_latin1(caminho):
+    """Bytes de uma fonte só com os glifos de CARACTERES_CAPA."""
+    from fontTools import subset, ttLib
+
+    fonte = ttLib.TTFont(caminho, fontNumber=0, recalcTimestamp=False)
+    cmap = fonte.getBestCmap()
+    opcoes = subset.Options(notdef_outline=True, recommended_glyphs=True)
+    # As mesmas tabelas que o FPDF descarta ao embutir a fonte
+    opcoes.drop_tables += ["FFTM", "GDEF", "GPOS", "GSUB", "MATH", "hdmx"]
+    subsetter = subset.Subsetter(opcoes)
+    subsetter.populate(unicodes=[c for c in CARACTERES_CAPA if c in cmap])
+    subsetter.subset(fonte)
+
+    saida = io.BytesIO()
+    fonte.save(saida)
+    return saida.getvalue()
+
+
+def _arquivo_fonte_capa(caminho):
+    """Caminho do subconjunto Latin-1 da fonte em PASTA_FONTES_CAPA, gerado se ainda não existir."""
+    info = os.stat(caminho)
+    origem = repr((os.path.realpath(caminho), info.st_size, info.st_mtime_ns, sorted(CARACTERES_CAPA)))
+    nome = hashlib.sha256(origem.encode()).hexdigest()[:32]
+    for extensao in (".ttf", ".otf"):
+        destino = os.path.join(PASTA_FONTES_CAPA, nome + extensao)
+        if os.path.exists(destino):
+            return destino
+
+    dados = _subconjunto_latin1(caminho)
+    # O FPDF escolhe o tipo da fonte pela extensão; "OTTO" marca contornos CFF
+    destino = os.path.join(PASTA_FONTES_CAPA, nome + (".otf" if dados[:4] == b"OTTO" else ".ttf"))
+    os.makedirs(PASTA_FONTES_CAPA, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=PASTA_FONTES_CAPA, suffix=".tmp")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            arquivo.write(dados)
+        os.replace(temporario, destino)
+    except OSError:
+        os.unlink(temporario)
+        raise
+    return destino
+
+
+def _fontes_configuradas():
+    regular = getattr(settings, "FONTE_CAPA", None)
+    return regular, getattr(settings, "FONTE_CAPA_NEGRITO", None) or regular
+
+
+def _fontes_prontas(fontes):
+    # Sem fonte (None) ou com os subconjuntos ainda no disco
+    return fontes is None or all(map(os.path.exists, fontes.values()))
+
+
+def fontes_capa():
+    """
+    Subconjuntos da fonte das capas por estilo ('' e 'B'), preparados uma vez
+    por processo. Devolve None se settings.FONTE_CAPA não existir (as capas
+    usam Helvetica).
+    """
+    regular, negrito = _fontes_configuradas()
+    chave = (str(regular), str(negrito))
+
+    if chave in _fontes_capa and _fontes_prontas(_fontes_capa[chave]):
+        return _fontes_capa[chave]
+
+    with _trava_fontes_capa:
+        if chave not in _fontes_capa or not _fontes_prontas(_fontes_capa[chave]):
+            inicio = time.perf_counter()
+            try:
+                fontes = {
+                    '': _arquivo_fonte_capa(regular),
+                    'B': _arquivo_fonte_capa(negrito),
+                }
+            except (OSError, ValueError, TypeError) as erro:
+                logger.warning("Fonte das capas indisponível (%s); usando Helvetica.", erro)
+                fontes = None
+            else:
+                logger.info("Fonte das capas preparada em %.0f ms.", (time.perf_counter() - inicio) * 1000)
+            _fontes_capa[chave] = fontes
+    return _fontes_capa[chave]
+
+
+def instalar_fonte_capa(pdf):
+    """
+    Registra no PDF, com FPDF.add_font, o subconjunto da fonte das capas.
+    Devolve o nome da família, ou None se não houver fonte.
+    """
+    fontes = fontes_capa()
+    if fontes is None:
+        return None
+
+    for estilo, arquivo in fontes.items():
+        pdf.add_font(FAMILIA_CAPA, estilo, arquivo)
+    return FAMILIA_CAPA
+
+
+def _fluxo_comprimido(dados):
+    """Stream do PDF com conteúdo já comprimido."""
+    fluxo = PDFContentStream(contents=dados)
+    fluxo.filter = Name("FlateDecode")
+    return fluxo
+
+
+class ProdutorPDFCapa(OutputProducer):
+    """OutputProducer que inclui no PDF as partes fixas de pdf.modelos_capa (ver MODELOS DAS CAPAS)."""
+
+    def _add_resources_dict(self, fontes, imagens, estados):
+        # Partes fixas das capas (ver MODELOS DAS CAPAS): um Form XObject por modelo usado no PDF
+        recursos = super()._add_resources_dict(fontes, imagens, estados)
+        modelos = getattr(self.fpdf, "modelos_capa", {})
+        if modelos:
+            objetos = {f"/I{indice}": pdf_ref(imagem.id) for indice, imagem in sorted(imagens.items())}
+            for nome, (conteudo, largura, altura) in modelos.items():
+                modelo = _fluxo_comprimido(zlib.compress(conteudo))
+                modelo.type = Name("XObject")
+                modelo.subtype = Name("Form")
+                modelo.b_box = f"[0 0 {largura:.2f} {altura:.2f}]"
+                # Os modelos usam as mesmas fontes das páginas
+                modelo.resources = recursos
+                self._add_pdf_obj(modelo, "images")
+                objetos[f"/{nome}"] = pdf_ref(modelo.id)
+            recursos.x_object = pdf_dict(objetos)
+        return recursos
+
+
+# =========================
+# MODELOS DAS CAPAS
+# =========================
+#
+# Rótulos, "PASSIVO" e demais textos fixos são iguais em todas as capas de um
+# modelo (views.MODELOS_CAPA). Em cada PDF a parte fixa de um modelo é
+# desenhada uma vez, na primeira capa, e vira um Form XObject que as páginas só
+# referenciam; por registro desenham-se apenas os campos variáveis. Num PDF em
+# lote a parte fixa aparece uma vez no arquivo, não uma vez por página.
+#
+# O fpdf2 não tem API pública para Form XObjects. capturar_parte_fixa,
+# usar_parte_fixa e ProdutorPDFCapa._add_resources_dict são os únicos pontos
+# que mexem nas partes internas dele para isso, e FonteCapaTests confere o PDF
+# gerado: uma versão do fpdf2 que os quebre faz os testes falharem, em vez de
+# desligar o recurso em silêncio. Com settings.CAPA_PARTE_FIXA_COMPARTILHADA =
+# False a parte fixa é desenhada em cada página, só com a API pública.
+
+def capturar_parte_fixa(pdf, desenhar):
+    """Chama desenhar() na página atual e tira dela os operadores gerados, que são devolvidos."""
+    pagina = pdf.pages[pdf.page]
+    inicio = len(pagina.contents)
+    desenhar()
+    conteudo = bytes(pagina.contents[inicio:])
+    del pagina.contents[inicio:]
+    return conteudo
+
+
+def usar_parte_fixa(pdf, nome):
+    """Desenha na página atual o Form XObject `nome` (ver ProdutorPDFCapa)."""
+    pdf._out(f"q /{nome} Do Q")
+
+
+# =========================
+# CAPAS EM LOTE
+# =========================
+#
+# Seleção dos registros cujas capas saem num único PDF (ver
+# views.gerar_capas_pdf), com as pendências ou o contrato mais recente de
+# cada registro trazidos em uma consulta por bloco, não um por capa.
+
+# Acima disso o PDF deve ser gerado pelo comando imprimir_capas. O PDF é
+# montado inteiro na memória antes de sair (uns 3,5 KB por capa), então este
+# limite é também o teto de memória de uma requisição (~18 MB).
+LIMITE_CAPAS_WEB = 5000
+
+
+def capas_queryset(tipo, localizacao_de=None, localizacao_ate=None, status=None,
+                   cadastro_de=None, cadastro_ate=None, ids=None):
+    """Alunos (A) ou servidores (P) filtrados, em ordem de localização, prontos para as capas."""
+    from django.db.models import Prefetch
+    from .models import Aluno_Arquivo, Profissional_Arquivo, Pendencia, Contrato
+
+    if tipo == 'A':
+        queryset = Aluno_Arquivo.objects.prefetch_related(
+            Prefetch("pendencias", queryset=Pendencia.objects.order_by("pk"))
+        )
+        status_campo = "status_arquivo_aluno"
+    else:
+        # Só o contrato mais recente de cada servidor (prefetch fatiado, ROW_NUMBER no banco)
+        queryset = Profissional_Arquivo.objects.prefetch_related(
+            Prefetch(
+                "contratos",
+                queryset=Contrato.objects.order_by("-dt_inicial", "-pk")[:1],
+                to_attr="contrato_recente",
+            )
         )
+        status_campo = "status_arquivo_profissional"
+
+    filtros = Q()
+    if localizacao_de is not None:
+        filtros &= Q(localizacao_arquivo__gte=localizacao_de)
+    if localizacao_ate is not None:
+        filtros &= Q(localizacao_arquivo__lte=localizacao_ate)
+    if status:
+        filtros &= Q(**{status_campo: status})
+    if cadastro_de is not None:
+        filtros &= Q(data_cadastro__date__gte=cadastro_de)
+    if cadastro_ate is not None:
+        filtros &= Q(data_cadastro__date__lte=cadastro_ate)
+    if ids:
+        filtros &= Q(pk__in=ids)
+
+    return queryset.filter(filtros).order_by("localizacao_arquivo", "pk")
+
+
+# =========================
+# CACHE DAS CAPAS
+# =========================
+#
+# A capa de um registro é guardada no cache pelo hash dos campos que ela
+# imprime. Qualquer alteração no aluno, nas pendências, no servidor ou no
+# contrato mais recente muda o hash (inclusive pelos caminhos sem sinais, como
+# update() e o upsert do SIGEEC), então não há o que invalidar: a capa antiga
+# só deixa de ser usada e expira. O hash também é o ETag da resposta.
+
+CACHE_CAPAS_TIMEOUT = 60 * 60 * 24 * 7
+
+# Aumente ao mudar o desenho das capas (views.PDFCapaBase)
+VERSAO_CAPAS = 3
+
+
+def hash_capa(tipo, campos):
+    """Hash dos campos impressos numa capa, da versão do desenho e da fonte usada."""
+    fonte = [getattr(settings, "FONTE_CAPA", None), getattr(settings, "FONTE_CAPA_NEGRITO", None)]
+    if fontes_capa() is None:
+        fonte = "Helvetica"
+    conteudo = json.dumps([VERSAO_CAPAS, fonte, tipo, campos], default=str, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def capa_em_cache(chave, gerar):
+    """Bytes da capa com esse hash, do cache ou de gerar() (e então guardados)."""
+    conteudo = cache.get(f"capa:{chave}")
+    if conteudo is None:
+        conteudo = gerar()
+        cache.set(f"capa:{chave}", conteudo, CACHE_CAPAS_TIMEOUT)
+    return conteudo
+
+
+# =========================
+# ENVIO DE DOCUMENTOS EM PARTES
+# =========================
+#
+# Digitalizações de centenas de MB são enviadas em partes (PUT com
+# Content-Range). Cada parte é lida do corpo da requisição em blocos e gravada
+# direto no arquivo temporário do envio, então a memória não depende do tamanho
+# do documento. Uma parte só é aceita a partir de EnvioDocumento.recebido: se a
+# conexão cai, o envio continua de onde parou. Completo, o arquivo tem o SHA-256
+# (obrigatório, informado no início) conferido e é movido (sem cópia) para o
+# storage como um DocumentoVinculado.
+
+BLOCO_ENVIO = 64 * 1024
+
+
+def caminho_envio(envio):
+    return os.path.join(settings.PASTA_ENVIOS, f"{envio.pk}.parte")
+
 
-        if disponivel:
-            numero = disponivel.numero
-            disponivel.delete()
-            return numero
+def iniciar_envio(usuario, entidade, nome_arquivo, tamanho, sha256, descricao=None):
+    """
+    Cria o EnvioDocumento de um arquivo de tamanho bytes para o aluno/servidor
+    entidade. sha256 é o do arquivo inteiro, conferido em concluir_envio.
+    """
+    from .models import EnvioDocumento
 
-        if tipo == 'A':
-            max_loc = Aluno_Arquivo.objects.aggregate(
-                max_loc=Max("localizacao_arquivo")
-            )["max_loc"]
+    envio = EnvioDocumento.objects.create(
+        usuario=usuario, content_object=entidade, nome_arquivo=nome_arquivo,
+        tamanho=tamanho, sha256=sha256.lower(), descricao=descricao,
+    )
+    os.makedirs(settings.PASTA_ENVIOS, exist_ok=True)
+    open(caminho_envio(envio), "wb").close()
+    return envio
+
+
+def gravar_parte_envio(envio, fluxo, inicio, tamanho_parte, sha256_parte=None):
+    """
+    Grava tamanho_parte bytes lidos de fluxo na posição inicio do arquivo do
+    envio e devolve o total recebido. inicio deve ser envio.recebido; a parte é
+    conferida com sha256_parte, se informado.
+    """
+    from .models import EnvioDocumento
+
+    if inicio != envio.recebido:
+        raise ValidationError(f"O envio está em {envio.recebido} bytes.", code="fora_de_ordem")
+    if not 0 < tamanho_parte <= settings.ENVIO_TAMANHO_PARTE or inicio + tamanho_parte > envio.tamanho:
+        raise ValidationError("Tamanho da parte inválido.", code="parte_invalida")
+
+    # A parte chega primeiro num arquivo só dela: a leitura da rede, que pode
+    # ser lenta, não segura o lock, e uma tentativa atrasada desta parte não
+    # mexe no arquivo do envio
+    resumo = hashlib.sha256()
+    gravados = 0
+    with tempfile.TemporaryFile(dir=settings.PASTA_ENVIOS) as parte:
+        while gravados < tamanho_parte:
+            bloco = fluxo.read(min(BLOCO_ENVIO, tamanho_parte - gravados))
+            if not bloco:
+                break
+            parte.write(bloco)
+            resumo.update(bloco)
+            gravados += len(bloco)
+
+        if gravados != tamanho_parte:
+            raise ValidationError("A parte chegou incompleta.", code="parte_incompleta")
+        if sha256_parte and resumo.hexdigest() != sha256_parte.lower():
+            raise ValidationError("O SHA-256 da parte não confere.", code="checksum")
+
+        # Com o registro travado (no SQLite, pela transação IMMEDIATE), só uma
+        # requisição por vez confere recebido e escreve no arquivo do envio
+        with transaction.atomic():
+            envio.recebido = EnvioDocumento.objects.select_for_update().values_list(
+                "recebido", flat=True
+            ).get(pk=envio.pk)
+            if envio.recebido != inicio:
+                # outra requisição (reenvio, outra aba) gravou esta parte antes
+                raise ValidationError(f"O envio está em {envio.recebido} bytes.", code="fora_de_ordem")
+
+            parte.seek(0)
+            with open(caminho_envio(envio), "r+b") as arquivo:
+                arquivo.seek(inicio)
+                shutil.copyfileobj(parte, arquivo, BLOCO_ENVIO)
+                # Descarta o que sobrou de uma gravação interrompida
+                arquivo.truncate()
+            EnvioDocumento.objects.filter(pk=envio.pk).update(
+                recebido=inicio + gravados, atualizado_em=timezone.now()
+            )
+
+    envio.recebido = inicio + gravados
+    return envio.recebido
+
+
+class _ArquivoEnviado(File):
+    """Arquivo completo de um envio: o FileSystemStorage o move em vez de copiar."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def concluir_envio(envio):
+    """Confere o arquivo completo do envio e o grava como DocumentoVinculado (devolvido)."""
+    from .models import DocumentoVinculado
+
+    caminho = caminho_envio(envio)
+    if not envio.sha256 or sha256_arquivo(caminho) != envio.sha256:
+        descartar_envio(envio)
+        raise ValidationError("O SHA-256 do arquivo não confere; envie-o de novo.", code="checksum")
+
+    documento = DocumentoVinculado(
+        content_type_id=envio.content_type_id, object_id=envio.object_id, descricao=envio.descricao,
+    )
+    with open(caminho, "rb") as conteudo:
+        arquivo = _ArquivoEnviado(conteudo)
+        # Já conferido acima: o armazenamento não precisa ler o arquivo de novo
+        arquivo.sha256 = envio.sha256
+        documento.arquivo.save(envio.nome_arquivo, arquivo, save=False)
+    documento.sha256 = arquivo.sha256
+    with transaction.atomic():
+        documento.save()
+        envio.delete()
+    return documento
+
+
+def descartar_envio(envio):
+    try:
+        os.remove(caminho_envio(envio))
+    except FileNotFoundError:
+        pass
+    envio.delete()
+
+
+def limpar_envios(horas):
+    """Remove envios parados há mais de horas horas e arquivos de envio sem registro. Devolve quantos."""
+    from .models import EnvioDocumento
+
+    limite = timezone.now() - timedelta(hours=horas)
+    parados = list(EnvioDocumento.objects.filter(atualizado_em__lt=limite))
+    for envio in parados:
+        descartar_envio(envio)
+
+    orfaos = 0
+    if os.path.isdir(settings.PASTA_ENVIOS):
+        ativos = {f"{pk}.parte" for pk in EnvioDocumento.objects.values_list("pk", flat=True)}
+        for nome in os.listdir(settings.PASTA_ENVIOS):
+            caminho = os.path.join(settings.PASTA_ENVIOS, nome)
+            if nome.endswith(".parte") and nome not in ativos and os.path.getmtime(caminho) < limite.timestamp():
+                os.remove(caminho)
+                orfaos += 1
+    return len(parados) + orfaos
+
+
+# =========================
+# ARMAZENAMENTO DEDUPLICADO
+# =========================
+#
+# Os mesmos formulários em branco e certidões são anexados a muitos alunos e
+# servidores. ArmazenamentoDeduplicado (o storage "documentos" de
+# settings.STORAGES) grava cada conteúdo uma vez, em _blobs/ab/<sha256> dentro
+# de MEDIA_ROOT, e o arquivo de cada documento (<modelo>/<id>/<nome>) é um
+# hardlink para esse blob: nomes, URLs e leitura continuam os de um
+# FileSystemStorage comum. O número de links do blob é a contagem de
+# referências; ao apagar o último documento com aquele conteúdo o blob também
+# é apagado. O SHA-256 é calculado enquanto o arquivo é gravado (ou lido do
+# arquivo temporário do upload, que é ligado ao blob em vez de copiado).
+# Backups que preservam hardlinks (rsync -H, tar, restic) copiam cada conteúdo
+# uma vez. Os arquivos anteriores são convertidos por deduplicar_documentos.
+
+PASTA_BLOBS = "_blobs"
+
+
+def sha256_arquivo(caminho):
+    resumo = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(partial(arquivo.read, 1024 * 1024), b""):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+class RecebimentoComSha256(TemporaryFileUploadHandler):
+    """
+    Upload em arquivo temporário (settings.FILE_UPLOAD_HANDLERS) com o SHA-256
+    calculado à medida que as partes chegam: o armazenamento só liga o
+    temporário ao blob, sem ler o arquivo de novo.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.resumo = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.resumo.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        arquivo = super().file_complete(file_size)
+        arquivo.sha256 = self.resumo.hexdigest()
+        return arquivo
+
+
+class ArmazenamentoDeduplicado(FileSystemStorage):
+    """FileSystemStorage que grava cada conteúdo uma única vez (ver ARMAZENAMENTO DEDUPLICADO)."""
+
+    def caminho_blob(self, sha256):
+        return self.path(os.path.join(PASTA_BLOBS, sha256[:2], sha256))
+
+    def _save(self, name, content):
+        pasta_blobs = self.path(PASTA_BLOBS)
+        os.makedirs(pasta_blobs, exist_ok=True)
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+
+        # Calculado no recebimento (RecebimentoComSha256) ou já conferido (concluir_envio)
+        sha256 = getattr(content, "sha256", None)
+        if hasattr(content, "temporary_file_path"):
+            temporario = content.temporary_file_path()
+            sha256 = sha256 or sha256_arquivo(temporario)
+            if os.stat(temporario).st_dev != os.stat(pasta_blobs).st_dev:
+                # Hardlink só no mesmo sistema de arquivos: traz o temporário para cá
+                descritor, destino = tempfile.mkstemp(dir=pasta_blobs, suffix=".tmp")
+                os.close(descritor)
+                file_move_safe(temporario, destino, allow_overwrite=True)
+                temporario = destino
         else:
-            max_loc = Profissional_Arquivo.objects.aggregate(
-                max_loc=Max("localizacao_arquivo")
-            )["max_loc"]
+            descritor, temporario = tempfile.mkstemp(dir=pasta_blobs, suffix=".tmp")
+            resumo = hashlib.sha256()
+            with os.fdopen(descritor, "wb") as destino:
+                for bloco in content.chunks():
+                    if isinstance(bloco, str):
+                        bloco = bloco.encode()
+                    destino.write(bloco)
+                    resumo.update(bloco)
+            sha256 = sha256 or resumo.hexdigest()
 
-        current_max = max_loc or 0
-        return current_max + 1
+        try:
+            name = self._ligar_ao_blob(temporario, sha256, name)
+        finally:
+            try:
+                os.remove(temporario)
+            except FileNotFoundError:
+                pass
 
+        if self.file_permissions_mode is not None:
+            os.chmod(self.path(name), self.file_permissions_mode)
+        # Para o DocumentoVinculado guardar (ver DocumentoVinculado.save)
+        content.sha256 = sha256
+        return name
 
-def release_numero_passivo(numero, tipo):
-    from .models import NumeroPassivoDisponivel
+    def _ligar_ao_blob(self, temporario, sha256, name):
+        blob = self.caminho_blob(sha256)
+        criado = False
+        while True:
+            try:
+                # O primeiro arquivo com este conteúdo vira o blob
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                try:
+                    os.link(temporario, blob)
+                    criado = True
+                except FileExistsError:
+                    pass
+                os.link(blob, self.path(name))
+                return name
+            except FileExistsError:
+                # Nome do documento ocupado (como no FileSystemStorage)
+                name = self.get_available_name(name)
+            except FileNotFoundError:
+                # O blob foi apagado entre os dois links: cria de novo
+                continue
+            except OSError as erro:
+                # Sistema de arquivos sem hardlinks: grava uma cópia comum
+                logger.warning("Documento gravado sem deduplicação (%s).", erro)
+                if criado and os.stat(blob).st_nlink == 2:
+                    # O blob criado acima só tem o temporário: não pode sobrar sem documento
+                    os.remove(blob)
+                file_move_safe(temporario, self.path(name))
+                return name
+
+    def delete(self, name, sha256=None):
+        """
+        Apaga o arquivo do documento e, se era a última referência, o blob.
+        Com o sha256 gravado no DocumentoVinculado o blob é achado sem ler o
+        arquivo; sem ele (documento ainda não deduplicado), o arquivo é lido.
+        """
+        caminho = self.path(name)
+        try:
+            ligacoes = os.stat(caminho).st_nlink
+        except FileNotFoundError:
+            return
+
+        # Com um link só, o arquivo não está em nenhum blob
+        blob = None
+        if ligacoes > 1:
+            blob = self.caminho_blob(sha256 or sha256_arquivo(caminho))
+            if not (os.path.exists(blob) and os.path.samefile(blob, caminho)):
+                blob = None
+
+        super().delete(name)
+        # Os links do blob são contados só depois de apagar o documento: de duas
+        # exclusões simultâneas das últimas referências, a que apagar por último
+        # encontra o blob sozinho. O que ainda escapar fica para remover_blobs_orfaos.
+        if blob:
+            try:
+                if os.stat(blob).st_nlink == 1:
+                    os.remove(blob)
+            except FileNotFoundError:
+                pass
+
+    def remover_blobs_orfaos(self, simular=False):
+        """
+        Apaga os blobs que nenhum documento usa mais (um só link), deixados por
+        uma falha entre apagar o documento e o blob. Devolve (blobs, bytes liberados).
+        """
+        pasta = self.path(PASTA_BLOBS)
+        if not os.path.isdir(pasta):
+            return 0, 0
+
+        removidos = liberados = 0
+        for prefixo in os.scandir(pasta):
+            # Na raiz ficam só os temporários das gravações em andamento
+            if not prefixo.is_dir():
+                continue
+            for blob in os.scandir(prefixo.path):
+                estado = blob.stat()
+                if estado.st_nlink != 1:
+                    continue
+                if not simular:
+                    try:
+                        os.remove(blob.path)
+                    except FileNotFoundError:
+                        continue
+                removidos += 1
+                liberados += estado.st_size
+        return removidos, liberados
+
+    def deduplicar(self, name, simular=False, vistos=None):
+        """
+        Liga ao seu blob um arquivo gravado antes da deduplicação e devolve
+        (sha256, bytes liberados). Com simular=True nada é alterado; os blobs que seriam
+        criados ficam em vistos (sha256 -> arquivo), compartilhado entre chamadas.
+        """
+        caminho = self.path(name)
+        estado = os.stat(caminho)
+        sha256 = sha256_arquivo(caminho)
+        blob = self.caminho_blob(sha256)
+        if os.path.exists(blob):
+            if os.path.samefile(blob, caminho):
+                return sha256, 0
+        elif simular:
+            if os.path.samefile(vistos.setdefault(sha256, caminho), caminho):
+                return sha256, 0
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.link(caminho, blob)
+            return sha256, 0
+
+        if not simular:
+            temporario = f"{caminho}.dedup"
+            os.link(blob, temporario)
+            os.replace(temporario, caminho)
+        return sha256, estado.st_size if estado.st_nlink == 1 else 0
+
+
+def deduplicar_documentos(simular=False):
+    """
+    Passa os arquivos dos DocumentoVinculado para o armazenamento deduplicado,
+    grava o sha256 dos que não o têm e apaga os blobs sem documento. Devolve
+    (arquivos verificados, blobs órfãos, bytes liberados).
+    """
+    from .models import DocumentoVinculado
+
+    armazenamento = DocumentoVinculado._meta.get_field("arquivo").storage
+    documentos = DocumentoVinculado.objects.exclude(arquivo="").values_list("pk", "arquivo", "sha256")
+    verificados = liberados = 0
+    vistos = {}
+    for pk, nome, sha256_gravado in documentos.iterator(chunk_size=500):
+        if not armazenamento.exists(nome):
+            continue
+        sha256, liberado = armazenamento.deduplicar(nome, simular, vistos)
+        if not simular and sha256 != sha256_gravado:
+            DocumentoVinculado.objects.filter(pk=pk).update(sha256=sha256)
+        liberados += liberado
+        verificados += 1
 
-    if numero:
-        NumeroPassivoDisponivel.objects.get_or_create(
-            numero=numero,
-            tipo=tipo
-        )
\ No newline at end of file
+    # Depois da conversão, para não contar os blobs que ela acabou de criar
+    orfaos, liberado = armazenamento.remover_blobs_orfaos(simular)
+    return verificados, orfaos, liberados + liberado
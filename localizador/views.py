@@ -1,21 +1,90 @@
+import mimetypes
 import os
+import re
+from datetime import timedelta
+from urllib.parse import quote
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.views.decorators.http import require_POST
 from django.urls import reverse
 from .models import (Aluno_Arquivo, Contato, Pendencia, 
                    Profissional_Arquivo, Contrato, Usuario, 
-                   DocumentoVinculado) # Adicionado DocumentoVinculado
+                   DocumentoVinculado, EnvioDocumento) # Adicionado DocumentoVinculado
 from .forms import (AlunoArquivoForm, ContatoForm, PendenciaForm, 
                   ProfissionalArquivoForm, ContratoForm, UsuarioForm, 
-                  DocumentoVinculadoForm) # Adicionado DocumentoVinculadoForm
-from django.http import HttpResponse
+                  DocumentoVinculadoForm, AlunoLoteForm, DocumentoFiltroForm, ImportacaoSigeecForm, CapasLoteForm, EnvioDocumentoForm) # Adicionado DocumentoVinculadoForm
+from django.http import (HttpResponse, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse,
+                         FileResponse, Http404)
+from django.core.paginator import Paginator
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+from django.db.models import Prefetch, Q
 from fpdf import FPDF
 from django.contrib.contenttypes.models import ContentType # Para GenericForeignKey
-from .utils import get_numeros_disponiveis, get_next_numero_passivo, release_numero_passivo
+from .utils import (get_numeros_disponiveis, get_next_numero_passivo, release_numero_passivo,
+                    criar_em_lote_com_localizacao, buscar_numeros_disponiveis, expurgar_arquivos,
+                    paginar_por_chave, cursor_valido, filtrar_arquivos_por_termo, buscar_arquivos,
+                    filtro_prefixo, normalizar_texto, normalizar_cpf,
+                    linhas_inventario, gerar_csv, gerar_xlsx, abrir_csv_sigeec, importar_sigeec,
+                    resumo_painel, resumo_localizacoes, DIAS_CONTRATOS_A_VENCER,
+                    instalar_fonte_capa, ProdutorPDFCapa, capturar_parte_fixa, usar_parte_fixa,
+                    capas_queryset, LIMITE_CAPAS_WEB, hash_capa, capa_em_cache,
+                    iniciar_envio, gravar_parte_envio, concluir_envio, descartar_envio)
+
+
+# Modelos das capas: textos fixos ('texto') e campos de cada registro ('campo').
+# Posições em mm; 'linhas' usa multi_cell (o campo pode ser uma lista de itens).
+# A parte fixa é desenhada uma vez por PDF (ver utils.capturar_parte_fixa).
+_TOPO_CAPA = [
+    {'campo': 'localizacao', 'x': 20, 'y': 30, 'w': 40, 'h': 25, 'estilo': 'B', 'tamanho': 60},
+    {'texto': 'PASSIVO', 'x': 50, 'y': 55, 'estilo': 'B', 'tamanho': 16, 'rotacao': 90},
+]
+_NOME_CAPA = {'x': 0, 'y': 200, 'w': 210, 'h': 8, 'estilo': 'B', 'tamanho': 20, 'linhas': True, 'alinhamento': 'C'}
+
+MODELOS_CAPA = {
+    'aluno': _TOPO_CAPA + [
+        {'texto': 'SIGEEC - CÓDIGO PESSOA', 'x': 20, 'y': 75, 'w': 80, 'h': 8, 'tamanho': 10},
+        {'campo': 'cod_sistema', 'x': 20, 'y': 83, 'w': 80, 'h': 8, 'estilo': 'B', 'tamanho': 14},
+        {'texto': 'CPF', 'x': 20, 'y': 94, 'w': 80, 'h': 8, 'tamanho': 10},
+        {'campo': 'cpf', 'x': 20, 'y': 102, 'w': 80, 'h': 8, 'estilo': 'B', 'tamanho': 14},
+        {'texto': 'PENDÊNCIAS:', 'x': 20, 'y': 113, 'w': 80, 'h': 8, 'tamanho': 10},
+        {'campo': 'pendencias', 'x': 20, 'y': 121, 'w': 80, 'h': 5, 'tamanho': 10, 'linhas': True},
+        dict(_NOME_CAPA, campo='nome'),
+    ],
+    'profissional': _TOPO_CAPA + [
+        {'texto': 'CPF', 'x': 20, 'y': 75, 'w': 80, 'h': 8, 'tamanho': 10},
+        {'campo': 'cpf', 'x': 20, 'y': 83, 'w': 80, 'h': 8, 'estilo': 'B', 'tamanho': 14},
+        {'texto': 'PROFISSÃO/CARGO', 'x': 20, 'y': 94, 'w': 80, 'h': 8, 'tamanho': 10},
+        {'campo': 'funcao', 'x': 20, 'y': 102, 'w': 80, 'h': 8, 'estilo': 'B', 'tamanho': 14},
+        {'campo': 'admissao', 'x': 20, 'y': 113, 'w': 80, 'h': 5, 'tamanho': 8, 'linhas': True},
+        {'texto': 'OBSERVAÇÕES:', 'x': 20, 'y': 121, 'w': 80, 'h': 8, 'tamanho': 10},
+        {'campo': 'observacoes', 'x': 20, 'y': 129, 'w': 80, 'h': 5, 'tamanho': 10, 'linhas': True},
+        dict(_NOME_CAPA, campo='nome'),
+    ],
+    # Servidor sem contrato: sem profissão e admissão, observações sobem
+    'profissional_sem_contrato': _TOPO_CAPA + [
+        {'texto': 'CPF', 'x': 20, 'y': 75, 'w': 80, 'h': 8, 'tamanho': 10},
+        {'campo': 'cpf', 'x': 20, 'y': 83, 'w': 80, 'h': 8, 'estilo': 'B', 'tamanho': 14},
+        {'texto': 'OBSERVAÇÕES:', 'x': 20, 'y': 94, 'w': 80, 'h': 8, 'tamanho': 10},
+        {'campo': 'observacoes', 'x': 20, 'y': 102, 'w': 80, 'h': 5, 'tamanho': 10, 'linhas': True},
+        dict(_NOME_CAPA, campo='nome'),
+    ],
+}
+
+TIPOS_CONTRATO_CAPA = {"E": "EFETIVA", "T": "TEMPORÁRIO"} # Adicionar mais mapeamentos se necessário
 
 
 class PDFCapaBase(FPDF):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.main_font = self.setup_font()
+        self.set_auto_page_break(auto=True, margin=15)
+        self.modelos_capa = {} # Partes fixas usadas neste PDF (ver utils.ProdutorPDFCapa)
+
     def header(self):
         pass # Sem cabeçalho
 
@@ -27,190 +96,215 @@ class PDFCapaBase(FPDF):
         self.text(x, y, txt)
         self.rotate(0)
 
+    def output(self, *args, **kwargs):
+        kwargs.setdefault('output_producer_class', ProdutorPDFCapa)
+        return super().output(*args, **kwargs)
+
     def setup_font(self):
-        try:
-            font_path = os.path.join(os.path.dirname(__file__), '..', 'fonts', 'NotoSansCJK-Regular.ttc')
-            font_path = os.path.abspath(font_path)
+        # A fonte inteira é lida só ao preparar o subconjunto (ver utils.fontes_capa)
+        main_font = instalar_fonte_capa(self) or "Helvetica"
+        self.set_font(main_font, size=12)
+        return main_font
+
+    # Campos impressos em cada capa: também formam o hash do cache das capas (utils.hash_capa)
+    @staticmethod
+    def campos_capa_aluno(aluno, pendencias):
+        return {
+            'localizacao': str(aluno.localizacao_arquivo) if aluno.localizacao_arquivo is not None else "N/A",
+            'cod_sistema': str(aluno.cod_sistema) if aluno.cod_sistema else "N/A",
+            'cpf': str(aluno.cpf) if aluno.cpf else "N/A",
+            'pendencias': [f"- {p.tipo_pendencia}: {p.descricao}" for p in pendencias] or ["Nenhuma pendência."],
+            'nome': aluno.nome_aluno,
+        }
+
+    @staticmethod
+    def campos_capa_profissional(profissional, contrato_recente):
+        campos = {
+            'localizacao': str(profissional.localizacao_arquivo) if profissional.localizacao_arquivo is not None else "N/A",
+            'cpf': str(profissional.cpf) if profissional.cpf else "N/A",
+            'observacoes': profissional.observacoes if profissional.observacoes else "Nenhuma observação.",
+            'nome': profissional.nome_profissional,
+        }
+        if contrato_recente is not None:
+            # Admissão (ADMISSÃO 01/02/2000; EFETIVA.), de dt_inicial e tipo_contrato
+            admissao = f"ADMISSÃO {contrato_recente.dt_inicial.strftime('%d/%m/%Y') if contrato_recente.dt_inicial else 'N/A'}"
+            if contrato_recente.tipo_contrato:
+                tipo = contrato_recente.tipo_contrato.upper()
+                admissao += f"; {TIPOS_CONTRATO_CAPA.get(tipo, tipo)}"
+            campos['funcao'] = contrato_recente.funcao
+            campos['admissao'] = admissao
+        return campos
+
+    def capa_aluno(self, aluno, pendencias):
+        self.capa('aluno', self.campos_capa_aluno(aluno, pendencias))
+
+    def capa_profissional(self, profissional, contrato_recente):
+        modelo = 'profissional' if contrato_recente is not None else 'profissional_sem_contrato'
+        self.capa(modelo, self.campos_capa_profissional(profissional, contrato_recente))
+
+    def capa(self, modelo, campos):
+        """Uma página: a parte fixa do modelo (desenhada uma vez por PDF) e os campos do registro."""
+        self.add_page()
+        if getattr(settings, 'CAPA_PARTE_FIXA_COMPARTILHADA', True):
+            nome = f"Capa_{modelo}"
+            if nome not in self.modelos_capa:
+                self.modelos_capa[nome] = self._compilar_modelo(modelo)
+            usar_parte_fixa(self, nome)
+        else:
+            self._desenhar_parte_fixa(modelo)
+
+        for elemento in MODELOS_CAPA[modelo]:
+            if 'campo' in elemento:
+                self._desenhar(elemento, campos[elemento['campo']])
+
+    def _desenhar_parte_fixa(self, modelo):
+        for elemento in MODELOS_CAPA[modelo]:
+            if 'texto' in elemento:
+                self._desenhar(elemento, elemento['texto'])
+
+    def _desenhar(self, elemento, valor):
+        self.set_font(self.main_font, elemento.get('estilo', ''), elemento['tamanho'])
+        if 'rotacao' in elemento:
+            self.rotated_text(elemento['x'], elemento['y'], valor, elemento['rotacao'])
+        elif elemento.get('linhas'):
+            self.set_y(elemento['y'])
+            for item in valor if isinstance(valor, list) else [valor]:
+                self.set_x(elemento['x'])
+                self.multi_cell(elemento['w'], elemento['h'], item, 0, elemento.get('alinhamento', 'L'))
+        else:
+            self.set_xy(elemento['x'], elemento['y'])
+            self.cell(elemento['w'], elemento['h'], valor, 0, 0, elemento.get('alinhamento', 'L'))
+
+    def _compilar_modelo(self, modelo):
+        """(operadores, largura, altura) da parte fixa, tirada da página atual para virar o Form XObject."""
+        fonte_da_pagina = (self.font_family, self.font_style, self.font_size_pt)
+
+        def desenhar():
+            # Tamanho que nenhum elemento usa: obriga o primeiro elemento a
+            # selecionar a fonte dentro do modelo, que não herda a da página
+            self.set_font(self.main_font, size=1)
+            self._desenhar_parte_fixa(modelo)
+
+        conteudo = capturar_parte_fixa(self, desenhar)
+        # Depois do "q ... Q" a página continua com a fonte de antes
+        self.set_font(*fonte_da_pagina)
+        return conteudo, self.w_pt, self.h_pt
+
+
+def gerar_capas_pdf(tipo, queryset, tamanho_lote=500):
+    """
+    Uma capa por registro de capas_queryset num único PDF, devolvido em bytes.
+    Os registros são lidos do banco em blocos de tamanho_lote, mas o fpdf2 só
+    escreve o documento inteiro no fim: a memória cresce com o número de capas
+    (uns 3,5 KB por capa, ~18 MB nas LIMITE_CAPAS_WEB do navegador).
+    """
+    pdf = PDFCapaBase(orientation='P', unit='mm', format='A4')
+    for registro in queryset.iterator(chunk_size=tamanho_lote):
+        if tipo == 'A':
+            pdf.capa_aluno(registro, registro.pendencias.all())
+        else:
+            pdf.capa_profissional(registro, registro.contrato_recente[0] if registro.contrato_recente else None)
+
+    return bytes(pdf.output())
+
 
-            self.add_font("NotoSansCJK", fname=font_path, uni=True)
-            self.set_font("NotoSansCJK", size=12)
-        except (RuntimeError, FileNotFoundError):
-            print("Fonte NotoSansCJK não encontrada, usando Helvetica.")
-            self.set_font("Helvetica", size=12)
+def _resposta_capa(request, chave, gerar, nome_arquivo):
+    """Capa com ETag: 304 se o navegador já tem essa versão, senão os bytes do cache (ou gerados)."""
+    etag = f'"{chave}"'
+    nao_modificada = get_conditional_response(request, etag=etag)
+    if nao_modificada is not None:
+        return nao_modificada
+
+    response = HttpResponse(capa_em_cache(chave, gerar), content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{nome_arquivo}"'
+    response['ETag'] = etag
+    # O navegador pode guardar a capa, mas revalida (login e alterações) a cada abertura
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 @login_required
 def generate_student_cover_pdf(request, aluno_id):
     aluno = get_object_or_404(Aluno_Arquivo, id_aluno_arquivo=aluno_id)
-    pendencias = Pendencia.objects.filter(aluno_arquivo=aluno)
-    
-    pdf = PDFCapaBase(orientation='P', unit='mm', format='A4')
-    main_font = pdf.setup_font()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-
-    left_margin = 20
-    top_margin = 30
-    line_height = 8
-    label_section_width = 80
-
-    # 1. Localização do Arquivo
-    pdf.set_font(main_font, "B", 60)
-    loc_arquivo_str = str(aluno.localizacao_arquivo) if aluno.localizacao_arquivo is not None else "N/A"
-    pdf.set_xy(left_margin, top_margin)
-    pdf.cell(40, 25, loc_arquivo_str, 0, 0, 'L')
-
-    # 2. "PASSIVO" (Vertical)
-    pdf.set_font(main_font, "B", 16)
-    passivo_x = left_margin + 30 
-    passivo_y = top_margin + 25 
-    pdf.rotated_text(passivo_x, passivo_y, "PASSIVO", 90)
-    
-    current_y = top_margin + 45
-
-    # 3. SIGEEC - CÓDIGO PESSOA
-    pdf.set_font(main_font, "", 10)
-    pdf.set_xy(left_margin, current_y)
-    pdf.cell(label_section_width, line_height, "SIGEEC - CÓDIGO PESSOA", 0, 1, 'L')
-    pdf.set_font(main_font, "B", 14)
-    pdf.set_xy(left_margin, pdf.get_y())
-    pdf.cell(label_section_width, line_height, str(aluno.cod_sistema) if aluno.cod_sistema else "N/A", 0, 1, 'L')
-    current_y = pdf.get_y() + 3
-
-    # 4. CPF
-    pdf.set_font(main_font, "", 10)
-    pdf.set_xy(left_margin, current_y)
-    pdf.cell(label_section_width, line_height, "CPF", 0, 1, 'L')
-    pdf.set_font(main_font, "B", 14)
-    pdf.set_xy(left_margin, pdf.get_y())
-    pdf.cell(label_section_width, line_height, str(aluno.cpf) if aluno.cpf else "N/A", 0, 1, 'L')
-    current_y = pdf.get_y() + 3
-
-    # 5. PENDÊNCIAS
-    pdf.set_font(main_font, "", 10)
-    pdf.set_xy(left_margin, current_y)
-    pdf.cell(label_section_width, line_height, "PENDÊNCIAS:", 0, 1, 'L')
-    pdf.set_font(main_font, "", 10)
-    pendencias_str_list = []
-    if pendencias.exists():
-        for p in pendencias:
-            pendencias_str_list.append(f"- {p.tipo_pendencia}: {p.descricao}")
-    else:
-        pendencias_str_list.append("Nenhuma pendência.")
-    
-    pdf.set_xy(left_margin, pdf.get_y())
-    for pendencia_item in pendencias_str_list:
-        pdf.multi_cell(label_section_width, line_height - 3, pendencia_item, 0, 'L')
-    current_y = pdf.get_y() + 5
-
-    # 6. NOME DO ALUNO
-    nome_y_pos = 200 
-    pdf.set_font(main_font, "B", 20)
-    pdf.set_xy(0, nome_y_pos) 
-    pdf.multi_cell(210, line_height, aluno.nome_aluno, 0, 'C')
-
-    pdf_output = bytes(pdf.output(dest='S'))
-    response = HttpResponse(pdf_output, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="capa_aluno_{aluno.id_aluno_arquivo}.pdf"'
-    return response
+    pendencias = list(Pendencia.objects.filter(aluno_arquivo=aluno).order_by("pk"))
+
+    def gerar():
+        pdf = PDFCapaBase(orientation='P', unit='mm', format='A4')
+        pdf.capa_aluno(aluno, pendencias)
+        return bytes(pdf.output())
+
+    chave = hash_capa('A', PDFCapaBase.campos_capa_aluno(aluno, pendencias))
+    return _resposta_capa(request, chave, gerar, f"capa_aluno_{aluno.id_aluno_arquivo}.pdf")
 
 @login_required
 def generate_professional_cover_pdf(request, profissional_id):
     profissional = get_object_or_404(Profissional_Arquivo, id_profissional_arquivo=profissional_id)
-    contratos = Contrato.objects.filter(profissional_arquivo=profissional).order_by("-dt_inicial") # Pega o mais recente primeiro
+    # Pega o contrato mais recente
+    contrato_recente = Contrato.objects.filter(profissional_arquivo=profissional).order_by("-dt_inicial", "-pk").first()
 
-    pdf = PDFCapaBase(orientation='P', unit='mm', format='A4')
-    main_font = pdf.setup_font()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-
-    left_margin = 20
-    top_margin = 30
-    line_height = 8
-    label_section_width = 80
-
-    # 1. Localização do Arquivo
-    pdf.set_font(main_font, "B", 60)
-    loc_arquivo_str = str(profissional.localizacao_arquivo) if profissional.localizacao_arquivo is not None else "N/A"
-    pdf.set_xy(left_margin, top_margin)
-    pdf.cell(40, 25, loc_arquivo_str, 0, 0, 'L')
-
-    # 2. "PASSIVO" (Vertical)
-    pdf.set_font(main_font, "B", 16)
-    passivo_x = left_margin + 30
-    passivo_y = top_margin + 25
-    pdf.rotated_text(passivo_x, passivo_y, "PASSIVO", 90)
-    
-    current_y = top_margin + 45
-
-    # 3. CPF
-    pdf.set_font(main_font, "", 10)
-    pdf.set_xy(left_margin, current_y)
-    pdf.cell(label_section_width, line_height, "CPF", 0, 1, 'L')
-    pdf.set_font(main_font, "B", 14)
-    pdf.set_xy(left_margin, pdf.get_y())
-    pdf.cell(label_section_width, line_height, str(profissional.cpf) if profissional.cpf else "N/A", 0, 1, 'L')
-    current_y = pdf.get_y() + 3
-
-    # 4. PROFESSORA / CARGO/FUNÇÃO (do contrato mais recente)
-    # A imagem mostra "PROFESSORA" e "CARGO/FUNÇÃO" como campos separados
-    # Vamos pegar a função do contrato mais recente.
-    # O campo "PROFESSORA" parece ser um título fixo na imagem para esse exemplo.
-    # Se o cargo/função for sempre "PROFESSORA", podemos fixar. Caso contrário, usamos a função do contrato.
-    
-    funcao_label = "FUNÇÃO"
-    funcao_valor = "N/A"
-    if contratos.exists():
-        contrato_recente = contratos.first()
-        funcao_valor = contrato_recente.funcao
-        # Se a imagem 2 implica que "PROFESSORA" é um título e "CARGO/FUNÇÃO" é o valor, ajustamos:
-        # Se "PROFESSORA" é o valor da função:
-        # funcao_label = "CARGO/FUNÇÃO" # ou apenas "FUNÇÃO"
-        # funcao_valor = contrato_recente.funcao
-        # Se "PROFESSORA" é um título fixo e a função é outra coisa:
-        pdf.set_font(main_font, "", 10)
-        pdf.set_xy(left_margin, current_y)
-        pdf.cell(label_section_width, line_height, "PROFISSÃO/CARGO", 0, 1, 'L') # Label genérico
-        pdf.set_font(main_font, "B", 14)
-        pdf.set_xy(left_margin, pdf.get_y())
-        pdf.cell(label_section_width, line_height, funcao_valor, 0, 1, 'L')
-        current_y = pdf.get_y() + 3
-
-        # Admissão (ADMISSÃO 01/02/2000; EFETIVA.)
-        # Isso pode vir de dt_inicial e tipo_contrato
-        admissao_str = f"ADMISSÃO {contrato_recente.dt_inicial.strftime('%d/%m/%Y') if contrato_recente.dt_inicial else 'N/A'}"
-        if contrato_recente.tipo_contrato:
-            # Supondo que tipo_contrato tem valores como E=Efetiva, T=Temporário
-            tipo_map = {"E": "EFETIVA", "T": "TEMPORÁRIO"} # Adicionar mais mapeamentos se necessário
-            admissao_str += f"; {tipo_map.get(contrato_recente.tipo_contrato.upper(), contrato_recente.tipo_contrato.upper())}"
-        
-        pdf.set_font(main_font, "", 8) # Fonte menor para detalhes de admissão
-        pdf.set_xy(left_margin, current_y)
-        pdf.multi_cell(label_section_width, line_height -3, admissao_str, 0, 'L')
-        current_y = pdf.get_y() + 3
+    def gerar():
+        pdf = PDFCapaBase(orientation='P', unit='mm', format='A4')
+        pdf.capa_profissional(profissional, contrato_recente)
+        return bytes(pdf.output())
+
+    chave = hash_capa('P', PDFCapaBase.campos_capa_profissional(profissional, contrato_recente))
+    return _resposta_capa(request, chave, gerar, f"capa_servidor_{profissional.id_profissional_arquivo}.pdf")
 
-    # 5. OBSERVAÇÕES
-    pdf.set_font(main_font, "", 10)
-    pdf.set_xy(left_margin, current_y)
-    pdf.cell(label_section_width, line_height, "OBSERVAÇÕES:", 0, 1, 'L')
-    pdf.set_font(main_font, "", 10)
-    observacoes_texto = profissional.observacoes if profissional.observacoes else "Nenhuma observação."
-    pdf.set_xy(left_margin, pdf.get_y())
-    pdf.multi_cell(label_section_width, line_height - 3, observacoes_texto, 0, 'L')
-    current_y = pdf.get_y() + 5
 
-    # 6. NOME DO PROFISSIONAL
-    nome_y_pos = 200
-    pdf.set_font(main_font, "B", 20)
-    pdf.set_xy(0, nome_y_pos)
-    pdf.multi_cell(210, line_height, profissional.nome_profissional, 0, 'C')
 
-    pdf_bytes = pdf.output(dest='S')
-    if isinstance(pdf_bytes, bytearray):  
-        pdf_bytes = bytes(pdf_bytes)
-        response = HttpResponse(pdf_bytes, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="capa_servidor_{profissional.id_profissional_arquivo}.pdf"'
-        return response
+@login_required
+def numeros_disponiveis_view(request):
+    """Sugestões de localização livre para o campo do formulário (JSON)."""
+    tipo = request.GET.get('tipo')
+    if tipo not in ('A', 'P'):
+        return HttpResponseBadRequest("Parâmetro 'tipo' deve ser A ou P.")
+
+    try:
+        limite = min(int(request.GET.get('limite', 20)), 100)
+    except ValueError:
+        limite = 20
 
+    numeros = buscar_numeros_disponiveis(tipo, request.GET.get('q', '').strip(), limite)
+    return JsonResponse({'tipo': tipo, 'numeros': numeros})
+
+
+@login_required
+def busca_view(request):
+    """Busca unificada em alunos, servidores, pendências, contatos e contratos (JSON)."""
+    try:
+        limite = min(int(request.GET.get('limite', 20)), 100)
+    except ValueError:
+        limite = 20
+
+    resultados = buscar_arquivos(request.GET.get('q', ''), limite)
+    for resultado in resultados:
+        if resultado['tipo'] == 'A':
+            resultado['url'] = reverse('student_personal_data_edit', args=[resultado['id']])
+        else:
+            resultado['url'] = reverse('professional_personal_data_edit', args=[resultado['id']])
+    return JsonResponse({'resultados': resultados})
+
+
+# Linhas por página nas listagens de localização
+TAMANHO_PAGINA_LOCALIZACAO = 50
+
+
+def _pagina_localizacao(request, tipo):
+    """Página da busca de localização (q, cursor) de alunos (A) ou servidores (P)."""
+    if tipo == 'A':
+        queryset = Aluno_Arquivo.objects.all()
+        ordem = ("nome_busca", "id_aluno_arquivo")
+    else:
+        queryset = Profissional_Arquivo.objects.all()
+        ordem = ("nome_busca", "id_profissional_arquivo")
+
+    termo = request.GET.get('q', '').strip()
+    itens, proximo = paginar_por_chave(
+        filtrar_arquivos_por_termo(queryset, tipo, termo),
+        ordem,
+        cursor=request.GET.get('cursor'),
+        tamanho=TAMANHO_PAGINA_LOCALIZACAO
+    )
+    return {'termo': termo, 'itens': itens, 'proximo': proximo, 'paginado': bool(request.GET.get('cursor'))}
 
 
 @login_required
@@ -220,21 +314,64 @@ def select_category(request):
 # --- Student Views ---
 @login_required
 def student_dashboard(request):
-    return render(request, 'localizador/student_dashboard.html')
+    # contadores mantidos a cada gravação (ResumoPainel) e faixas livres em cache
+    resumo = resumo_painel("aluno_status", "pendencia_tipo", "documentos")
+    total = sum(resumo["aluno_status"].values())
+    documentos = resumo["documentos"].get('A', 0)
+    return render(request, 'localizador/student_dashboard.html', {
+        'ativos': resumo["aluno_status"].get('A', 0),
+        'permanentes': resumo["aluno_status"].get('P', 0),
+        'pendencias_por_tipo': sorted(resumo["pendencia_tipo"].items(), key=lambda item: -item[1]),
+        'localizacoes': resumo_localizacoes('A'),
+        'documentos': documentos,
+        'documentos_por_aluno': documentos / total if total else 0,
+    })
 
 @login_required
 def student_file_location_view(request):
-    alunos = Aluno_Arquivo.objects.all()
-    return render(request, 'localizador/student_file_location.html', {'alunos': alunos})
+    pagina = _pagina_localizacao(request, 'A')
+    return render(request, 'localizador/student_file_location.html', {
+        'alunos': pagina['itens'],
+        'termo': pagina['termo'],
+        'proximo': pagina['proximo'],
+        'paginado': pagina['paginado'],
+    })
+
+@login_required
+def student_file_location_search_view(request):
+    """Busca incremental da localização de alunos (JSON, uma página)."""
+    pagina = _pagina_localizacao(request, 'A')
+    return JsonResponse({
+        'resultados': [
+            {
+                'localizacao': aluno.localizacao_arquivo,
+                'nome': aluno.nome_aluno,
+                'cpf': aluno.cpf,
+                'cod_sistema': aluno.cod_sistema,
+                'status': aluno.status_arquivo_aluno,
+            }
+            for aluno in pagina['itens']
+        ],
+        'proximo': pagina['proximo'],
+    })
 
 @login_required
 def student_contacts_view(request):
-    contatos = Contato.objects.all()
+    contatos = (
+        Contato.objects
+        .select_related('aluno_arquivo')
+        .only('pessoa_contato', 'telefone', 'aluno_arquivo__nome_aluno', 'aluno_arquivo__cpf')
+    )
     return render(request, 'localizador/student_contacts.html', {'contatos': contatos})
 
 @login_required
 def student_pendencies_view(request):
-    pendencias = Pendencia.objects.all()
+    pendencias = (
+        Pendencia.objects
+        .select_related('aluno_arquivo')
+        .only('tipo_pendencia', 'descricao', 'dt_lancamento_pendencia',
+              'aluno_arquivo__nome_aluno', 'aluno_arquivo__cpf')
+    )
     return render(request, 'localizador/student_pendencies.html', {'pendencias': pendencias})
 
 @login_required
@@ -242,22 +379,22 @@ def student_personal_data_maintenance_view(request, aluno_id=None):
     aluno_instance = None
     document_form = None
     documents = []
+    # O formulário do aluno só é vinculado ao POST quando é ele que foi enviado
+    dados_aluno = request.POST if 'save_aluno' in request.POST else None
     if aluno_id:
         aluno_instance = get_object_or_404(Aluno_Arquivo, id_aluno_arquivo=aluno_id)
-        form = AlunoArquivoForm(request.POST or None, instance=aluno_instance)
+        form = AlunoArquivoForm(dados_aluno, instance=aluno_instance)
         page_title = "Editar Aluno"
         button_text = "Salvar Alterações"
         document_form = DocumentoVinculadoForm()
-        content_type = ContentType.objects.get_for_model(Aluno_Arquivo)
-        documents = DocumentoVinculado.objects.filter(content_type=content_type, object_id=aluno_instance.id_aluno_arquivo)
+        documents = aluno_instance.documentos.all()
     else:
-        form = AlunoArquivoForm(request.POST or None)
+        form = AlunoArquivoForm(dados_aluno)
         page_title = "Adicionar Novo Aluno"
         button_text = "Adicionar e Gerar Capa"
 
     if request.method == 'POST':
         if 'save_aluno' in request.POST:
-            form = AlunoArquivoForm(request.POST or request.FILES, instance=aluno_instance)
             if form.is_valid():
                 aluno_salvo = form.save(commit=False)
                 if not aluno_instance:
@@ -304,21 +441,214 @@ def student_personal_data_maintenance_view(request, aluno_id=None):
 
 @login_required
 def student_personal_data_maintenance_list_view(request):
-    alunos = Aluno_Arquivo.objects.all()
+    alunos = Aluno_Arquivo.objects.only('nome_aluno', 'cod_sistema', 'status_arquivo_aluno')
     return render(request, 'localizador/student_personal_data_maintenance_list.html', {'alunos': alunos})
 
+@login_required
+def student_personal_data_bulk_create_view(request):
+    form = AlunoLoteForm(request.POST or None)
+
+    if request.method == 'POST':
+        if form.is_valid():
+            status = form.cleaned_data['status_arquivo_aluno']
+            alunos = [
+                Aluno_Arquivo(usuario=request.user, status_arquivo_aluno=status, **dados)
+                for dados in form.cleaned_data['linhas']
+            ]
+            # Uma única reserva de localizações para todo o lote
+            criados = criar_em_lote_com_localizacao(Aluno_Arquivo, alunos)
+            messages.success(
+                request,
+                f'{len(criados)} alunos cadastrados nas localizações '
+                f'{criados[0].localizacao_arquivo} a {criados[-1].localizacao_arquivo}.'
+            )
+            return redirect('student_personal_data_maintenance_list')
+        else:
+            messages.error(request, 'Por favor, corrija os erros abaixo.')
+
+    return render(request, 'localizador/student_personal_data_bulk_form.html', {'form': form})
+
+# Quantas linhas com erro (e diferenças) são mostradas na página após a importação
+ERROS_IMPORTACAO_EXIBIDOS = 200
+
+
+@login_required
+def importar_sigeec_view(request):
+    form = ImportacaoSigeecForm(request.POST or None, request.FILES or None,
+                                initial={'tipo': request.GET.get('tipo', 'A')})
+    relatorio = None
+
+    if request.method == 'POST':
+        if form.is_valid():
+            dados = form.cleaned_data
+            leitor = abrir_csv_sigeec(dados['arquivo'].read(), dados['delimitador'])
+            try:
+                relatorio = importar_sigeec(
+                    dados['tipo'],
+                    leitor,
+                    request.user,
+                    sincronizar=dados['sincronizar'],
+                    marcar_ausentes=dados['marcar_ausentes'],
+                    simular=dados['simular'],
+                )
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                resumo = (
+                    f"{relatorio['linhas']} linhas lidas: {relatorio['criados']} cadastrados, "
+                    f"{relatorio['atualizados']} atualizados, {relatorio['inalterados']} inalterados, "
+                    f"{relatorio['ausentes']} ausentes, {len(relatorio['erros'])} com erro."
+                )
+                if dados['simular']:
+                    messages.info(request, f"Simulação, nada foi gravado. {resumo}")
+                else:
+                    messages.success(request, resumo)
+        else:
+            messages.error(request, 'Por favor, corrija os erros abaixo.')
+
+    return render(request, 'localizador/importar_sigeec.html', {
+        'form': form,
+        'relatorio': relatorio,
+        'erros': relatorio['erros'][:ERROS_IMPORTACAO_EXIBIDOS] if relatorio else [],
+        'diferencas': relatorio['diferencas'][:ERROS_IMPORTACAO_EXIBIDOS] if relatorio else [],
+    })
+
 @login_required
 def student_personal_data_delete_view(request, aluno_id):
     aluno = get_object_or_404(Aluno_Arquivo, id_aluno_arquivo=aluno_id)
     if request.method == 'POST':
-        content_type = ContentType.objects.get_for_model(Aluno_Arquivo)
-        DocumentoVinculado.objects.filter(content_type=content_type, object_id=aluno.id_aluno_arquivo).delete()
+        # os documentos vinculados saem em cascata (GenericRelation)
         aluno.delete()
         messages.success(request, 'Aluno e documentos vinculados excluídos com sucesso!')
         return redirect('student_personal_data_maintenance_list')
     return render(request, 'localizador/student_personal_data_delete_confirm.html', {'aluno': aluno})
 
 
+@login_required
+def student_personal_data_purge_view(request):
+    ids = [int(i) for i in request.POST.getlist('ids') if i.isdigit()]
+    if request.method != 'POST' or not ids:
+        messages.error(request, 'Selecione ao menos um aluno para excluir.')
+        return redirect('student_personal_data_maintenance_list')
+
+    alunos = Aluno_Arquivo.objects.filter(id_aluno_arquivo__in=ids)
+    if 'confirmar' in request.POST:
+        total = expurgar_arquivos(alunos)
+        messages.success(request, f'{total} alunos e seus documentos vinculados excluídos com sucesso!')
+        return redirect('student_personal_data_maintenance_list')
+
+    return render(request, 'localizador/purge_confirm.html', {
+        'ids': ids,
+        'registros': alunos.only('nome_aluno', 'localizacao_arquivo')[:50],
+        'total': alunos.count(),
+        'titulo': 'Excluir Alunos Selecionados',
+        'action_url': reverse('student_personal_data_purge'),
+        'cancel_url': reverse('student_personal_data_maintenance_list'),
+    })
+
+
+# Download dos documentos vinculados. Só "bytes=inicio-fim", "bytes=inicio-"
+# e "bytes=-sufixo" com um intervalo; vários intervalos recebem o arquivo inteiro.
+_INTERVALO = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _TrechoArquivo:
+    """Lê só tamanho bytes do arquivo, a partir da posição atual (resposta 206)."""
+
+    def __init__(self, arquivo, tamanho):
+        self.arquivo = arquivo
+        self.restante = tamanho
+
+    def read(self, tamanho=-1):
+        if tamanho < 0 or tamanho > self.restante:
+            tamanho = self.restante
+        dados = self.arquivo.read(tamanho)
+        self.restante -= len(dados)
+        return dados
+
+    def close(self):
+        self.arquivo.close()
+
+
+def _intervalo_solicitado(request, tamanho, etag, ultima_modificacao):
+    """(inicio, fim) do cabeçalho Range, None para o arquivo inteiro ou False se fora do arquivo."""
+    cabecalho = request.headers.get('Range', '')
+    correspondencia = _INTERVALO.match(cabecalho.replace(' ', ''))
+    if not correspondencia or correspondencia.groups() == ('', ''):
+        return None
+
+    # If-Range: o trecho só vale se o navegador tem a mesma versão do arquivo
+    versao = request.headers.get('If-Range')
+    if versao and versao not in (etag, http_date(ultima_modificacao)):
+        return None
+
+    inicio, fim = correspondencia.groups()
+    if not inicio:
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio, fim = int(inicio), min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio > fim or inicio >= tamanho:
+        return False
+    return inicio, fim
+
+
+@login_required
+def baixar_documento_view(request, documento_id):
+    """
+    Documento vinculado para usuários logados (os arquivos não ficam públicos
+    em MEDIA_URL). Responde a ETag/Last-Modified com 304 e a Range com 206,
+    o que os visualizadores de PDF dos navegadores usam para abrir arquivos
+    grandes aos poucos. Com settings.DOCUMENTO_ENVIO_SERVIDOR, o servidor web
+    envia o arquivo e o processo do Django fica livre na hora.
+    """
+    documento = get_object_or_404(DocumentoVinculado.objects.only('arquivo'), id_documento=documento_id)
+    armazenamento = documento.arquivo.storage
+    try:
+        estado = os.stat(armazenamento.path(documento.arquivo.name))
+    except (FileNotFoundError, ValueError):
+        raise Http404("Arquivo do documento não encontrado.")
+
+    etag = f'"{estado.st_ino:x}-{estado.st_size:x}-{estado.st_mtime_ns:x}"'
+    ultima_modificacao = int(estado.st_mtime)
+    nao_modificado = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    nome_arquivo = os.path.basename(documento.arquivo.name)
+    envio_servidor = settings.DOCUMENTO_ENVIO_SERVIDOR
+    if envio_servidor:
+        # O servidor web lê o arquivo (e trata Range); aqui só os cabeçalhos
+        response = HttpResponse(content_type=mimetypes.guess_type(nome_arquivo)[0] or 'application/octet-stream')
+        if envio_servidor == 'X-Accel-Redirect':
+            response['X-Accel-Redirect'] = settings.DOCUMENTO_PREFIXO_INTERNO + quote(documento.arquivo.name)
+        else:
+            response[envio_servidor] = armazenamento.path(documento.arquivo.name)
+        response['Content-Disposition'] = content_disposition_header(False, nome_arquivo)
+    else:
+        intervalo = _intervalo_solicitado(request, estado.st_size, etag, ultima_modificacao)
+        if intervalo is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{estado.st_size}'
+            return response
+
+        arquivo = documento.arquivo.open('rb')
+        if intervalo:
+            inicio, fim = intervalo
+            arquivo.seek(inicio)
+            response = FileResponse(_TrechoArquivo(arquivo, fim - inicio + 1), status=206, filename=nome_arquivo)
+            response['Content-Range'] = f'bytes {inicio}-{fim}/{estado.st_size}'
+            response['Content-Length'] = fim - inicio + 1
+        else:
+            response = FileResponse(arquivo, filename=nome_arquivo)
+        response.block_size = 256 * 1024
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacao)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @login_required
 def delete_documento_vinculado_view(request, documento_id):
     documento = get_object_or_404(DocumentoVinculado, id_documento=documento_id)
@@ -333,10 +663,7 @@ def delete_documento_vinculado_view(request, documento_id):
 
     # Se for um POST, realiza a exclusão
     if request.method == 'POST':
-        # Remove o arquivo físico
-        if documento.arquivo:
-            documento.arquivo.delete(save=False)
-        # Remove o registro do banco
+        # Remove o registro do banco (o arquivo sai no post_delete)
         documento.delete()
         messages.success(request, 'Documento excluído com sucesso!')
         return redirect(cancel_url)
@@ -347,6 +674,70 @@ def delete_documento_vinculado_view(request, documento_id):
         'cancel_url': cancel_url
     })
 
+def _estado_envio(envio):
+    return {
+        'id': str(envio.pk),
+        'url': reverse('envio_documento', args=[envio.pk]),
+        'recebido': envio.recebido,
+        'tamanho': envio.tamanho,
+        'tamanho_parte': settings.ENVIO_TAMANHO_PARTE,
+    }
+
+
+@login_required
+@require_POST
+def iniciar_envio_documento_view(request):
+    """Começa o envio em partes de um documento (ver utils.gravar_parte_envio)."""
+    form = EnvioDocumentoForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'erros': form.errors}, status=400)
+
+    dados = form.cleaned_data
+    modelo = Aluno_Arquivo if dados['tipo'] == 'A' else Profissional_Arquivo
+    entidade = get_object_or_404(modelo, pk=dados['object_id'])
+    envio = iniciar_envio(request.user, entidade, dados['nome_arquivo'], dados['tamanho'],
+                          dados['sha256'], dados['descricao'] or None)
+    return JsonResponse(_estado_envio(envio), status=201)
+
+
+@login_required
+def envio_documento_view(request, envio_id):
+    """
+    GET: quanto do envio já chegou (para retomar). PUT: uma parte, com
+    Content-Range e, opcionalmente, X-Checksum-Sha256. DELETE: cancela.
+    """
+    envio = get_object_or_404(EnvioDocumento, id_envio=envio_id, usuario=request.user)
+
+    if request.method == 'DELETE':
+        descartar_envio(envio)
+        return JsonResponse({'cancelado': True})
+
+    if request.method == 'PUT':
+        intervalo = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+)", request.headers.get('Content-Range', ''))
+        tamanho_parte = int(request.META.get('CONTENT_LENGTH') or 0)
+        if (not intervalo or int(intervalo[2]) - int(intervalo[1]) + 1 != tamanho_parte
+                or int(intervalo[3]) != envio.tamanho):
+            return JsonResponse({'erro': "Content-Range inválido.", **_estado_envio(envio)}, status=400)
+
+        try:
+            gravar_parte_envio(envio, request, int(intervalo[1]), tamanho_parte,
+                               request.headers.get('X-Checksum-Sha256'))
+            if envio.recebido == envio.tamanho:
+                documento = concluir_envio(envio)
+                # Sem messages: a resposta é JSON; a página recarregada já lista o documento
+                return JsonResponse({'documento': documento.pk, 'nome_arquivo': documento.nome_arquivo}, status=201)
+        except EnvioDocumento.DoesNotExist:
+            # cancelado (DELETE) enquanto a parte chegava
+            raise Http404("Envio cancelado.")
+        except ValidationError as erro:
+            resposta = {'erro': erro.messages[0], 'codigo': erro.code}
+            if envio.pk:  # com o arquivo inteiro errado o envio é descartado
+                resposta.update(_estado_envio(envio))
+            return JsonResponse(resposta, status=409 if erro.code == 'fora_de_ordem' else 400)
+
+    return JsonResponse(_estado_envio(envio))
+
+
 # --- Views de Contato e Pendencia (sem alteração por enquanto) ---
 @login_required
 def student_contacts_maintenance_view(request, aluno_id, contato_id=None):
@@ -426,16 +817,58 @@ def student_pendency_delete_view(request, aluno_id, pendencia_id):
 # --- Professional Views ---
 @login_required
 def professional_dashboard(request):
-    return render(request, 'localizador/professional_dashboard.html')
+    resumo = resumo_painel("profissional_status", "documentos")
+    total = sum(resumo["profissional_status"].values())
+    documentos = resumo["documentos"].get('P', 0)
+    hoje = timezone.localdate()
+    return render(request, 'localizador/professional_dashboard.html', {
+        'ativos': resumo["profissional_status"].get('A', 0),
+        'permanentes': resumo["profissional_status"].get('P', 0),
+        'localizacoes': resumo_localizacoes('P'),
+        'documentos': documentos,
+        'documentos_por_servidor': documentos / total if total else 0,
+        # depende da data de hoje, então é contado na hora, pelo índice de dt_final
+        'contratos_a_vencer': Contrato.objects.filter(
+            dt_final__range=(hoje, hoje + timedelta(days=DIAS_CONTRATOS_A_VENCER))
+        ).count(),
+        'dias_contratos_a_vencer': DIAS_CONTRATOS_A_VENCER,
+    })
 
 @login_required
 def professional_file_location_view(request):
-    profissionais = Profissional_Arquivo.objects.all()
-    return render(request, 'localizador/professional_file_location.html', {'profissionais': profissionais})
+    pagina = _pagina_localizacao(request, 'P')
+    return render(request, 'localizador/professional_file_location.html', {
+        'profissionais': pagina['itens'],
+        'termo': pagina['termo'],
+        'proximo': pagina['proximo'],
+        'paginado': pagina['paginado'],
+    })
+
+@login_required
+def professional_file_location_search_view(request):
+    """Busca incremental da localização de servidores (JSON, uma página)."""
+    pagina = _pagina_localizacao(request, 'P')
+    return JsonResponse({
+        'resultados': [
+            {
+                'localizacao': profissional.localizacao_arquivo,
+                'nome': profissional.nome_profissional,
+                'cpf': profissional.cpf,
+                'status': profissional.status_arquivo_profissional,
+            }
+            for profissional in pagina['itens']
+        ],
+        'proximo': pagina['proximo'],
+    })
 
 @login_required
 def professional_contracts_view(request):
-    contratos = Contrato.objects.all()
+    contratos = (
+        Contrato.objects
+        .select_related('profissional_arquivo')
+        .only('matricula', 'funcao', 'dt_inicial', 'dt_final', 'tipo_contrato',
+              'profissional_arquivo__nome_profissional', 'profissional_arquivo__cpf')
+    )
     return render(request, 'localizador/professional_contracts.html', {'contratos': contratos})
 
 @login_required
@@ -443,35 +876,26 @@ def professional_personal_data_maintenance_view(request, profissional_id=None):
     profissional_instance = None
     document_form = None
     documents = []
+    # O formulário do servidor só é vinculado ao POST quando é ele que foi enviado
+    dados_profissional = request.POST if 'save_profissional' in request.POST else None
     if profissional_id:
         profissional_instance = get_object_or_404(Profissional_Arquivo, id_profissional_arquivo=profissional_id)
-        form = ProfissionalArquivoForm(request.POST or None, instance=profissional_instance)
+        form = ProfissionalArquivoForm(dados_profissional, instance=profissional_instance)
         page_title = "Editar Servidor"
         button_text = "Salvar Alterações"
         document_form = DocumentoVinculadoForm()
-        content_type = ContentType.objects.get_for_model(Profissional_Arquivo)
-        documents = DocumentoVinculado.objects.filter(content_type=content_type, object_id=profissional_instance.id_profissional_arquivo)
+        documents = profissional_instance.documentos.all()
     else:
-        form = ProfissionalArquivoForm(request.POST or None)
+        form = ProfissionalArquivoForm(dados_profissional)
         page_title = "Adicionar Novo Servidor"
         button_text = "Adicionar e Gerar Capa" # Alterado para o novo fluxo
 
     if request.method == 'POST':
         if 'save_profissional' in request.POST:
-            form = ProfissionalArquivoForm(request.POST or request.FILES, instance=profissional_instance)
             if form.is_valid():
                 profissional_salvo = form.save(commit=False)
-                
-                if not profissional_instance and not profissional_salvo.localizacao_arquivo:
-                    try:
-                        profissional_salvo.localizacao_arquivo = get_next_numero_passivo()
-                    except Exception as e:
-                        messages.error(request, f"Erro ao gerar número de localização: {e}.")
-                        return render(request, 'localizador/professional_personal_data_maintenance_form.html', {'form': form,
-                        'profissional': profissional_instance, 'page_title': page_title, 'button_text': button_text,
-                        'document_form': document_form, 'documents': documents})
-
 
+                # O número de localização, se vazio, é alocado em Profissional_Arquivo.save()
                 if not profissional_instance:
                     try:
                         if request.user.is_authenticated:
@@ -516,20 +940,41 @@ def professional_personal_data_maintenance_view(request, profissional_id=None):
 
 @login_required
 def professional_personal_data_maintenance_list_view(request):
-    profissionais = Profissional_Arquivo.objects.all()
+    profissionais = Profissional_Arquivo.objects.only('nome_profissional', 'cpf', 'status_arquivo_profissional')
     return render(request, 'localizador/professional_personal_data_maintenance_list.html', {'profissionais': profissionais})
 
 @login_required
 def professional_personal_data_delete_view(request, profissional_id):
     profissional = get_object_or_404(Profissional_Arquivo, id_profissional_arquivo=profissional_id)
     if request.method == 'POST':
-        content_type = ContentType.objects.get_for_model(Profissional_Arquivo)
-        DocumentoVinculado.objects.filter(content_type=content_type, object_id=profissional.id_profissional_arquivo).delete()
+        # os documentos vinculados saem em cascata (GenericRelation)
         profissional.delete()
         messages.success(request, 'Servidor e documentos vinculados excluídos com sucesso!')
         return redirect('professional_personal_data_maintenance_list')
     return render(request, 'localizador/professional_personal_data_delete_confirm.html', {'profissional': profissional})
 
+@login_required
+def professional_personal_data_purge_view(request):
+    ids = [int(i) for i in request.POST.getlist('ids') if i.isdigit()]
+    if request.method != 'POST' or not ids:
+        messages.error(request, 'Selecione ao menos um servidor para excluir.')
+        return redirect('professional_personal_data_maintenance_list')
+
+    profissionais = Profissional_Arquivo.objects.filter(id_profissional_arquivo__in=ids)
+    if 'confirmar' in request.POST:
+        total = expurgar_arquivos(profissionais)
+        messages.success(request, f'{total} servidores e seus documentos vinculados excluídos com sucesso!')
+        return redirect('professional_personal_data_maintenance_list')
+
+    return render(request, 'localizador/purge_confirm.html', {
+        'ids': ids,
+        'registros': profissionais.only('nome_profissional', 'localizacao_arquivo')[:50],
+        'total': profissionais.count(),
+        'titulo': 'Excluir Servidores Selecionados',
+        'action_url': reverse('professional_personal_data_purge'),
+        'cancel_url': reverse('professional_personal_data_maintenance_list'),
+    })
+
 # --- Views de Contrato (sem alteração por enquanto) ---
 @login_required
 def professional_contracts_maintenance_view(request, profissional_id, contrato_id=None):
@@ -569,49 +1014,218 @@ def professional_contract_delete_view(request, profissional_id, contrato_id):
 
 
 # --- View para consulta de documentos --- 
+
+# Alunos/servidores por página no catálogo de documentos
+TAMANHO_PAGINA_DOCUMENTOS = 25
+
+
 @login_required
 def consultar_documentos_view(request):
-    query = request.GET.get('q', '')
-    alunos_com_docs = []
-    profissionais_com_docs = []
-
-    if query:
-        aluno_content_type = ContentType.objects.get_for_model(Aluno_Arquivo)
-        alunos_matches = Aluno_Arquivo.objects.filter(nome_aluno__icontains=query)
-        for aluno in alunos_matches:
-            docs = DocumentoVinculado.objects.filter(content_type=aluno_content_type, object_id=aluno.id_aluno_arquivo)
-            if docs.exists():
-                alunos_com_docs.append({'entidade': aluno, 'documentos': docs, 'tipo': 'Aluno'})
-
-        profissional_content_type = ContentType.objects.get_for_model(Profissional_Arquivo)
-        profissionais_matches = Profissional_Arquivo.objects.filter(nome_profissional__icontains=query)
-        for prof in profissionais_matches:
-            docs = DocumentoVinculado.objects.filter(content_type=profissional_content_type, object_id=prof.id_profissional_arquivo)
-            if docs.exists():
-                profissionais_com_docs.append({'entidade': prof, 'documentos': docs, 'tipo': 'Servidor'})
-    
-    # Se não houver query, pode-se listar todos os documentos ou nenhum.
-    # Para este exemplo, vamos listar todos se não houver query, agrupados.
-    else:
-        aluno_content_type = ContentType.objects.get_for_model(Aluno_Arquivo)
-        todos_alunos_com_docs = Aluno_Arquivo.objects.filter(documentos__isnull=False).distinct()
-        for aluno in todos_alunos_com_docs:
-            docs = DocumentoVinculado.objects.filter(content_type=aluno_content_type, object_id=aluno.id_aluno_arquivo)
-            if docs.exists(): # Redundante devido ao filter, mas seguro
-                 alunos_com_docs.append({'entidade': aluno, 'documentos': docs, 'tipo': 'Aluno'})
-        
-        profissional_content_type = ContentType.objects.get_for_model(Profissional_Arquivo)
-        todos_profissionais_com_docs = Profissional_Arquivo.objects.filter(documentos__isnull=False).distinct()
-        for prof in todos_profissionais_com_docs:
-            docs = DocumentoVinculado.objects.filter(content_type=profissional_content_type, object_id=prof.id_profissional_arquivo)
-            if docs.exists():
-                profissionais_com_docs.append({'entidade': prof, 'documentos': docs, 'tipo': 'Servidor'})
+    form = DocumentoFiltroForm(request.GET or None)
+    filtros = form.cleaned_data if form.is_valid() else {}
+
+    categoria = filtros.get('categoria') or 'A'
+    modelo = Aluno_Arquivo if categoria == 'A' else Profissional_Arquivo
+
+    # Filtros dos documentos: valem para escolher as pessoas e para o prefetch
+    documentos = DocumentoVinculado.objects.all()
+    if filtros.get('tipo_arquivo'):
+        documentos = documentos.filter(tipo_arquivo=filtros['tipo_arquivo'])
+    if filtros.get('data_inicio'):
+        documentos = documentos.filter(data_upload__date__gte=filtros['data_inicio'])
+    if filtros.get('data_fim'):
+        documentos = documentos.filter(data_upload__date__lte=filtros['data_fim'])
+
+    entidades = modelo.objects.filter(
+        pk__in=documentos.filter(content_type=ContentType.objects.get_for_model(modelo)).values('object_id')
+    )
+    entidades = filtrar_arquivos_por_termo(entidades, categoria, filtros.get('q') or '')
+    entidades = (
+        entidades
+        .order_by('nome_busca', 'pk')
+        .prefetch_related(Prefetch('documentos', queryset=documentos.order_by('-data_upload')))
+    )
+
+    pagina = Paginator(entidades, TAMANHO_PAGINA_DOCUMENTOS).get_page(request.GET.get('pagina'))
+
+    # Query string dos filtros, para os links de paginação
+    parametros = request.GET.copy()
+    parametros.pop('pagina', None)
 
     context = {
-        'query': query,
-        'alunos_com_docs': alunos_com_docs,
-        'profissionais_com_docs': profissionais_com_docs,
-        'has_results': bool(alunos_com_docs or profissionais_com_docs or query) # Mostra se houve busca ou se há docs
+        'form': form,
+        'categoria': categoria,
+        'pagina': pagina,
+        'parametros': parametros.urlencode(),
     }
     return render(request, 'localizador/consultar_documentos.html', context)
 
+
+# --- Capas em lote ---
+
+@login_required
+def capas_em_lote_view(request):
+    """Formulário de filtros e, com ele válido, as capas selecionadas num único PDF."""
+    # Só o botão "Gerar PDF" envia 'gerar'; os links trazem apenas o tipo
+    form = CapasLoteForm(request.GET if 'gerar' in request.GET else None,
+                         initial={'tipo': request.GET.get('tipo', 'A')})
+
+    if form.is_valid():
+        dados = form.cleaned_data
+        tipo = dados.pop('tipo')
+        queryset = capas_queryset(tipo, **dados)
+        total = queryset.count()
+
+        if not total:
+            messages.warning(request, "Nenhum registro com esses filtros.")
+        elif total > LIMITE_CAPAS_WEB:
+            messages.error(
+                request,
+                f"{total} capas selecionadas; pelo navegador o limite é {LIMITE_CAPAS_WEB}. "
+                "Refine os filtros ou use o comando imprimir_capas."
+            )
+        else:
+            nome = "capas_alunos" if tipo == 'A' else "capas_servidores"
+            resposta = HttpResponse(gerar_capas_pdf(tipo, queryset), content_type='application/pdf')
+            resposta['Content-Disposition'] = f'inline; filename="{nome}.pdf"'
+            return resposta
+    elif form.is_bound:
+        messages.error(request, 'Por favor, corrija os erros abaixo.')
+
+    return render(request, 'localizador/capas_em_lote.html', {'form': form})
+
+
+# --- Exportação do inventário ---
+
+@login_required
+def exportar_inventario_view(request):
+    """Inventário completo de alunos (tipo=A) ou servidores (tipo=P) em CSV ou XLSX, em fluxo."""
+    tipo = request.GET.get('tipo', 'A')
+    formato = request.GET.get('formato', 'csv')
+    if tipo not in ('A', 'P') or formato not in ('csv', 'xlsx'):
+        return HttpResponseBadRequest("Use tipo=A|P e formato=csv|xlsx.")
+
+    nome = "inventario_alunos" if tipo == 'A' else "inventario_servidores"
+    if formato == 'csv':
+        resposta = StreamingHttpResponse(gerar_csv(linhas_inventario(tipo)), content_type='text/csv; charset=utf-8')
+    else:
+        resposta = StreamingHttpResponse(
+            gerar_xlsx(linhas_inventario(tipo)),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    resposta['Content-Disposition'] = f'attachment; filename="{nome}.{formato}"'
+    return resposta
+
+
+# --- API JSON (somente leitura) ---
+
+def _filtro_inteiro(campo):
+    return lambda valor: Q(**{campo: int(valor)})
+
+
+def _filtro_tipo_documento(valor):
+    modelo = {'A': Aluno_Arquivo, 'P': Profissional_Arquivo}[valor]
+    return Q(content_type=ContentType.objects.get_for_model(modelo))
+
+
+# Recursos da API: modelo, campos que podem ser pedidos e filtros aceitos.
+# Os filtros usam só colunas indexadas; a paginação é sempre pela chave primária.
+RECURSOS_API = {
+    'alunos': {
+        'modelo': Aluno_Arquivo,
+        'campos': ['id_aluno_arquivo', 'cod_sistema', 'nome_aluno', 'cpf', 'status_arquivo_aluno',
+                   'localizacao_arquivo', 'usuario_id'],
+        'filtros': {
+            'cod_sistema': _filtro_inteiro('cod_sistema'),
+            'localizacao': _filtro_inteiro('localizacao_arquivo'),
+            'nome': lambda valor: filtro_prefixo('nome_busca', normalizar_texto(valor)),
+            'cpf': lambda valor: filtro_prefixo('cpf_busca', normalizar_cpf(valor)),
+        },
+    },
+    'profissionais': {
+        'modelo': Profissional_Arquivo,
+        'campos': ['id_profissional_arquivo', 'nome_profissional', 'cpf', 'status_arquivo_profissional',
+                   'localizacao_arquivo', 'observacoes', 'usuario_id'],
+        'filtros': {
+            'localizacao': _filtro_inteiro('localizacao_arquivo'),
+            'nome': lambda valor: filtro_prefixo('nome_busca', normalizar_texto(valor)),
+            'cpf': lambda valor: filtro_prefixo('cpf_busca', normalizar_cpf(valor)),
+        },
+    },
+    'contatos': {
+        'modelo': Contato,
+        'campos': ['id_contato', 'aluno_arquivo_id', 'pessoa_contato', 'telefone'],
+        'filtros': {'aluno': _filtro_inteiro('aluno_arquivo_id')},
+    },
+    'pendencias': {
+        'modelo': Pendencia,
+        'campos': ['id_pendencia', 'aluno_arquivo_id', 'dt_lancamento_pendencia', 'tipo_pendencia', 'descricao'],
+        'filtros': {'aluno': _filtro_inteiro('aluno_arquivo_id')},
+    },
+    'contratos': {
+        'modelo': Contrato,
+        'campos': ['Id_numero_contrato', 'profissional_arquivo_id', 'matricula', 'funcao',
+                   'dt_inicial', 'dt_final', 'tipo_contrato'],
+        'filtros': {'profissional': _filtro_inteiro('profissional_arquivo_id')},
+    },
+    'documentos': {
+        'modelo': DocumentoVinculado,
+        'campos': ['id_documento', 'content_type_id', 'object_id', 'nome_arquivo', 'arquivo',
+                   'tipo_arquivo', 'descricao', 'data_upload'],
+        'filtros': {
+            'tipo': _filtro_tipo_documento,
+            'objeto': _filtro_inteiro('object_id'),
+        },
+    },
+}
+
+# Registros por página na API (padrão e máximo)
+LIMITE_API = 100
+LIMITE_API_MAXIMO = 500
+
+
+@login_required
+def api_listar_view(request, recurso):
+    """
+    Lista um recurso em páginas por chave primária: ?cursor= vem do campo
+    "proximo" da página anterior, ?campos=a,b escolhe as colunas e os demais
+    parâmetros são os filtros do recurso.
+    """
+    config = RECURSOS_API.get(recurso)
+    if config is None:
+        return JsonResponse({'erro': f"Recurso '{recurso}' não existe."}, status=404)
+
+    modelo = config['modelo']
+    chave = modelo._meta.pk.name
+
+    campos = [c for c in request.GET.get('campos', '').split(',') if c] or config['campos']
+    invalidos = [c for c in campos if c not in config['campos']]
+    if invalidos:
+        return HttpResponseBadRequest(f"Campos inválidos: {', '.join(invalidos)}.")
+    if chave not in campos:
+        campos = [chave] + campos
+
+    queryset = modelo.objects.all()
+    for parametro, filtro in config['filtros'].items():
+        valor = request.GET.get(parametro, '').strip()
+        if not valor:
+            continue
+        try:
+            queryset = queryset.filter(filtro(valor))
+        except (ValueError, KeyError, IndexError):
+            return HttpResponseBadRequest(f"Valor inválido para '{parametro}'.")
+
+    try:
+        limite = max(1, min(int(request.GET.get('limite', LIMITE_API)), LIMITE_API_MAXIMO))
+    except ValueError:
+        limite = LIMITE_API
+
+    # Na API, cursor adulterado ou de outro recurso é erro do cliente (a página HTML recomeça)
+    cursor = request.GET.get('cursor')
+    if cursor and not cursor_valido(cursor, modelo, (chave,)):
+        return HttpResponseBadRequest("Cursor inválido.")
+
+    resultados, proximo = paginar_por_chave(
+        queryset.values(*campos), (chave,), cursor=cursor, tamanho=limite
+    )
+    return JsonResponse({'resultados': resultados, 'proximo': proximo})